@@ -0,0 +1,218 @@
+import os
+import time
+import shutil
+import logging
+import tempfile
+import contextlib
+import telemetry
+
+LOCK_STALE_AFTER = 30 * 60
+LOCK_REFRESH_INTERVAL = 60
+LOCK_TIMEOUT = 10 * 60
+LOCK_POLL_INTERVAL = 0.5
+BUFFER_SIZE = 1024 * 1024
+
+def default_cache_dir():
+    """
+    Returns the machine-wide cache folder, shared by every install and user.
+
+    Returns:
+        str: The path of the cache folder.
+    """
+    if os.environ.get('ProgramData'):
+        return os.path.join(os.environ['ProgramData'], 'Kalymos', 'cache')
+    return os.path.join(tempfile.gettempdir(), 'kalymos-cache')
+
+_cache_dir = default_cache_dir()
+
+def set_cache_dir(path):
+    """
+    Changes the cache folder.
+
+    Args:
+        path (str): The cache folder, or an empty value to disable the cache.
+    """
+    global _cache_dir
+    _cache_dir = path or None
+
+def get_cache_dir():
+    """
+    Returns the cache folder.
+
+    Returns:
+        str: The path of the cache folder, or None if the cache is disabled.
+    """
+    return _cache_dir
+
+def entry_path(sha256):
+    """
+    Returns where an asset with the given hash is stored.
+
+    Args:
+        sha256 (str): The SHA-256 hash of the asset.
+
+    Returns:
+        str: The path of the cache entry, or None if the cache is disabled.
+    """
+    if not _cache_dir or not sha256:
+        return None
+    sha256 = sha256.lower()
+    return os.path.join(_cache_dir, 'sha256', sha256[:2], sha256)
+
+def copy_to(sha256, destination):
+    """
+    Copies a cached asset to the destination, hashing it on the way.
+
+    The cache folder is shared by every user of the machine, so an entry is
+    not trusted for its name: one whose content does not match its hash is
+    deleted and reported as missing, so the caller downloads the asset again.
+
+    Args:
+        sha256 (str): The SHA-256 hash of the asset.
+        destination (str): The path to copy the asset to.
+
+    Returns:
+        bool: True if the asset was in the cache, matched its hash and was copied, False otherwise.
+    """
+    import hashlib
+    path = entry_path(sha256)
+    if path is None or not os.path.isfile(path):
+        return False
+    temp_path = destination + '.cache-tmp'
+    try:
+        os.makedirs(os.path.dirname(destination) or '.', exist_ok=True)
+        digest = hashlib.sha256()
+        with open(path, 'rb') as src, open(temp_path, 'wb') as dst:
+            for chunk in iter(lambda: src.read(BUFFER_SIZE), b""):
+                digest.update(chunk)
+                dst.write(chunk)
+        if digest.hexdigest() != sha256.lower():
+            logging.warning(f"Cached asset {sha256} does not match its hash. Removing it.")
+            os.remove(temp_path)
+            discard(sha256)
+            return False
+        os.replace(temp_path, destination)
+        logging.info(f"Using cached asset {sha256} for {destination}")
+        return True
+    except OSError as e:
+        logging.warning(f"Could not copy cached asset {sha256}: {e}")
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        return False
+
+def discard(sha256):
+    """
+    Removes an entry from the cache.
+
+    Args:
+        sha256 (str): The SHA-256 hash of the asset.
+    """
+    path = entry_path(sha256)
+    try:
+        if path is not None and os.path.isfile(path):
+            os.remove(path)
+    except OSError as e:
+        logging.warning(f"Could not remove cached asset {sha256}: {e}")
+
+def store(path, sha256):
+    """
+    Adds a verified file to the cache. The entry is written to a temporary
+    name and renamed, so readers never see a partial file.
+
+    Args:
+        path (str): The file to store.
+        sha256 (str): The SHA-256 hash of the file, already verified by the caller.
+    """
+    target = entry_path(sha256)
+    if target is None or os.path.isfile(target):
+        return
+    try:
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        temp_path = f"{target}.{os.getpid()}.tmp"
+        shutil.copyfile(path, temp_path)
+        os.replace(temp_path, target)
+    except OSError as e:
+        logging.warning(f"Could not add {path} to the asset cache: {e}")
+
+def hash_matches(path, sha256):
+    """
+    Checks a file against its expected SHA-256 hash.
+
+    Args:
+        path (str): The file to check.
+        sha256 (str): The expected hash.
+
+    Returns:
+        bool: True if the file exists and matches the hash.
+    """
+    import hashlib
+    digest = hashlib.sha256()
+    try:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(BUFFER_SIZE), b""):
+                digest.update(chunk)
+    except OSError:
+        return False
+    return digest.hexdigest() == sha256.lower()
+
+@contextlib.contextmanager
+def locked(sha256, timeout=LOCK_TIMEOUT):
+    """
+    Serialises fetches of the same asset across processes, so installs
+    sharing the cache download it once and the others read it from the
+    cache. The holder touches the lock as its transfers progress, so only
+    a lock left untouched for LOCK_STALE_AFTER is considered abandoned.
+
+    Args:
+        sha256 (str): The SHA-256 hash of the asset.
+        timeout (float): The maximum number of seconds to wait for the lock.
+    """
+    path = entry_path(sha256)
+    if path is None:
+        yield
+        return
+
+    lock_path = path + '.lock'
+    deadline = time.monotonic() + timeout
+    acquired = False
+    try:
+        os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+        while not acquired:
+            try:
+                os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                acquired = True
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(lock_path) > LOCK_STALE_AFTER:
+                        os.remove(lock_path)
+                        continue
+                except OSError:
+                    continue
+                if time.monotonic() > deadline:
+                    logging.warning(f"Timed out waiting for the cache lock of {sha256}")
+                    break
+                time.sleep(LOCK_POLL_INTERVAL)
+    except OSError as e:
+        logging.warning(f"Could not lock the asset cache: {e}")
+
+    touched = time.monotonic()
+    def refresh(report):
+        nonlocal touched
+        if time.monotonic() - touched >= LOCK_REFRESH_INTERVAL:
+            touched = time.monotonic()
+            try:
+                os.utime(lock_path)
+            except OSError:
+                pass
+
+    if acquired:
+        telemetry.add_progress_callback(refresh)
+    try:
+        yield
+    finally:
+        if acquired:
+            telemetry.remove_progress_callback(refresh)
+            try:
+                os.remove(lock_path)
+            except OSError:
+                pass
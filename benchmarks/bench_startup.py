@@ -0,0 +1,140 @@
+"""
+Measures what kalymos-updater.py adds to an application launch when there
+is no update: the time to import the updater and the time until it calls
+os.execv to start the application.
+
+    python benchmarks/bench_startup.py --runs 20
+
+Each run is a fresh interpreter, answered by a local fake GitHub server
+that reports the installed version as the latest release. The settings are
+read from a JSON configuration file and os.execv is intercepted, so the
+benchmark runs on any platform.
+"""
+import time
+
+STARTED = time.perf_counter()
+
+import os
+import sys
+import json
+import argparse
+
+OWNER = 'bench'
+REPO = 'app'
+VERSION = 'v1.0.0'
+HEAVY_MODULES = ['tkinter', 'psutil', 'zipfile', 'hashlib', 'lzma', 'configparser', 'subprocess', 'concurrent.futures']
+
+def child(server_url, check_interval):
+    """
+    Runs the updater's no-update path in this process and prints the timings as JSON.
+
+    Args:
+        server_url (str): The URL of the fake GitHub server.
+        check_interval (int): The CheckInterval setting, in seconds.
+    """
+    import importlib.util
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from stubs import load_updater
+
+    config = {
+        'Owner': OWNER,
+        'Repo': REPO,
+        'Version': VERSION,
+        'MainExecutable': 'app.exe',
+        'CheckInterval': str(check_interval),
+    }
+    has_tkinter = importlib.util.find_spec('tkinter') is not None
+    baseline = set(sys.modules)
+
+    start = time.perf_counter()
+    updater = load_updater(config, stub_gui=not has_tkinter)
+    imported = time.perf_counter()
+    updater.GITHUB_API_URL = server_url
+
+    def execv(path, args):
+        result = {
+            'import_seconds': imported - start,
+            'execv_seconds': time.perf_counter() - STARTED,
+            'main_seconds': time.perf_counter() - imported,
+            'modules': len(set(sys.modules) - baseline),
+            'heavy_modules': [name for name in HEAVY_MODULES if name in sys.modules and name not in baseline],
+            'tkinter_measured': has_tkinter,
+        }
+        sys.stdout.write('RESULT ' + json.dumps(result) + '\n')
+        sys.stdout.flush()
+        os._exit(0)
+
+    os.execv = execv
+    sys.argv = ['kalymos-updater.py']
+    updater.main()
+
+def run(args):
+    """
+    Starts the fake server and runs the no-update path in fresh interpreters.
+
+    Returns:
+        list: The timings of each run.
+    """
+    # Imported here so the children measure the updater's own imports
+    import shutil
+    import tempfile
+    import subprocess
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from fake_github import FakeGitHub
+
+    work_dir = tempfile.mkdtemp(prefix='kalymos-startup-')
+    server = FakeGitHub(work_dir, args.latency)
+    server.publish(OWNER, REPO, VERSION)
+    server.start()
+    results = []
+    try:
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            output = subprocess.run([sys.executable, os.path.abspath(__file__), '--child', server.url,
+                                     '--check-interval', str(args.check_interval)],
+                                    cwd=work_dir, capture_output=True, text=True).stdout
+            wall = time.perf_counter() - start
+            lines = [line for line in output.splitlines() if line.startswith('RESULT ')]
+            if not lines:
+                raise RuntimeError(f"The updater did not reach os.execv:\n{output}")
+            result = json.loads(lines[-1][len('RESULT '):])
+            result['process_seconds'] = wall
+            results.append(result)
+    finally:
+        server.shutdown()
+        server.server_close()
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+def print_report(results):
+    import statistics
+    print(f"{'metric':24} {'median ms':>10} {'min ms':>10} {'max ms':>10}")
+    for key in ('import_seconds', 'main_seconds', 'execv_seconds', 'process_seconds'):
+        values = [result[key] * 1000 for result in results]
+        print(f"{key:24} {statistics.median(values):>10.1f} {min(values):>10.1f} {max(values):>10.1f}")
+    print(f"modules imported by the updater: {results[-1]['modules']}")
+    print(f"heavy modules loaded: {', '.join(results[-1]['heavy_modules']) or 'none'}")
+    if not results[-1]['tkinter_measured']:
+        print("tkinter is not installed, so its import time is not included.")
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the updater's import time and time-to-execv when there is no update.")
+    parser.add_argument('--runs', type=int, default=10, help="Number of fresh interpreters to measure.")
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds of latency added by the fake server.")
+    parser.add_argument('--check-interval', type=int, default=0, help="CheckInterval in seconds; with a value, runs after the first answer from the release cache.")
+    parser.add_argument('--json', help="Write the results to this file as JSON.")
+    parser.add_argument('--child', metavar='URL', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.check_interval)
+        return
+
+    results = run(args)
+    print_report(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'args': vars(args), 'results': results}, f, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,256 @@
+"""
+Benchmarks the update phases of kalymos-updater.py against a local fake
+GitHub server, on a synthetic application tree and release.
+
+    python benchmarks/bench_update.py --files 2000 --size-mb 200 --changed 0.1
+    python benchmarks/bench_update.py --latency 0.05 --bandwidth-mb 20 --failure-rate 0.1
+
+The Tkinter dialogs are replaced with stubs and no registry is read, so
+the benchmark runs on any platform. Each phase reports its wall time, the
+throughput over the bytes it handled and the peak resident memory of the
+process while it ran.
+"""
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import zipfile
+import hashlib
+import argparse
+import tempfile
+import threading
+import psutil
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_github import FakeGitHub
+from stubs import load_updater
+
+OWNER = 'bench'
+REPO = 'app'
+OLD_VERSION = 'v1.0.0'
+NEW_VERSION = 'v1.1.0'
+
+def random_content(rng, size, compressible):
+    """
+    Generates file content, either random bytes or repetitive text.
+    """
+    if compressible:
+        line = f"{rng.random():.12f} synthetic application data\n".encode()
+        return (line * (size // len(line) + 1))[:size]
+    return rng.randbytes(size)
+
+def make_tree(folder, files, total_size, compressible, seed):
+    """
+    Creates a synthetic application tree of roughly total_size bytes spread
+    over files of uneven sizes in a few nested folders.
+
+    Returns:
+        list: The relative paths of the files created.
+    """
+    rng = random.Random(seed)
+    weights = [rng.paretovariate(1.2) for _ in range(files)]
+    scale = total_size / sum(weights)
+    paths = []
+    for i, weight in enumerate(weights):
+        rel_path = os.path.join(f"dir{i % 7}", f"sub{i % 3}", f"file{i}.bin")
+        path = os.path.join(folder, rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(random_content(rng, max(int(weight * scale), 1), rng.random() < compressible))
+        paths.append(rel_path)
+    return paths
+
+def make_release(app_dir, release_dir, paths, changed, compressible, seed):
+    """
+    Builds the next release of the application: a copy of the tree with a
+    share of the files rewritten and a few files added, packed as
+    update.zip with its update.zip.sha256.
+
+    Returns:
+        tuple: The path of update.zip and the relative paths the release changes or adds.
+    """
+    rng = random.Random(seed + 1)
+    asset_dir = os.path.join(release_dir, OWNER, REPO, NEW_VERSION)
+    os.makedirs(asset_dir, exist_ok=True)
+    zip_path = os.path.join(asset_dir, 'update.zip')
+
+    touched = set(rng.sample(paths, int(len(paths) * changed)))
+    added = [os.path.join('new', f"file{i}.bin") for i in range(max(len(paths) // 100, 1))]
+    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED, compresslevel=1) as archive:
+        for rel_path in paths:
+            arcname = rel_path.replace(os.sep, '/')
+            if rel_path in touched:
+                size = os.path.getsize(os.path.join(app_dir, rel_path))
+                archive.writestr(arcname, random_content(rng, size, rng.random() < compressible))
+            else:
+                archive.write(os.path.join(app_dir, rel_path), arcname)
+        for rel_path in added:
+            archive.writestr(rel_path.replace(os.sep, '/'), random_content(rng, 64 * 1024, True))
+
+    digest = hashlib.sha256()
+    with open(zip_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    with open(zip_path + '.sha256', 'w') as f:
+        f.write(digest.hexdigest())
+    return zip_path, sorted(touched) + added
+
+class PeakMemory:
+    """
+    Samples the resident memory of the process from a background thread
+    and keeps the highest value seen.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.process = psutil.Process()
+        self.peak = 0
+        self.running = False
+        self.thread = None
+
+    def sample(self):
+        while self.running:
+            self.peak = max(self.peak, self.process.memory_info().rss)
+            time.sleep(self.interval)
+
+    def __enter__(self):
+        self.peak = self.process.memory_info().rss
+        self.running = True
+        self.thread = threading.Thread(target=self.sample, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.running = False
+        self.thread.join()
+        self.peak = max(self.peak, self.process.memory_info().rss)
+
+def run_phase(results, name, size, function, *args, **kwargs):
+    """
+    Runs one phase, recording its wall time, throughput and peak memory.
+
+    Args:
+        results (list): The list to append the result to.
+        name (str): The name of the phase.
+        size (int): The number of bytes the phase handles, for the throughput.
+        function (callable): The phase to run.
+
+    Returns:
+        The return value of the phase.
+    """
+    with PeakMemory() as memory:
+        start = time.perf_counter()
+        value = function(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+    results.append({
+        'phase': name,
+        'seconds': round(elapsed, 4),
+        'bytes': size,
+        'mb_per_s': round(size / elapsed / 1e6, 2) if size and elapsed else None,
+        'peak_rss_mb': round(memory.peak / 1e6, 1),
+        'result': value if isinstance(value, (bool, str, int, type(None))) else str(value),
+    })
+    return value
+
+def tree_size(folder, paths):
+    return sum(os.path.getsize(os.path.join(folder, rel_path)) for rel_path in paths
+               if os.path.isfile(os.path.join(folder, rel_path)))
+
+def run(args):
+    """
+    Builds the fixtures, starts the fake server and benchmarks each phase.
+
+    Returns:
+        list: One result per phase.
+    """
+    work_dir = tempfile.mkdtemp(prefix='kalymos-bench-', dir=args.work_dir)
+    app_dir = os.path.join(work_dir, 'app')
+    release_dir = os.path.join(work_dir, 'releases')
+    results = []
+
+    try:
+        print(f"Generating {args.files} files ({args.size_mb} MB) in {work_dir}")
+        paths = make_tree(app_dir, args.files, int(args.size_mb * 1e6), args.compressible, args.seed)
+        zip_path, touched = make_release(app_dir, release_dir, paths, args.changed, args.compressible, args.seed)
+        zip_size = os.path.getsize(zip_path)
+
+        updater = load_updater()
+        server = FakeGitHub(release_dir, args.latency, int(args.bandwidth_mb * 1e6), args.failure_rate, seed=args.seed)
+        server.publish(OWNER, REPO, NEW_VERSION)
+        server.start()
+        updater.GITHUB_URL = updater.GITHUB_API_URL = server.url
+        updater.asset_cache.set_cache_dir(None)
+        updater.mirror.set_mirror(None)
+        updater.telemetry.configure('benchmark', os.path.join(work_dir, 'metrics.jsonl'))
+
+        download_url = f"{server.url}/{OWNER}/{REPO}/releases/download/{NEW_VERSION}/update.zip"
+        local_zip = os.path.join(app_dir, 'update.zip')
+        hash_path = local_zip + '.sha256'
+
+        previous_dir = os.getcwd()
+        os.chdir(app_dir)
+        try:
+            run_phase(results, 'check_for_updates', 0, updater.check_for_updates, OWNER, REPO, OLD_VERSION)
+            run_phase(results, 'check_for_updates (revalidate)', 0, updater.check_for_updates, OWNER, REPO, OLD_VERSION)
+            run_phase(results, 'create_backup', tree_size(app_dir, touched), updater.create_backup, app_dir, touched, OLD_VERSION)
+            run_phase(results, 'download_file', zip_size, updater.download_file, download_url, local_zip)
+            updater.download_file(download_url + '.sha256', hash_path)
+            run_phase(results, 'verify_sha256', zip_size, updater.verify_sha256, local_zip, hash_path)
+            run_phase(results, 'extract_zip_file (cold index)', tree_size(app_dir, paths), updater.extract_zip_file, local_zip, app_dir)
+            run_phase(results, 'extract_zip_file (warm index)', tree_size(app_dir, paths), updater.extract_zip_file, local_zip, app_dir)
+
+            # The single-pass path stage_update takes when it can stream the archive
+            os.remove(local_zip)
+            with open(hash_path) as f:
+                expected_hash = f.read().strip()
+            import installer
+            import pipeline
+            index = installer.FileIndex(app_dir)
+            staging_dir = os.path.join(work_dir, 'staging')
+            run_phase(results, 'stream_update', zip_size, pipeline.stream_update,
+                      download_url, local_zip, staging_dir, expected_hash, index)
+        finally:
+            os.chdir(previous_dir)
+            server.shutdown()
+            server.server_close()
+
+        for result in results:
+            result['server'] = dict(server.stats)
+        return results
+    finally:
+        if not args.keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+def print_report(results):
+    print()
+    print(f"{'phase':32} {'seconds':>9} {'MB':>9} {'MB/s':>9} {'peak RSS MB':>12}")
+    for result in results:
+        throughput = result['mb_per_s'] if result['mb_per_s'] is not None else '-'
+        print(f"{result['phase']:32} {result['seconds']:>9.3f} {result['bytes'] / 1e6:>9.1f} {throughput:>9} {result['peak_rss_mb']:>12.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the update phases against a local fake GitHub server.")
+    parser.add_argument('--files', type=int, default=500, help="Number of files in the application tree.")
+    parser.add_argument('--size-mb', type=float, default=100, help="Total size of the application tree in MB.")
+    parser.add_argument('--changed', type=float, default=0.1, help="Share of the files the release changes.")
+    parser.add_argument('--compressible', type=float, default=0.5, help="Share of the files holding compressible data.")
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds of latency added to each request.")
+    parser.add_argument('--bandwidth-mb', type=float, default=0, help="Per-connection bandwidth in MB/s, 0 for no limit.")
+    parser.add_argument('--failure-rate', type=float, default=0.0, help="Probability that an asset request fails.")
+    parser.add_argument('--seed', type=int, default=1, help="Seed for the fixtures and the failure injection.")
+    parser.add_argument('--work-dir', help="Folder to create the fixtures in, defaults to the temp folder.")
+    parser.add_argument('--keep', action='store_true', help="Keep the fixtures after the run.")
+    parser.add_argument('--json', help="Write the results to this file as JSON.")
+    args = parser.parse_args()
+
+    results = run(args)
+    print_report(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'args': vars(args), 'results': results}, f, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,244 @@
+import os
+import json
+import time
+import random
+import hashlib
+import logging
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+CHUNK_SIZE = 64 * 1024
+NOTES_FILE = 'NOTES.md'
+
+class FakeGitHub(ThreadingHTTPServer):
+    """
+    A local stand-in for the GitHub endpoints the updater uses: the
+    'releases/latest' and paginated 'releases' API calls and the release
+    asset downloads. Every tag folder of a repository is a release, published
+    when the folder was last modified, with the notes in its 'NOTES.md'.
+    Assets are served from '{release_dir}/{owner}/{repo}/{tag}/' with HEAD
+    and Range support, and every response can be slowed down or broken on
+    purpose.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, release_dir, latency=0.0, bandwidth=0, failure_rate=0.0, port=0, seed=None):
+        """
+        Args:
+            release_dir (str): The folder holding the releases.
+            latency (float): Seconds to wait before answering each request.
+            bandwidth (int): The rate of each response body in bytes per second, or 0 for no limit.
+            failure_rate (float): The probability that an asset download fails, either with a 503 or by dropping the connection halfway.
+            port (int): The port to listen on, 0 to pick a free one.
+            seed (int, optional): Seeds the failure injection so runs are repeatable.
+        """
+        super().__init__(('127.0.0.1', port), FakeGitHubHandler)
+        self.release_dir = release_dir
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.random_lock = threading.Lock()
+        self.stats = {'requests': 0, 'not_modified': 0, 'failures': 0, 'bytes_sent': 0}
+        self.stats_lock = threading.Lock()
+        self.latest = {}
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def publish(self, owner, repo, tag):
+        """
+        Marks a tag as the latest release of a repository.
+
+        Args:
+            owner (str): The repository owner.
+            repo (str): The repository name.
+            tag (str): The tag of the release, which must exist in the release folder.
+        """
+        self.latest[(owner, repo)] = tag
+
+    def count(self, key, amount=1):
+        with self.stats_lock:
+            self.stats[key] += amount
+
+    def should_fail(self):
+        if not self.failure_rate:
+            return False
+        with self.random_lock:
+            return self.random.random() < self.failure_rate
+
+    def start(self):
+        """
+        Serves requests from a background thread.
+        """
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+class FakeGitHubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        logging.debug(format % args)
+
+    def do_HEAD(self):
+        self.handle_request(head=True)
+
+    def do_GET(self):
+        self.handle_request(head=False)
+
+    def handle_request(self, head):
+        server = self.server
+        server.count('requests')
+        if server.latency:
+            time.sleep(server.latency)
+
+        parts = self.path.split('?')[0].strip('/').split('/')
+        if len(parts) == 5 and parts[0] == 'repos' and parts[3:] == ['releases', 'latest']:
+            self.send_release(parts[1], parts[2], head)
+        elif len(parts) == 4 and parts[0] == 'repos' and parts[3] == 'releases':
+            self.send_releases(parts[1], parts[2], head)
+        elif len(parts) == 6 and parts[2:4] == ['releases', 'download']:
+            self.send_asset(parts[0], parts[1], parts[4], parts[5], head)
+        else:
+            self.send_error(404)
+
+    def release_json(self, owner, repo, tag):
+        folder = os.path.join(self.server.release_dir, owner, repo, tag)
+        names = sorted(os.listdir(folder)) if os.path.isdir(folder) else []
+        assets = [{'name': name, 'size': os.path.getsize(os.path.join(folder, name)),
+                   'browser_download_url': f"{self.server.url}/{owner}/{repo}/releases/download/{tag}/{name}"}
+                  for name in names if name != NOTES_FILE]
+        release = {'tag_name': tag, 'name': tag, 'draft': False, 'prerelease': False, 'assets': assets, 'body': ''}
+        if os.path.isdir(folder):
+            release['published_at'] = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(os.path.getmtime(folder)))
+        if NOTES_FILE in names:
+            with open(os.path.join(folder, NOTES_FILE), 'r') as f:
+                release['body'] = f.read()
+        return release
+
+    def send_release(self, owner, repo, head):
+        tag = self.server.latest.get((owner, repo))
+        if tag is None:
+            self.send_error(404)
+            return
+        self.send_json(self.release_json(owner, repo, tag), head)
+
+    def send_releases(self, owner, repo, head):
+        """
+        Lists the releases of a repository, newest first, one page at a time.
+        """
+        repo_dir = os.path.join(self.server.release_dir, owner, repo)
+        if '..' in (owner, repo) or not os.path.isdir(repo_dir):
+            self.send_error(404)
+            return
+        query = dict(pair.partition('=')[::2] for pair in self.path.partition('?')[2].split('&') if pair)
+        per_page = int(query.get('per_page', 30))
+        page = int(query.get('page', 1))
+        tags = sorted(os.listdir(repo_dir), key=lambda tag: os.path.getmtime(os.path.join(repo_dir, tag)), reverse=True)
+        tags = tags[(page - 1) * per_page:page * per_page]
+        self.send_json([self.release_json(owner, repo, tag) for tag in tags], head)
+
+    def send_json(self, data, head):
+        body = json.dumps(data).encode()
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        if self.headers.get('If-None-Match') == etag:
+            self.server.count('not_modified')
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if not head:
+            self.send_body(body)
+
+    def send_asset(self, owner, repo, tag, name, head):
+        path = os.path.join(self.server.release_dir, owner, repo, tag, name)
+        if '..' in (owner, repo, tag, name) or not os.path.isfile(path):
+            self.send_error(404)
+            return
+
+        size = os.path.getsize(path)
+        start, end = 0, size - 1
+        status = 200
+        range_header = self.headers.get('Range')
+        if range_header and range_header.startswith('bytes='):
+            first, _, last = range_header[len('bytes='):].partition('-')
+            if first:
+                start = int(first)
+                end = min(int(last), size - 1) if last else size - 1
+            else:
+                start = max(size - int(last), 0)
+            if start > end:
+                self.send_response(416)
+                self.send_header('Content-Range', f"bytes */{size}")
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            status = 206
+
+        drop_at = None
+        if not head and self.server.should_fail():
+            self.server.count('failures')
+            if self.server.random.random() < 0.5:
+                self.send_error(503)
+                return
+            drop_at = (end - start + 1) // 2
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('Content-Length', str(end - start + 1))
+        if status == 206:
+            self.send_header('Content-Range', f"bytes {start}-{end}/{size}")
+        self.end_headers()
+        if head:
+            return
+
+        with open(path, 'rb') as f:
+            f.seek(start)
+            remaining = end - start + 1
+            sent = 0
+            while remaining:
+                chunk = f.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                if drop_at is not None and sent + len(chunk) > drop_at:
+                    self.send_body(chunk[:drop_at - sent])
+                    self.close_connection = True
+                    return
+                if not self.send_body(chunk):
+                    return
+                remaining -= len(chunk)
+                sent += len(chunk)
+
+    def send_body(self, data):
+        """
+        Writes part of a response body at the configured bandwidth.
+
+        Returns:
+            bool: False if the client went away.
+        """
+        bandwidth = self.server.bandwidth
+        try:
+            for offset in range(0, len(data), CHUNK_SIZE):
+                chunk = data[offset:offset + CHUNK_SIZE]
+                started = time.monotonic()
+                self.wfile.write(chunk)
+                self.server.count('bytes_sent', len(chunk))
+                if bandwidth:
+                    delay = len(chunk) / bandwidth - (time.monotonic() - started)
+                    if delay > 0:
+                        time.sleep(delay)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+            return False
+        return True
@@ -0,0 +1,55 @@
+import os
+import sys
+import json
+import types
+import importlib.util
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+
+def install_stubs():
+    """
+    Registers a stand-in for tkinter, so dialogs answer 'yes' without a display.
+    """
+    tkinter = types.ModuleType('tkinter')
+    messagebox = types.ModuleType('tkinter.messagebox')
+    messagebox.askyesno = lambda *args, **kwargs: True
+    messagebox.showinfo = messagebox.showerror = messagebox.showwarning = lambda *args, **kwargs: None
+
+    class Tk:
+        def withdraw(self):
+            pass
+
+        def destroy(self):
+            pass
+
+    tkinter.Tk = Tk
+    tkinter.messagebox = messagebox
+    sys.modules['tkinter'] = tkinter
+    sys.modules['tkinter.messagebox'] = messagebox
+
+def load_updater(config=None, stub_gui=True):
+    """
+    Imports kalymos-updater.py, whose file name is not a valid module name.
+
+    Args:
+        config (dict, optional): Settings to write to kalymos.json in the
+            current folder, used by the updater through KALYMOS_CONFIG.
+        stub_gui (bool): Replace tkinter with a stub that answers 'yes'.
+
+    Returns:
+        module: The updater module.
+    """
+    if config is not None:
+        config_path = os.path.abspath('kalymos.json')
+        with open(config_path, 'w') as f:
+            json.dump(config, f)
+        os.environ['KALYMOS_CONFIG'] = config_path
+    if stub_gui:
+        install_stubs()
+    if REPO_DIR not in sys.path:
+        sys.path.insert(0, REPO_DIR)
+    spec = importlib.util.spec_from_file_location('kalymos_updater', os.path.join(REPO_DIR, 'kalymos-updater.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
@@ -0,0 +1,54 @@
+import os
+import json
+import time
+
+STATE_PATH = os.path.join('.kalymos', 'check.json')
+
+def save(root_folder, current_version, latest_version):
+    """
+    Records the result of a background release check for the next start.
+
+    Args:
+        root_folder (str): The root folder of the application.
+        current_version (str): The version that was installed when the check ran.
+        latest_version (str): The newer release found, or None if the application is up to date.
+    """
+    state = {'checked_at': time.time(), 'current_version': current_version, 'latest_version': latest_version}
+    state_path = os.path.join(root_folder, STATE_PATH)
+    os.makedirs(os.path.dirname(state_path), exist_ok=True)
+    with open(state_path + '.tmp', 'w') as f:
+        json.dump(state, f)
+    os.replace(state_path + '.tmp', state_path)
+
+def load(root_folder, current_version):
+    """
+    Loads the result of the last background check. A result recorded for
+    another installed version is ignored.
+
+    Args:
+        root_folder (str): The root folder of the application.
+        current_version (str): The installed version.
+
+    Returns:
+        dict: The check result with 'checked_at' and 'latest_version', or None if there is none.
+    """
+    try:
+        with open(os.path.join(root_folder, STATE_PATH), 'r') as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if state.get('current_version') != current_version:
+        return None
+    return state
+
+def clear(root_folder):
+    """
+    Removes the recorded check result, once the update it found is installed.
+
+    Args:
+        root_folder (str): The root folder of the application.
+    """
+    try:
+        os.remove(os.path.join(root_folder, STATE_PATH))
+    except OSError:
+        pass
@@ -0,0 +1,261 @@
+import os
+import json
+
+REGISTRY_KEY = r"Software\KalymosApp"
+CONFIG_ENV = 'KALYMOS_CONFIG'
+DEFAULT_CONFIG_FILE = 'kalymos.json'
+INI_SECTION = 'KalymosApp'
+
+class ConfigStore:
+    """
+    A set of string settings read in one batch and cached for the life of
+    the process. Updates only write the values that actually changed.
+    """
+
+    def __init__(self):
+        self._values = None
+
+    def read_all(self):
+        """
+        Reads every setting from the backend.
+
+        Returns:
+            dict: The settings, keyed by name.
+        """
+        raise NotImplementedError
+
+    def write(self, changed):
+        """
+        Writes settings to the backend.
+
+        Args:
+            changed (dict): The settings to write, keyed by name.
+        """
+        raise NotImplementedError
+
+    def values(self):
+        """
+        Returns every setting, reading the backend on first use only.
+
+        Returns:
+            dict: The settings, keyed by name.
+        """
+        if self._values is None:
+            self._values = {name: str(value) for name, value in self.read_all().items() if value is not None}
+        return self._values
+
+    def get(self, name, default=None):
+        """
+        Returns a setting.
+
+        Args:
+            name (str): The name of the setting.
+            default: The value to return when the setting is missing or empty.
+
+        Returns:
+            The value of the setting, or the default.
+        """
+        value = self.values().get(name)
+        return value if value not in (None, '') else default
+
+    def update(self, values):
+        """
+        Stores several settings at once, writing only those whose value changed.
+
+        Args:
+            values (dict): The settings to store, keyed by name. Values are stored as strings.
+
+        Returns:
+            dict: The settings that were written.
+        """
+        current = self.values()
+        changed = {name: str(value) for name, value in values.items() if current.get(name) != str(value)}
+        if changed:
+            self.write(changed)
+            current.update(changed)
+        return changed
+
+    def children(self, group):
+        """
+        Returns the stores nested under a group, such as the applications of multi-app mode.
+
+        Args:
+            group (str): The name of the group.
+
+        Returns:
+            dict: A store per child, keyed by name.
+        """
+        return {}
+
+class RegistryStore(ConfigStore):
+    """
+    Settings in the Windows registry, one subkey per setting holding a
+    'Value' string, as written by updater_manager.py.
+    """
+
+    def __init__(self, key=REGISTRY_KEY):
+        super().__init__()
+        self.key = key
+
+    def read_all(self):
+        import winreg
+        values = {}
+        try:
+            with winreg.OpenKey(winreg.HKEY_CURRENT_USER, self.key) as root:
+                for index in range(winreg.QueryInfoKey(root)[0]):
+                    name = winreg.EnumKey(root, index)
+                    try:
+                        with winreg.OpenKey(root, name) as reg_key:
+                            values[name], _ = winreg.QueryValueEx(reg_key, 'Value')
+                    except OSError:
+                        # Group keys such as 'Apps' hold no value
+                        pass
+        except OSError:
+            pass
+        return values
+
+    def write(self, changed):
+        import winreg
+        # The registry has no multi-value transaction: write 'Version' last,
+        # so an interrupted update never records a version it did not finish
+        for name in sorted(changed, key=lambda name: name == 'Version'):
+            with winreg.CreateKey(winreg.HKEY_CURRENT_USER, f"{self.key}\\{name}") as reg_key:
+                winreg.SetValueEx(reg_key, 'Value', 0, winreg.REG_SZ, changed[name])
+
+    def children(self, group):
+        import winreg
+        group_key = f"{self.key}\\{group}"
+        try:
+            with winreg.OpenKey(winreg.HKEY_CURRENT_USER, group_key) as reg_key:
+                names = [winreg.EnumKey(reg_key, index) for index in range(winreg.QueryInfoKey(reg_key)[0])]
+        except OSError:
+            return {}
+        return {name: RegistryStore(f"{group_key}\\{name}") for name in names}
+
+class FileStore(ConfigStore):
+    """
+    Settings in a JSON or INI file. The whole file is rewritten to a
+    temporary name and renamed over the original, so a multi-value update
+    is atomic.
+
+    In JSON, the settings are top-level strings and a group is an object of
+    objects, e.g. {"Owner": "...", "Apps": {"app1": {"Owner": "..."}}}. In
+    INI, the settings are in the [KalymosApp] section and each child has a
+    section named '<group>/<name>'.
+    """
+
+    def __init__(self, path, section=INI_SECTION, document=None):
+        super().__init__()
+        self.path = path
+        self.section = section
+        self.document = document
+
+    def is_ini(self):
+        return self.path.lower().endswith('.ini')
+
+    def load_document(self):
+        """
+        Reads the file into a dict of sections, each a dict of settings.
+
+        Returns:
+            dict: The settings of every section.
+        """
+        if self.document is not None:
+            return self.document
+        document = {}
+        try:
+            if self.is_ini():
+                import configparser
+                parser = configparser.ConfigParser(interpolation=None)
+                parser.optionxform = str
+                parser.read(self.path)
+                document = {section: dict(parser[section]) for section in parser.sections()}
+            else:
+                with open(self.path, 'r') as f:
+                    data = json.load(f)
+                document[INI_SECTION] = {name: value for name, value in data.items() if not isinstance(value, dict)}
+                for group, children in data.items():
+                    if isinstance(children, dict):
+                        for name, values in children.items():
+                            document[f"{group}/{name}"] = dict(values)
+        except (OSError, ValueError):
+            pass
+        self.document = document
+        return document
+
+    def save_document(self):
+        if self.is_ini():
+            import configparser
+            parser = configparser.ConfigParser(interpolation=None)
+            parser.optionxform = str
+            parser.read_dict(self.document)
+            with open(self.path + '.tmp', 'w') as f:
+                parser.write(f)
+        else:
+            data = dict(self.document.get(INI_SECTION, {}))
+            for section, values in self.document.items():
+                if section != INI_SECTION:
+                    group, _, name = section.partition('/')
+                    data.setdefault(group, {})[name] = values
+            with open(self.path + '.tmp', 'w') as f:
+                json.dump(data, f, indent=2)
+        os.replace(self.path + '.tmp', self.path)
+
+    def read_all(self):
+        return self.load_document().get(self.section, {})
+
+    def write(self, changed):
+        self.load_document().setdefault(self.section, {}).update(changed)
+        self.save_document()
+
+    def children(self, group):
+        document = self.load_document()
+        prefix = group + '/'
+        return {section[len(prefix):]: FileStore(self.path, section, document)
+                for section in document if section.startswith(prefix)}
+
+class EnvStore(ConfigStore):
+    """
+    Settings in environment variables. Updates only change the environment
+    of the current process and of the processes it starts.
+    """
+
+    def read_all(self):
+        return dict(os.environ)
+
+    def write(self, changed):
+        os.environ.update(changed)
+
+def open_store(location=None):
+    """
+    Opens the configuration store named by a location: 'registry', 'env',
+    or the path of a JSON or INI file.
+
+    Args:
+        location (str, optional): The store to open. Defaults to the
+            KALYMOS_CONFIG environment variable, then to the registry on
+            Windows and to kalymos.json in the current folder elsewhere.
+
+    Returns:
+        ConfigStore: The store.
+    """
+    location = location or os.environ.get(CONFIG_ENV) or ('registry' if os.name == 'nt' else DEFAULT_CONFIG_FILE)
+    if location == 'registry':
+        return RegistryStore()
+    if location == 'env':
+        return EnvStore()
+    return FileStore(location)
+
+_default_store = None
+
+def default_store():
+    """
+    Returns the configuration store of the process, opened on first use.
+
+    Returns:
+        ConfigStore: The store.
+    """
+    global _default_store
+    if _default_store is None:
+        _default_store = open_store()
+    return _default_store
@@ -0,0 +1,333 @@
+import os
+import lzma
+import ntpath
+import shutil
+import json
+import hashlib
+import zipfile
+import zlib
+import argparse
+import tempfile
+import requests
+import http_client
+from remote_file import RemoteFile
+import asset_cache
+import patch
+
+MANIFEST_NAME = 'update.manifest.json'
+PATCHES_NAME = 'update.patches.zip'
+PATCH_MIN_SIZE = 1024 * 1024
+STATE_DIR = '.kalymos'
+INSTALLED_MANIFEST = os.path.join(STATE_DIR, 'manifest.json')
+HASH_BUFFER_SIZE = 1024 * 1024
+
+def hash_file(file_path):
+    """
+    Calculates the SHA-256 hash of a file using large read buffers.
+
+    Args:
+        file_path (str): The path to the file to hash.
+
+    Returns:
+        str: The SHA-256 hash of the file.
+    """
+    sha256 = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_BUFFER_SIZE), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+def is_safe_path(rel_path):
+    """
+    Checks that a manifest or archive path stays inside the folder it is
+    written to. Names with a drive, such as 'C:foo', or starting with a
+    slash or backslash are rejected on every platform, since Windows
+    resolves them outside that folder.
+
+    Args:
+        rel_path (str): The relative path from the manifest or archive.
+
+    Returns:
+        bool: True if the path is relative and does not escape the root folder.
+    """
+    if ntpath.splitdrive(rel_path)[0] or rel_path.startswith(('/', '\\')):
+        return False
+    # Resolved against a stand-in folder, so the check does not depend on the working directory
+    root = os.path.abspath(os.path.join(os.sep, 'root'))
+    target = os.path.normpath(os.path.join(root, rel_path.replace('\\', '/')))
+    try:
+        return os.path.commonpath([root, target]) == root
+    except ValueError:
+        return False
+
+def build_manifest(root_folder, version, previous_folders=(), patches_path=None):
+    """
+    Builds the file manifest of a release tree. Release authors publish the
+    result as update.manifest.json next to update.zip.
+
+    When the trees of previous versions are given, binary patches are made
+    for the large files that changed and written to patches_path, published
+    as update.patches.zip. Each file entry then lists its patches keyed by
+    the SHA-256 hash of the file they apply to.
+
+    Args:
+        root_folder (str): The folder containing the release files.
+        version (str): The release tag.
+        previous_folders (list): The folders containing earlier releases to patch from.
+        patches_path (str, optional): The patch archive to write, required with previous_folders.
+
+    Returns:
+        dict: The manifest with the size and SHA-256 hash of every file.
+    """
+    files = {}
+    for root, dirs, filenames in os.walk(root_folder):
+        dirs[:] = [d for d in dirs if d != STATE_DIR]
+        for filename in filenames:
+            file_path = os.path.join(root, filename)
+            rel_path = os.path.relpath(file_path, root_folder).replace(os.sep, '/')
+            files[rel_path] = {'size': os.path.getsize(file_path), 'sha256': hash_file(file_path)}
+
+    if previous_folders and patches_path:
+        with zipfile.ZipFile(patches_path, 'w', zipfile.ZIP_STORED) as patches_zip, \
+                tempfile.TemporaryDirectory() as temp_dir:
+            for rel_path, entry in sorted(files.items()):
+                if entry['size'] < PATCH_MIN_SIZE:
+                    continue
+                for previous_folder in previous_folders:
+                    base_path = os.path.join(previous_folder, rel_path)
+                    if not os.path.isfile(base_path):
+                        continue
+                    base_hash = hash_file(base_path)
+                    if base_hash == entry['sha256'] or base_hash in entry.get('patches', {}):
+                        continue
+                    patch_path = os.path.join(temp_dir, 'patch')
+                    if not patch.make_patch(base_path, os.path.join(root_folder, rel_path), patch_path) \
+                            or os.path.getsize(patch_path) > entry['size'] * patch.MAX_LITERAL_RATIO:
+                        continue
+                    patch_name = f"{rel_path}.{base_hash[:16]}.patch"
+                    patches_zip.write(patch_path, patch_name)
+                    entry.setdefault('patches', {})[base_hash] = patch_name
+    return {'version': version, 'files': files}
+
+def archive_manifest(zip_file, version):
+    """
+    Builds the file manifest of a release from its update.zip, for releases
+    that do not publish update.manifest.json. Files are described by the
+    size and CRC-32 held in the central directory instead of a SHA-256 hash.
+
+    Args:
+        zip_file (str): The path to the ZIP file.
+        version (str): The release tag.
+
+    Returns:
+        dict: The manifest with the size and CRC-32 of every file.
+    """
+    with zipfile.ZipFile(zip_file, 'r') as zip_ref:
+        files = {info.filename: {'size': info.file_size, 'crc32': info.CRC}
+                 for info in zip_ref.infolist() if not info.is_dir()}
+    return {'version': version, 'files': files}
+
+def fetch_manifest(url):
+    """
+    Downloads the file manifest of a release.
+
+    Args:
+        url (str): The URL of the manifest.
+
+    Returns:
+        dict: The manifest, or None if the release does not publish one.
+    """
+    try:
+        response = http_client.get(url)
+        if response.status_code == 404:
+            print("No update manifest published for this release.")
+            return None
+        response.raise_for_status()
+        manifest = response.json()
+        if not all(is_safe_path(path) for path in manifest['files']):
+            print("Update manifest contains unsafe paths. Ignoring it.")
+            return None
+        return manifest
+    except requests.exceptions.RequestException as e:
+        print(f"An error occurred while downloading the update manifest: {e}")
+        return None
+    except (ValueError, KeyError, TypeError) as e:
+        print(f"Error decoding the update manifest: {e}")
+        return None
+
+def load_installed_manifest(root_folder):
+    """
+    Loads the manifest recorded by the last successful update.
+
+    Args:
+        root_folder (str): The root folder of the application.
+
+    Returns:
+        dict: The installed manifest, or None if none was recorded.
+    """
+    try:
+        with open(os.path.join(root_folder, INSTALLED_MANIFEST), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def save_installed_manifest(root_folder, manifest):
+    """
+    Records the manifest of the version now installed.
+
+    Args:
+        root_folder (str): The root folder of the application.
+        manifest (dict): The manifest of the installed release.
+    """
+    manifest_path = os.path.join(root_folder, INSTALLED_MANIFEST)
+    os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+    with open(manifest_path + '.tmp', 'w') as f:
+        json.dump(manifest, f)
+    os.replace(manifest_path + '.tmp', manifest_path)
+
+def diff_manifest(manifest, root_folder):
+    """
+    Compares a release manifest to the installed tree.
+
+    Files recorded unchanged in the installed manifest are trusted by size,
+    everything else is hashed.
+
+    Args:
+        manifest (dict): The manifest of the new release.
+        root_folder (str): The root folder of the application.
+
+    Returns:
+        tuple: A list of paths to fetch and a list of paths to remove.
+    """
+    installed = load_installed_manifest(root_folder) or {'files': {}}
+    changed = []
+    for rel_path, entry in manifest['files'].items():
+        local_path = os.path.join(root_folder, rel_path)
+        if not os.path.isfile(local_path) or os.path.getsize(local_path) != entry['size']:
+            changed.append(rel_path)
+        elif installed['files'].get(rel_path) == entry:
+            continue
+        elif hash_file(local_path) != entry['sha256']:
+            changed.append(rel_path)
+
+    removed = [rel_path for rel_path in installed['files']
+               if rel_path not in manifest['files'] and is_safe_path(rel_path)]
+    return changed, removed
+
+def stage_delta(zip_url, manifest, root_folder, staging_dir, index=None, diff=None):
+    """
+    Stages only the files that differ from the release manifest. Changed
+    entries are read from the remote update.zip through Range requests and
+    verified against the manifest; the caller moves them into place.
+
+    Args:
+        zip_url (str): The URL of the full update.zip.
+        manifest (dict): The manifest of the new release.
+        root_folder (str): The root folder of the application.
+        staging_dir (str): The directory to write the changed files to.
+        index (installer.FileIndex, optional): The index of the installed tree, told about each staged file.
+        diff (tuple, optional): The result of diff_manifest, when the caller already has it.
+
+    Returns:
+        list: The relative paths to remove, or None if the caller should fall back to the full update.
+    """
+    changed, removed = diff or diff_manifest(manifest, root_folder)
+    total_bytes = sum(manifest['files'][path]['size'] for path in changed)
+    print(f"Delta update: {len(changed)} changed files ({total_bytes} bytes), {len(removed)} removed files.")
+
+    shutil.rmtree(staging_dir, ignore_errors=True)
+    os.makedirs(staging_dir)
+
+    # Files another install already fetched come from the shared cache
+    remote_paths = [rel_path for rel_path in changed
+                    if not asset_cache.copy_to(manifest['files'][rel_path]['sha256'], os.path.join(staging_dir, rel_path))]
+    patched = stage_patches(zip_url.rsplit('/', 1)[0] + '/' + PATCHES_NAME, manifest, root_folder, staging_dir, remote_paths, index)
+    remote_paths = [rel_path for rel_path in remote_paths if rel_path not in patched]
+    try:
+        if remote_paths:
+            with RemoteFile(zip_url) as remote, zipfile.ZipFile(remote) as zip_ref:
+                for rel_path in remote_paths:
+                    staged_path = os.path.join(staging_dir, rel_path)
+                    os.makedirs(os.path.dirname(staged_path), exist_ok=True)
+                    sha256 = hashlib.sha256()
+                    with zip_ref.open(rel_path) as src, open(staged_path, 'wb') as dst:
+                        for chunk in iter(lambda: src.read(HASH_BUFFER_SIZE), b""):
+                            sha256.update(chunk)
+                            dst.write(chunk)
+                    if sha256.hexdigest() != manifest['files'][rel_path]['sha256']:
+                        raise ValueError(f"Hash mismatch for {rel_path}")
+                    if index is not None:
+                        index.expect(rel_path, zip_ref.getinfo(rel_path).CRC)
+                    asset_cache.store(staged_path, manifest['files'][rel_path]['sha256'])
+    except (requests.exceptions.RequestException, OSError, KeyError, ValueError, zipfile.BadZipFile, zlib.error) as e:
+        print(f"Delta update failed: {e}")
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        return None
+
+    print(f"Delta update staged in {staging_dir}")
+    return removed
+
+def stage_patches(patches_url, manifest, root_folder, staging_dir, paths, index=None):
+    """
+    Rebuilds changed files in the staging directory from binary patches
+    against the installed files. A patch is only used when the installed
+    file matches its base hash, and every rebuilt file is verified against
+    the manifest; files that cannot be patched are left to the caller.
+
+    Args:
+        patches_url (str): The URL of update.patches.zip.
+        manifest (dict): The manifest of the new release.
+        root_folder (str): The root folder of the application.
+        staging_dir (str): The directory to write the rebuilt files to.
+        paths (list): The relative paths of the changed files.
+        index (installer.FileIndex, optional): The index of the installed tree, told about each staged file.
+
+    Returns:
+        set: The relative paths that were patched.
+    """
+    candidates = {}
+    for rel_path in paths:
+        patches = manifest['files'][rel_path].get('patches')
+        installed = os.path.join(root_folder, rel_path)
+        if patches and os.path.isfile(installed):
+            patch_name = patches.get(hash_file(installed))
+            if patch_name is not None:
+                candidates[rel_path] = patch_name
+    if not candidates:
+        return set()
+
+    patched = set()
+    try:
+        with RemoteFile(patches_url) as remote, zipfile.ZipFile(remote) as patches_zip:
+            for rel_path, patch_name in candidates.items():
+                entry = manifest['files'][rel_path]
+                staged_path = os.path.join(staging_dir, rel_path)
+                try:
+                    with patches_zip.open(patch_name) as patch_file:
+                        sha256, crc = patch.apply_patch(os.path.join(root_folder, rel_path), patch_file, staged_path)
+                    if sha256 != entry['sha256']:
+                        raise ValueError("the patched file does not match the release hash")
+                except (OSError, KeyError, ValueError, lzma.LZMAError, zipfile.BadZipFile, zlib.error) as e:
+                    print(f"Could not patch {rel_path}, fetching the full file: {e}")
+                    if os.path.exists(staged_path):
+                        os.remove(staged_path)
+                    continue
+                if index is not None:
+                    index.expect(rel_path, crc)
+                asset_cache.store(staged_path, entry['sha256'])
+                patched.add(rel_path)
+    except (requests.exceptions.RequestException, OSError, zipfile.BadZipFile, zlib.error) as e:
+        print(f"Patches unavailable, fetching the full files: {e}")
+
+    saved = sum(manifest['files'][rel_path]['size'] for rel_path in patched)
+    print(f"Patched {len(patched)} of {len(candidates)} files, {saved} bytes not downloaded in full.")
+    return patched
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=f"Prints the {MANIFEST_NAME} of a release folder.")
+    parser.add_argument('folder', help='The folder containing the release files.')
+    parser.add_argument('tag', help='The release tag.')
+    parser.add_argument('--previous', action='append', default=[], help='The folder of an earlier release to build patches from. Can be repeated.')
+    parser.add_argument('--patches', default=PATCHES_NAME, help=f"The patch archive to write, {PATCHES_NAME} by default.")
+    args = parser.parse_args()
+    print(json.dumps(build_manifest(args.folder, args.tag, args.previous, args.patches), indent=2))
@@ -0,0 +1,190 @@
+import os
+import json
+import logging
+import threading
+import requests
+import throttle
+import http_client
+import telemetry
+from concurrent.futures import ThreadPoolExecutor
+
+SEGMENT_SIZE = 8 * 1024 * 1024
+CHUNK_SIZE = 1024 * 1024
+CONNECTIONS = 4
+SEGMENT_ATTEMPTS = 3
+
+def probe(url):
+    """
+    Resolves redirects and reads the size and range support of a remote file.
+
+    Args:
+        url (str): The URL of the file.
+
+    Returns:
+        tuple: The final URL, the size in bytes (0 if unknown), whether Range requests are supported and the ETag.
+    """
+    response = http_client.head(url, allow_redirects=True)
+    response.raise_for_status()
+    size = int(response.headers.get('content-length', 0))
+    ranges = response.headers.get('accept-ranges', '').lower() == 'bytes'
+    return response.url, size, ranges, response.headers.get('etag')
+
+def load_state(state_path, url, size, etag):
+    """
+    Loads the sidecar of an interrupted download if it describes the same file.
+
+    Args:
+        state_path (str): The path to the sidecar file.
+        url (str): The URL being downloaded.
+        size (int): The size of the remote file.
+        etag (str): The ETag of the remote file, if any.
+
+    Returns:
+        set: The indices of the segments already on disk.
+    """
+    try:
+        with open(state_path, 'r') as f:
+            state = json.load(f)
+        if state['url'] == url and state['size'] == size and state['etag'] == etag \
+                and state['segment_size'] == SEGMENT_SIZE:
+            return set(state['done'])
+    except (OSError, ValueError, KeyError):
+        pass
+    return set()
+
+def save_state(state_path, url, size, etag, done):
+    """
+    Records which segments of a download are complete.
+
+    Args:
+        state_path (str): The path to the sidecar file.
+        url (str): The URL being downloaded.
+        size (int): The size of the remote file.
+        etag (str): The ETag of the remote file, if any.
+        done (set): The indices of the completed segments.
+    """
+    state = {'url': url, 'size': size, 'etag': etag, 'segment_size': SEGMENT_SIZE, 'done': sorted(done)}
+    with open(state_path + '.tmp', 'w') as f:
+        json.dump(state, f)
+    os.replace(state_path + '.tmp', state_path)
+
+def fetch_segment(url, part_path, start, end, progress=None):
+    """
+    Downloads one inclusive byte range into its place in the part file.
+
+    Args:
+        url (str): The resolved URL of the file.
+        part_path (str): The path to the preallocated part file.
+        start (int): The first byte of the segment.
+        end (int): The last byte of the segment.
+        progress (telemetry.Progress, optional): The progress of the whole file.
+
+    Raises:
+        OSError: If the server ignores the range or the segment is incomplete.
+        requests.exceptions.RequestException: If the request fails.
+    """
+    written = 0
+    with throttle.connection():
+        response = http_client.get(url, headers={'Range': f"bytes={start}-{end}"}, stream=True)
+        response.raise_for_status()
+        if response.status_code != 206:
+            raise OSError(f"Server ignored the Range request for {url}")
+
+        with open(part_path, 'r+b', buffering=CHUNK_SIZE) as f:
+            f.seek(start)
+            for chunk in response.iter_content(CHUNK_SIZE):
+                throttle.consume(len(chunk))
+                f.write(chunk)
+                written += len(chunk)
+                if progress is not None:
+                    progress.update(len(chunk))
+    if written != end - start + 1:
+        raise OSError(f"Segment {start}-{end} is incomplete: got {written} bytes")
+
+def download_single(url, part_path, progress=None):
+    """
+    Downloads a file over one connection when Range requests are unavailable.
+
+    Args:
+        url (str): The URL of the file.
+        part_path (str): The path to write the file to.
+        progress (telemetry.Progress, optional): The progress of the file.
+    """
+    with throttle.connection():
+        response = http_client.get(url, stream=True)
+        response.raise_for_status()
+        with open(part_path, 'wb', buffering=CHUNK_SIZE) as f:
+            for chunk in response.iter_content(CHUNK_SIZE):
+                throttle.consume(len(chunk))
+                f.write(chunk)
+                if progress is not None:
+                    progress.update(len(chunk))
+
+def download(url, destination, connections=CONNECTIONS):
+    """
+    Downloads a file over several connections using HTTP Range segments.
+
+    The data is written into a preallocated '.part' file and a '.part.json'
+    sidecar records the completed segments, so an interrupted download
+    resumes where it stopped. The destination is only replaced once every
+    segment is on disk.
+
+    Args:
+        url (str): The URL of the file to download.
+        destination (str): The destination file path.
+        connections (int): The maximum number of parallel connections.
+
+    Returns:
+        bool: True if the file was downloaded completely, False otherwise.
+    """
+    part_path = destination + '.part'
+    state_path = part_path + '.json'
+
+    try:
+        final_url, size, ranges, etag = probe(url)
+        name = os.path.basename(destination)
+        if not ranges or size == 0:
+            download_single(final_url, part_path, telemetry.Progress(name, size))
+            os.replace(part_path, destination)
+            logging.info(f"Downloaded {url} to {destination}")
+            return True
+
+        done = load_state(state_path, url, size, etag)
+        if not done or not os.path.exists(part_path):
+            done = set()
+            with open(part_path, 'wb') as f:
+                f.truncate(size)  # Preallocate so segments can be written in any order
+        else:
+            logging.info(f"Resuming download of {destination}: {len(done)} segments already on disk.")
+
+        segments = [(index, index * SEGMENT_SIZE, min((index + 1) * SEGMENT_SIZE, size) - 1)
+                    for index in range((size + SEGMENT_SIZE - 1) // SEGMENT_SIZE)]
+        lock = threading.Lock()
+        progress = telemetry.Progress(name, size, sum(end - start + 1 for index, start, end in segments if index in done))
+
+        def worker(segment):
+            index, start, end = segment
+            for attempt in range(SEGMENT_ATTEMPTS):
+                try:
+                    fetch_segment(final_url, part_path, start, end, progress)
+                    break
+                except (requests.exceptions.RequestException, OSError) as e:
+                    if attempt == SEGMENT_ATTEMPTS - 1:
+                        raise
+                    logging.warning(f"Retrying segment {index} of {destination}: {e}")
+            with lock:
+                done.add(index)
+                save_state(state_path, url, size, etag, done)
+
+        with ThreadPoolExecutor(max_workers=connections) as executor:
+            for future in [executor.submit(worker, s) for s in segments if s[0] not in done]:
+                future.result()
+
+        os.replace(part_path, destination)
+        os.remove(state_path)
+        logging.info(f"Downloaded {url} to {destination}")
+        return True
+
+    except (requests.exceptions.RequestException, OSError) as e:
+        logging.error(f"An error occurred while downloading {url}: {e}")
+        return False
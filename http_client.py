@@ -0,0 +1,189 @@
+import time
+import random
+import logging
+import threading
+import collections
+import email.utils
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+import throttle
+
+TIMEOUT = (10, 60)
+RETRIES = 3
+BACKOFF = 1.0
+MAX_BACKOFF = 30
+# Waits for Retry-After or a rate limit reset longer than this are not worth it
+MAX_RETRY_WAIT = 60
+POOL_SIZE = 8
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+RECENT_REQUESTS = 100
+
+_local = threading.local()
+_stats_lock = threading.Lock()
+_stats = {'requests': 0, 'retries': 0, 'errors': 0, 'bytes': 0, 'seconds': 0.0, 'statuses': {}}
+_recent = collections.deque(maxlen=RECENT_REQUESTS)
+
+def get_session():
+    """
+    Returns the HTTP session of the current thread, so each download
+    connection keeps its own pool of keep-alive sockets.
+
+    Returns:
+        requests.Session: The session of the calling thread.
+    """
+    if not hasattr(_local, 'session'):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        _local.session = session
+    return _local.session
+
+def retry_delay(response, attempt):
+    """
+    Works out how long to wait before retrying a request.
+
+    Retry-After is honored, in seconds or as a date. A GitHub rate limit
+    response waits for X-RateLimit-Reset. Otherwise the wait doubles with
+    each attempt, with some jitter so clients do not retry in lockstep.
+
+    Args:
+        response (requests.Response): The failed response, or None if the request raised.
+        attempt (int): The number of attempts made so far.
+
+    Returns:
+        float: The seconds to wait, or None if the request should not be retried.
+    """
+    if response is not None:
+        headers = response.headers
+        rate_limited = headers.get('X-RateLimit-Remaining') == '0' and headers.get('X-RateLimit-Reset')
+        if response.status_code not in RETRY_STATUSES and not (response.status_code == 403 and rate_limited):
+            return None
+        retry_after = headers.get('Retry-After')
+        if retry_after:
+            try:
+                delay = float(retry_after)
+            except ValueError:
+                try:
+                    delay = email.utils.parsedate_to_datetime(retry_after).timestamp() - time.time()
+                except (TypeError, ValueError):
+                    delay = None
+            if delay is not None:
+                return max(delay, 0) if delay <= MAX_RETRY_WAIT else None
+        if rate_limited:
+            delay = int(headers['X-RateLimit-Reset']) - time.time()
+            return max(delay, 0) if delay <= MAX_RETRY_WAIT else None
+    delay = min(MAX_BACKOFF, BACKOFF * 2 ** (attempt - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+def record(method, url, status, seconds, size, attempts):
+    """
+    Adds a request to the statistics.
+
+    Args:
+        method (str): The HTTP method.
+        url (str): The URL requested.
+        status (int): The final status code, or None if the request failed.
+        seconds (float): The time spent, including the waits between retries.
+        size (int): The body bytes, as read or as announced for streamed responses.
+        attempts (int): The number of attempts made.
+    """
+    entry = {'method': method, 'host': urlsplit(url).netloc, 'status': status,
+             'seconds': round(seconds, 4), 'bytes': size, 'attempts': attempts}
+    with _stats_lock:
+        _stats['requests'] += 1
+        _stats['retries'] += attempts - 1
+        _stats['bytes'] += size
+        _stats['seconds'] += seconds
+        if status is None:
+            _stats['errors'] += 1
+        else:
+            _stats['statuses'][status] = _stats['statuses'].get(status, 0) + 1
+        _recent.append(entry)
+
+def get_stats():
+    """
+    Returns the totals of every request made by the process.
+
+    Returns:
+        dict: 'requests', 'retries', 'errors', 'bytes', 'seconds' and the count of each status code in 'statuses'.
+    """
+    with _stats_lock:
+        stats = dict(_stats, statuses=dict(_stats['statuses']))
+    stats['seconds'] = round(stats['seconds'], 4)
+    return stats
+
+def recent_requests():
+    """
+    Returns the last requests made by the process, oldest first.
+
+    Returns:
+        list: A dict per request with 'method', 'host', 'status', 'seconds', 'bytes' and 'attempts'.
+    """
+    with _stats_lock:
+        return list(_recent)
+
+def request(method, url, timeout=TIMEOUT, retries=RETRIES, **kwargs):
+    """
+    Sends a request through the pooled session of the calling thread.
+
+    Connection errors, timeouts, bodies cut short, 429 and 5xx responses
+    and GitHub rate limits are retried with exponential backoff. The body
+    of a response that is not streamed counts against the bandwidth cap;
+    streamed bodies are counted by the caller as they are read.
+
+    Args:
+        method (str): The HTTP method.
+        url (str): The URL to request.
+        timeout (float or tuple): The connect and read timeouts, in seconds.
+        retries (int): The number of retries after the first attempt.
+        **kwargs: Passed on to requests.Session.request.
+
+    Returns:
+        requests.Response: The last response, which may still be an error.
+
+    Raises:
+        requests.exceptions.RequestException: If the last attempt fails without a response.
+    """
+    start = time.monotonic()
+    attempt = 0
+    while True:
+        attempt += 1
+        response = None
+        try:
+            response = get_session().request(method, url, timeout=timeout, **kwargs)
+            error = None
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                requests.exceptions.ChunkedEncodingError) as e:
+            error = e
+        delay = retry_delay(response, attempt) if attempt <= retries else None
+        if delay is None:
+            break
+        logging.warning(f"Retrying {method} {url} in {delay:.1f}s: {error or response.status_code}")
+        if response is not None:
+            response.close()
+        time.sleep(delay)
+
+    if error is not None:
+        record(method, url, None, time.monotonic() - start, 0, attempt)
+        raise error
+    if kwargs.get('stream'):
+        size = int(response.headers.get('content-length', 0))
+    else:
+        size = len(response.content)
+        throttle.consume(size)
+    record(method, url, response.status_code, time.monotonic() - start, size, attempt)
+    return response
+
+def get(url, **kwargs):
+    """
+    Sends a GET request. See request().
+    """
+    return request('GET', url, **kwargs)
+
+def head(url, **kwargs):
+    """
+    Sends a HEAD request. See request().
+    """
+    return request('HEAD', url, **kwargs)
@@ -0,0 +1,166 @@
+import os
+import json
+import shutil
+import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from delta import STATE_DIR, is_safe_path
+
+INDEX_PATH = os.path.join(STATE_DIR, 'index.json')
+BUFFER_SIZE = 1024 * 1024
+
+def file_crc32(file_path):
+    """
+    Calculates the CRC-32 of a file, as stored in ZIP entries.
+
+    Args:
+        file_path (str): The path to the file.
+
+    Returns:
+        int: The CRC-32 of the file.
+    """
+    crc = 0
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(BUFFER_SIZE), b""):
+            crc = zlib.crc32(chunk, crc)
+    return crc
+
+class FileIndex:
+    """
+    A cached index of the installed files, keyed by relative path, holding
+    the size, modification time and CRC-32 of each file. A file whose size
+    and modification time match the index is not read again.
+    """
+
+    def __init__(self, root_folder):
+        self.root_folder = root_folder
+        self.pending = {}
+        try:
+            with open(os.path.join(root_folder, INDEX_PATH), 'r') as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def crc32(self, rel_path, size):
+        """
+        Returns the CRC-32 of an installed file, reading it only when the
+        index is stale.
+
+        Args:
+            rel_path (str): The path relative to the root folder.
+            size (int): The size the caller expects, to skip reading files that already differ.
+
+        Returns:
+            int: The CRC-32 of the file, or None if it is missing or has a different size.
+        """
+        key = rel_path.replace('\\', '/')
+        try:
+            stat = os.stat(os.path.join(self.root_folder, rel_path))
+        except OSError:
+            return None
+        if stat.st_size != size:
+            return None
+        entry = self.entries.get(key)
+        if entry and entry[0] == stat.st_size and entry[1] == stat.st_mtime_ns:
+            return entry[2]
+        crc = file_crc32(os.path.join(self.root_folder, rel_path))
+        self.entries[key] = [stat.st_size, stat.st_mtime_ns, crc]
+        return crc
+
+    def is_unchanged(self, rel_path, size, crc):
+        """
+        Checks whether an installed file already matches an archive entry.
+
+        Args:
+            rel_path (str): The path relative to the root folder.
+            size (int): The uncompressed size of the entry.
+            crc (int): The CRC-32 of the entry.
+
+        Returns:
+            bool: True if the installed file has the same size and CRC-32.
+        """
+        return self.crc32(rel_path, size) == crc
+
+    def expect(self, rel_path, crc):
+        """
+        Records the CRC-32 of a file about to be installed, so it is indexed
+        once it is in place without being read back.
+
+        Args:
+            rel_path (str): The path relative to the root folder.
+            crc (int): The CRC-32 of the new file.
+        """
+        self.pending[rel_path.replace('\\', '/')] = crc
+
+    def save(self):
+        """
+        Indexes the installed files recorded with expect() and writes the index.
+        """
+        for key, crc in self.pending.items():
+            try:
+                stat = os.stat(os.path.join(self.root_folder, key))
+                self.entries[key] = [stat.st_size, stat.st_mtime_ns, crc]
+            except OSError:
+                self.entries.pop(key, None)
+        self.pending = {}
+        index_path = os.path.join(self.root_folder, INDEX_PATH)
+        os.makedirs(os.path.dirname(index_path), exist_ok=True)
+        with open(index_path + '.tmp', 'w') as f:
+            json.dump(self.entries, f)
+        os.replace(index_path + '.tmp', index_path)
+
+def extract_changed(zip_file, extract_to, index, workers=None):
+    """
+    Extracts only the archive entries that differ from the installed files.
+
+    The central directory gives each entry's size and CRC-32, which are
+    compared to the index of the installed tree. Differing entries are
+    decompressed on a thread pool into temporary files, then renamed into
+    place once all of them are written.
+
+    Args:
+        zip_file (str): The path to the ZIP file.
+        extract_to (str): The folder to write the changed files to.
+        index (FileIndex): The index of the installed tree.
+        workers (int, optional): The number of decompression threads.
+
+    Returns:
+        tuple: The number of files and bytes written.
+
+    Raises:
+        zipfile.BadZipFile: If the archive contains an unsafe path.
+    """
+    with zipfile.ZipFile(zip_file, 'r') as zip_ref:
+        entries = []
+        for info in zip_ref.infolist():
+            if not is_safe_path(info.filename):
+                raise zipfile.BadZipFile(f"Unsafe path in archive: {info.filename}")
+            if info.is_dir():
+                os.makedirs(os.path.join(extract_to, info.filename), exist_ok=True)
+            elif not index.is_unchanged(info.filename, info.file_size, info.CRC):
+                entries.append(info)
+
+        def decompress(info):
+            temp_path = os.path.join(extract_to, info.filename) + '.kalymos-new'
+            os.makedirs(os.path.dirname(temp_path), exist_ok=True)
+            with zip_ref.open(info) as src, open(temp_path, 'wb') as dst:
+                shutil.copyfileobj(src, dst, BUFFER_SIZE)
+            return temp_path
+
+        temp_paths = []
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                for temp_path in executor.map(decompress, entries):
+                    temp_paths.append(temp_path)
+        except Exception:
+            for entry in entries:
+                temp_path = os.path.join(extract_to, entry.filename) + '.kalymos-new'
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+            raise
+
+    for info, temp_path in zip(entries, temp_paths):
+        os.replace(temp_path, os.path.join(extract_to, info.filename))
+        index.expect(info.filename, info.CRC)
+
+    return len(entries), sum(info.file_size for info in entries)
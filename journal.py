@@ -0,0 +1,157 @@
+import os
+import json
+import shutil
+
+JOURNAL_DIR = os.path.join('.kalymos', 'journal')
+JOURNAL_FILE = 'journal.json'
+
+def preserve(source, destination):
+    """
+    Keeps a copy of a file in the journal, as a hardlink when the volume
+    supports it. Updates replace files by renaming over them, so the link
+    keeps the old contents.
+
+    Args:
+        source (str): The installed file.
+        destination (str): The path inside the journal.
+    """
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copy2(source, destination)
+
+def load_journal(root_folder):
+    """
+    Loads the journal of the last update.
+
+    Args:
+        root_folder (str): The root folder of the application.
+
+    Returns:
+        dict: The journal, or None if there is none.
+    """
+    try:
+        with open(os.path.join(root_folder, JOURNAL_DIR, JOURNAL_FILE), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def save_journal(root_folder, journal):
+    """
+    Writes the journal atomically.
+
+    Args:
+        root_folder (str): The root folder of the application.
+        journal (dict): The journal to write.
+    """
+    journal_path = os.path.join(root_folder, JOURNAL_DIR, JOURNAL_FILE)
+    with open(journal_path + '.tmp', 'w') as f:
+        json.dump(journal, f)
+    os.replace(journal_path + '.tmp', journal_path)
+
+def begin(root_folder, touched_paths, previous_version):
+    """
+    Starts a backup journal for an update. Only the files the update will
+    overwrite or delete are preserved; paths that do not exist yet are
+    recorded so a rollback can remove them.
+
+    Args:
+        root_folder (str): The root folder of the application.
+        touched_paths (list): The relative paths the update will write or delete.
+        previous_version (str): The version installed before the update.
+    """
+    journal_dir = os.path.join(root_folder, JOURNAL_DIR)
+    shutil.rmtree(journal_dir, ignore_errors=True)
+    os.makedirs(journal_dir)
+
+    backed_up, created = [], []
+    for rel_path in sorted(set(touched_paths)):
+        installed = os.path.join(root_folder, rel_path)
+        if os.path.isfile(installed):
+            preserve(installed, os.path.join(journal_dir, 'files', rel_path))
+            backed_up.append(rel_path)
+        elif not os.path.exists(installed):
+            created.append(rel_path)
+
+    save_journal(root_folder, {'version': previous_version, 'state': 'pending',
+                               'backed_up': backed_up, 'created': created})
+    print(f"Backup journal created: {len(backed_up)} files preserved, {len(created)} new files.")
+
+def is_pending(root_folder):
+    """
+    Checks whether an update was interrupted while its files were being moved into place.
+
+    Args:
+        root_folder (str): The root folder of the application.
+
+    Returns:
+        bool: True if the last journal was never committed.
+    """
+    journal = load_journal(root_folder)
+    return journal is not None and journal['state'] == 'pending'
+
+def commit(root_folder):
+    """
+    Marks the journaled update as applied. The journal is kept so a bad
+    update can still be rolled back until the next update starts.
+
+    Args:
+        root_folder (str): The root folder of the application.
+    """
+    journal = load_journal(root_folder)
+    if journal is not None:
+        journal['state'] = 'applied'
+        save_journal(root_folder, journal)
+
+def rollback(root_folder, only_pending=False):
+    """
+    Undoes the last update by replaying its journal: new files are removed
+    and preserved files are moved back into place. Entries restored by an
+    earlier, interrupted rollback are skipped, and the journal is only
+    cleared once every entry is back, so a failed rollback can be run again.
+
+    Args:
+        root_folder (str): The root folder of the application.
+        only_pending (bool): Only roll back an update that was never committed.
+
+    Returns:
+        str: The version restored, or None if there was no journal or some files could not be restored.
+    """
+    journal = load_journal(root_folder)
+    if journal is None:
+        print("No backup journal found. Nothing to roll back.")
+        return None
+    if only_pending and journal['state'] != 'pending':
+        print("The last update was already committed. Nothing is pending to roll back.")
+        return None
+
+    journal_dir = os.path.join(root_folder, JOURNAL_DIR)
+    failed = []
+    for rel_path in journal['created']:
+        installed = os.path.join(root_folder, rel_path)
+        try:
+            if os.path.isfile(installed):
+                os.remove(installed)
+        except PermissionError as e:
+            failed.append(rel_path)
+            print(f"Could not remove {rel_path}: {e}")
+    for rel_path in journal['backed_up']:
+        backup = os.path.join(journal_dir, 'files', rel_path)
+        if not os.path.isfile(backup):
+            # Moved back by an earlier rollback that did not finish
+            continue
+        installed = os.path.join(root_folder, rel_path)
+        try:
+            os.makedirs(os.path.dirname(installed) or '.', exist_ok=True)
+            os.replace(backup, installed)
+        except PermissionError as e:
+            failed.append(rel_path)
+            print(f"Could not restore {rel_path}: {e}")
+
+    if failed:
+        print(f"Rollback incomplete: {len(failed)} files are locked. Close the programs using them and run the rollback again.")
+        return None
+    shutil.rmtree(journal_dir, ignore_errors=True)
+    print(f"Rolled back {len(journal['backed_up'])} files and removed {len(journal['created'])} new files.")
+    return journal['version']
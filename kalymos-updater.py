@@ -1,18 +1,27 @@
-import configparser
 import os
 import shutil
-import hashlib
 import time
-import winreg
-import psutil
-import requests
-import zipfile
-import tempfile
-import subprocess
-import tkinter as tk
-from tkinter import messagebox
-from datetime import datetime
 import sys
+import argparse
+import release_cache
+import release_index
+import journal
+import throttle
+import asset_cache
+import mirror
+import telemetry
+import check_state
+import config_store
+
+# The GUI, process control, archive, hashing and download modules are
+# imported where they are used, so the common no-update path only loads
+# what it needs before starting the application.
+
+GITHUB_URL = 'https://github.com'
+GITHUB_API_URL = 'https://api.github.com'
+BACKGROUND_CHECK_TIMEOUT = (3, 5)
+PROBE_TIMEOUT = (10, 30)
+HASH_BUFFER_SIZE = 1024 * 1024
 
 def is_application_running(executable_name):
     """
@@ -24,110 +33,168 @@ def is_application_running(executable_name):
     Returns:
         bool: True if the application is running, False otherwise.
     """
-    for process in psutil.process_iter(['name']):
-        if process.info['name'] == executable_name:
-            return True
-    return False
+    import process_control
+    return bool(process_control.find_instances(executable_name))
 
-def close_application(executable_name):
+def close_application(executable_name, timeout=10, root_folder='.'):
     """
-    Attempts to close the specified application if it is running.
+    Closes every running instance of the specified application. Instances
+    are asked to terminate all at once and killed if they are still running
+    after the timeout.
 
     Args:
         executable_name (str): The name of the executable to close.
+        timeout (float): Seconds to wait for the instances to exit gracefully.
+        root_folder (str): The folder the application is installed in.
 
     Returns:
-        bool: True if the application was successfully closed, False otherwise.
-    """
-    for process in psutil.process_iter(['name', 'pid']):
-        if process.info['name'] == executable_name:
-            print(f"Closing {executable_name}...")
-            process.terminate()  # Gracefully terminate the process
-            process.wait()  # Wait for the process to terminate
-            print(f"{executable_name} has been closed.")
+        bool: True if no instance is left running, False otherwise.
+    """
+    import process_control
+    with telemetry.phase('close', executable=executable_name) as measurement:
+        start = time.monotonic()
+        processes = process_control.find_instances(executable_name, root_folder)
+        discovery = time.monotonic() - start
+        measurement.fields.update(instances=len(processes), discovery=round(discovery, 4))
+        if not processes:
             return True
-    return False
+
+        print(f"Closing {len(processes)} instances of {executable_name}...")
+        report = process_control.stop_instances(processes, timeout)
+        print(f"Discovery took {discovery:.2f}s, terminate {report['terminate']:.2f}s, kill {report['kill']:.2f}s.")
+        measurement.fields.update(terminate=round(report['terminate'], 4), kill=round(report['kill'], 4))
+        if report['alive']:
+            print(f"{len(report['alive'])} instances of {executable_name} could not be closed.")
+            measurement.outcome = 'failed'
+            return False
+        print(f"{executable_name} has been closed.")
+        return True
 
 def load_config():
     """
-    Retrieves configuration values from the Windows registry and displays an error message if any value is missing.
+    Retrieves the configuration values from the configuration store and displays an error message if any value is missing.
 
     Returns:
-        dict: A dictionary containing the values from the registry ('Owner', 'Repo', 'Version', 'MainExecutable').
+        tuple: The 'Owner', 'Repo', 'Version' and 'MainExecutable' values.
     """
-    registry_key = r"Software\KalymosApp"
     required_vars = ['Owner', 'Repo', 'Version', 'MainExecutable']
-    config = {}
 
-    # Attempt to retrieve values from the registry
-    for var in required_vars:
-        try:
-            with winreg.OpenKey(winreg.HKEY_CURRENT_USER, f"{registry_key}\\{var}") as reg_key:
-                value, _ = winreg.QueryValueEx(reg_key, "Value")
-                if not value:
-                    raise FileNotFoundError
-                config[var] = value
-        except (FileNotFoundError, OSError):
-            # Show an error message if any registry key is missing or inaccessible
-            root = tk.Tk()
-            root.withdraw()  # Hide the main Tkinter window
-            messagebox.showerror("Missing Registry Key", f"The registry key for '{var}' is missing or inaccessible. Please ensure all required registry keys are set.")
-            root.destroy()  # Close the Tkinter window
-            sys.exit(1)  # Exit with an error code
-
-    return config['Owner'], config['Repo'], config['Version'], config['MainExecutable']
-
-def check_for_updates(owner, repo, current_version):
+    # Every setting is read in one batch and cached for the later lookups
+    with telemetry.phase('config_load'):
+        store = config_store.default_store()
+        store.values()
+        for var in required_vars:
+            if store.get(var) is None:
+                # Show an error message if any setting is missing or inaccessible
+                import tkinter as tk
+                from tkinter import messagebox
+                root = tk.Tk()
+                root.withdraw()  # Hide the main Tkinter window
+                messagebox.showerror("Missing Setting", f"The setting '{var}' is missing or inaccessible. Please ensure all required settings are set.")
+                root.destroy()  # Close the Tkinter window
+                sys.exit(1)  # Exit with an error code
+
+    return store.get('Owner'), store.get('Repo'), store.get('Version'), store.get('MainExecutable')
+
+def load_optional_setting(var, default, store=None):
+    """
+    Retrieves an optional configuration value from the configuration store.
+
+    Args:
+        var (str): The name of the setting.
+        default: The value to return when the setting is not set.
+        store (config_store.ConfigStore, optional): The store holding the setting. Defaults to the store of the process.
+
+    Returns:
+        The value of the setting, or the default.
+    """
+    return (store or config_store.default_store()).get(var, default)
+
+def load_app_entries():
+    """
+    Retrieves the applications listed under 'Apps' in the configuration store for multi-app mode.
+    Each application holds the same settings as the single-app layout, plus its 'Folder'.
+
+    Returns:
+        list: A dictionary per application with 'Name', 'Store', 'Owner', 'Repo', 'Version', 'MainExecutable' and 'Folder'.
+    """
+    entries = []
+    for name, store in config_store.default_store().children('Apps').items():
+        entry = {'Name': name, 'Store': store}
+        for var in ['Owner', 'Repo', 'Version', 'MainExecutable', 'Folder']:
+            entry[var] = load_optional_setting(var, None, store)
+        if None in entry.values():
+            print(f"Skipping {name}: its settings are incomplete.")
+            continue
+        entries.append(entry)
+    return entries
+
+def check_for_updates(owner, repo, current_version, min_interval=0, timeout=release_cache.TIMEOUT):
     """
     Checks the GitHub repository for a new release using the GitHub API.
 
+    The release metadata is cached on disk and revalidated with conditional
+    requests, so repeated checks do not use up the API rate limit.
+
     Args:
         owner (str): The GitHub repository owner.
         repo (str): The GitHub repository name.
         current_version (str): The current version of the application.
+        min_interval (int): Seconds during which a cached answer is used without contacting GitHub.
+        timeout (float or tuple): The connect and read timeouts of the request, in seconds.
 
     Returns:
         str: The latest version available, or None if there is no update.
     """
-    url = f"https://api.github.com/repos/{owner}/{repo}/releases/latest"
+    url = f"{GITHUB_API_URL}/repos/{owner}/{repo}/releases/latest"
     
-    try:
-        response = requests.get(url)
-        response.raise_for_status()  # Raise an exception for HTTP errors
-        
-        latest_version = response.json()['tag_name']
-        
-        if latest_version > current_version:
-            print(f"New version available: {latest_version}")
-            return latest_version
-        else:
-            print("You are already using the latest version.")
+    with telemetry.phase('check', repo=f"{owner}/{repo}", current_version=current_version) as measurement:
+        try:
+            latest_version = release_cache.get_release(url, min_interval, timeout=timeout)['tag_name']
+            measurement.fields['latest_version'] = latest_version
+            
+            if release_index.is_newer(latest_version, current_version):
+                print(f"New version available: {latest_version}")
+                return latest_version
+            else:
+                print("You are already using the latest version.")
+                return None
+        except OSError as e:
+            # requests.exceptions.RequestException is an OSError; requests is only imported for a network check
+            print(f"An error occurred while checking for updates: {e}")
+            measurement.outcome = 'failed'
+            return None
+        except ValueError as e:
+            print(f"Error decoding JSON response: {e}")
+            measurement.outcome = 'failed'
             return None
-    except requests.exceptions.RequestException as e:
-        print(f"An error occurred while checking for updates: {e}")
-        return None
-    except ValueError as e:
-        print(f"Error decoding JSON response: {e}")
-        return None
 
 def download_file(url, destination):
     """
     Downloads a file from the given URL to the specified destination.
 
+    Large files are fetched over several connections and resume after an
+    interruption; the destination is only written once the file is complete.
+    The configured mirror is tried before GitHub.
+
     Args:
         url (str): The URL of the file to download.
         destination (str): The destination file path to save the downloaded file.
+
+    Returns:
+        bool: True if the file was downloaded completely, False otherwise.
     """
-    try:
-        response = requests.get(url, stream=True)
-        response.raise_for_status()
-        with open(destination, 'wb') as file:
-            for chunk in response.iter_content(1024):
-                file.write(chunk)
-        print(f"Downloaded file from {url} to {destination}")
-        
-    except requests.exceptions.RequestException as e:
-        print(f"An error occurred while downloading the file: {e}")
+    import downloader
+    with telemetry.phase('download', file=os.path.basename(destination)) as measurement:
+        for candidate in mirror.candidates(url):
+            if downloader.download(candidate, destination):
+                print(f"Downloaded file from {candidate} to {destination}")
+                measurement.bytes = os.path.getsize(destination)
+                measurement.fields['source'] = candidate
+                return True
+        print(f"An error occurred while downloading the file from {url}")
+        measurement.outcome = 'failed'
+        return False
 
 def calculate_sha256(file_path):
     """
@@ -139,9 +206,10 @@ def calculate_sha256(file_path):
     Returns:
         str: The SHA-256 hash of the file.
     """
+    import hashlib
     sha256 = hashlib.sha256()
     with open(file_path, 'rb') as f:
-        for chunk in iter(lambda: f.read(4096), b""):
+        for chunk in iter(lambda: f.read(HASH_BUFFER_SIZE), b""):
             sha256.update(chunk)
     return sha256.hexdigest()
 
@@ -156,102 +224,856 @@ def verify_sha256(file_path, expected_hash_path):
     Returns:
         bool: True if the file's hash matches the expected hash, False otherwise.
     """
-    try:
-        with open(expected_hash_path, 'r') as hash_file:
-            expected_hash = hash_file.read().strip()
-        
-        file_hash = calculate_sha256(file_path)
-        if file_hash == expected_hash:
-            print(f"SHA-256 hash verified: {file_hash}")
-            return True
-        else:
-            print(f"Hash mismatch: Expected {expected_hash}, but got {file_hash}")
+    with telemetry.phase('verify', file=os.path.basename(file_path)) as measurement:
+        try:
+            with open(expected_hash_path, 'r') as hash_file:
+                expected_hash = hash_file.read().strip()
+            
+            file_hash = calculate_sha256(file_path)
+            measurement.bytes = os.path.getsize(file_path)
+            if file_hash == expected_hash:
+                print(f"SHA-256 hash verified: {file_hash}")
+                return True
+            else:
+                print(f"Hash mismatch: Expected {expected_hash}, but got {file_hash}")
+                measurement.outcome = 'failed'
+                return False
+        except FileNotFoundError:
+            print("Hash file not found.")
+            measurement.outcome = 'failed'
+            return False
+        except Exception as e:
+            print(f"Error verifying SHA-256 hash: {e}")
+            measurement.outcome = 'failed'
             return False
-    except FileNotFoundError:
-        print("Hash file not found.")
-        return False
-    except Exception as e:
-        print(f"Error verifying SHA-256 hash: {e}")
-        return False
 
-def check_disk_space(file_size):
+def check_disk_space(file_size, path='.'):
     """
     Checks if there is enough disk space available to download and extract the update.
 
     Args:
         file_size (int): The size of the file to be downloaded, in bytes.
+        path (str): A path on the volume to check.
 
     Returns:
         bool: True if there is enough disk space, False otherwise.
     """
-    free_space = shutil.disk_usage('.').free
-    if free_space > file_size:
+    with telemetry.phase('space_check', required=file_size) as measurement:
+        free_space = shutil.disk_usage(path).free
+        measurement.fields['free'] = free_space
+        if free_space > file_size:
+            return True
+        else:
+            print("Not enough disk space available.")
+            measurement.outcome = 'failed'
+            return False
+
+def check_plan_space(plan):
+    """
+    Checks if every volume the update writes to has the space the update plan needs.
+    Only the asset cache may run short; it is then skipped for this update.
+
+    Args:
+        plan (dict): The update plan from planner.plan_update or planner.plan_delta.
+
+    Returns:
+        bool: True if there is enough disk space, False otherwise.
+    """
+    required = sum(volume['required'] for volume in plan['volumes'])
+    with telemetry.phase('space_check', required=required) as measurement:
+        measurement.fields['volumes'] = plan['volumes']
+        for volume in plan['volumes']:
+            if volume['free'] > volume['required']:
+                continue
+            if volume['optional']:
+                print(f"Not enough space to cache the update in {volume['path']}.")
+                continue
+            print(f"Not enough disk space on {volume['path']}: {volume['required']} bytes needed, {volume['free']} free.")
+            measurement.outcome = 'failed'
+            return False
         return True
-    else:
-        print("Not enough disk space available.")
-        return False
 
-def create_backup(root_folder):
+def plan_update(download_url, root_folder, staging_dir, index):
     """
-    Creates a backup of the current application folder as a ZIP file with the current date.
+    Plans the update from the archive's central directory, read with Range
+    requests, and checks the space it needs before the download starts. When
+    the archive cannot be planned, only its size is checked.
 
     Args:
-        root_folder (str): The root folder of the application to back up.
+        download_url (str): The URL of update.zip.
+        root_folder (str): The root folder of the application.
+        staging_dir (str): The folder the changed files are staged in.
+        index (installer.FileIndex): The index of the installed tree.
+
+    Returns:
+        bool: True if the update fits on disk, False otherwise.
     """
-    today = datetime.now().strftime('%d-%m-%Y')
-    backup_zip = os.path.join(tempfile.gettempdir(), f"backup_{today}.zip")
-    
-    # Create a zip file backup
-    with zipfile.ZipFile(backup_zip, 'w', zipfile.ZIP_DEFLATED) as zipf:
-        for root, dirs, files in os.walk(root_folder):
-            for file in files:
-                if not file.endswith('.zip'):  # Exclude existing ZIP files from the backup
-                    file_path = os.path.join(root, file)
-                    zipf.write(file_path, os.path.relpath(file_path, root_folder))
-    
-    # Move backup to the root folder
-    shutil.move(backup_zip, os.path.join(root_folder, os.path.basename(backup_zip)))
-    print(f"Backup created at {os.path.join(root_folder, os.path.basename(backup_zip))}")
+    import zipfile
+    import requests
+    import planner
+    import http_client
+    plan = None
+    with telemetry.phase('plan') as measurement:
+        try:
+            plan = planner.plan_update(mirror.pick_url(download_url), root_folder, staging_dir, index)
+            measurement.bytes = plan['fetched']
+            measurement.fields.update({key: plan[key] for key in ('entries', 'changed', 'compressed', 'uncompressed')})
+        except zipfile.BadZipFile as e:
+            print(f"The update archive is invalid: {e}")
+            measurement.outcome = 'failed'
+            return False
+        except (requests.exceptions.RequestException, OSError) as e:
+            print(f"Could not plan the update: {e}")
+            measurement.outcome = 'failed'
+
+    if plan is None:
+        with telemetry.phase('probe'):
+            try:
+                file_size = int(http_client.head(download_url, allow_redirects=True, timeout=PROBE_TIMEOUT).headers.get('content-length', 0))
+            except requests.exceptions.RequestException:
+                file_size = 0
+        return check_disk_space(file_size, root_folder)
+
+    print(f"Update plan: {plan['changed']} of {plan['entries']} files changed, "
+          f"{plan['compressed']} bytes to download, {plan['changed_bytes']} bytes to write.")
+    return check_plan_space(plan)
+
+def create_backup(root_folder, touched_paths, previous_version):
+    """
+    Creates a backup journal of the files the update is about to overwrite or delete.
+
+    Args:
+        root_folder (str): The root folder of the application.
+        touched_paths (list): The relative paths the update will write or delete.
+        previous_version (str): The version installed before the update.
+    """
+    with telemetry.phase('backup', files=len(touched_paths)):
+        journal.begin(root_folder, touched_paths, previous_version)
+
+def rollback_update(root_folder, only_pending=False):
+    """
+    Undoes the last update by replaying its backup journal and restores the previous version in the registry.
+
+    Args:
+        root_folder (str): The root folder of the application.
+        only_pending (bool): Only roll back an update that was interrupted before it was committed.
+
+    Returns:
+        bool: True if an update was rolled back, False otherwise.
+    """
+    previous_version = journal.rollback(root_folder, only_pending)
+    if previous_version is None:
+        return False
+    update_registry_version(previous_version)
+    return True
 
-def extract_zip_file(zip_file, extract_to):
+def extract_zip_file(zip_file, extract_to, index=None):
     """
-    Extracts a ZIP file to the specified destination folder.
+    Extracts a ZIP file to the specified destination folder, writing only the entries that differ from the installed files.
 
     Args:
         zip_file (str): The path to the ZIP file to extract.
         extract_to (str): The destination folder to extract the ZIP file to.
+        index (installer.FileIndex, optional): The index of the installed tree, when extracting to a staging folder.
+
+    Returns:
+        tuple: The number of files and bytes written.
+    """
+    import installer
+    owns_index = index is None
+    with telemetry.phase('extract') as measurement:
+        if owns_index:
+            index = installer.FileIndex(extract_to)
+        files_written, bytes_written = installer.extract_changed(zip_file, extract_to, index)
+        if owns_index:
+            index.save()
+        measurement.bytes = bytes_written
+        measurement.fields['files'] = files_written
+    print(f"Extracted {zip_file} to {extract_to}: {files_written} files changed, {bytes_written} bytes written")
+    return files_written, bytes_written
+
+def list_files(folder):
     """
-    with zipfile.ZipFile(zip_file, 'r') as zip_ref:
-        zip_ref.extractall(extract_to)
-    print(f"Extracted {zip_file} to {extract_to}")
+    Lists the files in a folder as paths relative to it.
+
+    Args:
+        folder (str): The folder to list.
+
+    Returns:
+        list: The relative paths of every file in the folder.
+    """
+    return [os.path.relpath(os.path.join(root, file), folder)
+            for root, _, files in os.walk(folder) for file in files]
 
 def replace_files(source_folder, destination_folder):
     """
     Replaces files in the destination folder with files from the source folder.
 
+    Each file is renamed over its destination, so links kept by the backup
+    journal still point to the previous contents.
+
     Args:
         source_folder (str): The source folder containing the new version files.
         destination_folder (str): The destination folder to replace files in.
     """
-    for root, _, files in os.walk(source_folder):
-        for file in files:
-            src_file = os.path.join(root, file)
-            rel_path = os.path.relpath(src_file, source_folder)
-            dst_file = os.path.join(destination_folder, rel_path)
-            os.makedirs(os.path.dirname(dst_file), exist_ok=True)
-            shutil.move(src_file, dst_file)
+    for rel_path in list_files(source_folder):
+        dst_file = os.path.join(destination_folder, rel_path)
+        os.makedirs(os.path.dirname(dst_file) or '.', exist_ok=True)
+        os.replace(os.path.join(source_folder, rel_path), dst_file)
     print(f"Files from {source_folder} have replaced files in {destination_folder}")
 
-def launch_application(executable, updated):
+def apply_staged_update(staging_dir, root_folder, removed, manifest, index, previous_version):
+    """
+    Moves a staged update into place. Only the changed files are renamed,
+    after the files they replace are recorded in the backup journal. The
+    renamed files are then hashed and checked against the manifest before
+    the journal is committed; the files left in place were checked by
+    verify_untouched_files() before the application was closed.
+
+    Args:
+        staging_dir (str): The folder containing the changed files.
+        root_folder (str): The root folder of the application.
+        removed (list): The relative paths the new version no longer ships.
+        manifest (dict): The manifest of the new release, or None if it has none.
+        index (installer.FileIndex): The index of the installed tree.
+        previous_version (str): The version installed before the update.
+
+    Raises:
+        OSError: If a file cannot be moved into place, or an installed file does not match the manifest.
+    """
+    import delta
+    staged_paths = list_files(staging_dir)
+    create_backup(root_folder, staged_paths + removed + [delta.INSTALLED_MANIFEST], previous_version)
+    with telemetry.phase('replace', files=len(staged_paths), removed=len(removed)):
+        replace_files(staging_dir, root_folder)
+        for rel_path in removed:
+            if os.path.isfile(os.path.join(root_folder, rel_path)):
+                os.remove(os.path.join(root_folder, rel_path))
+
+    # Check what actually landed on disk while the backup can still undo it
+    if manifest is not None:
+        installed = {rel_path.replace(os.sep, '/') for rel_path in staged_paths}
+        report = verify_installation(root_folder, select_files(manifest, installed), index, staged_paths)
+        broken = sorted(report['missing'] + report['mismatched'] + report['unreadable'])
+        if broken:
+            raise OSError(f"{len(broken)} installed files do not match the release: {', '.join(broken[:5])}")
+    index.save()
+
+    manifest_path = os.path.join(root_folder, delta.INSTALLED_MANIFEST)
+    if manifest is not None:
+        delta.save_installed_manifest(root_folder, manifest)
+    elif os.path.exists(manifest_path):
+        os.remove(manifest_path)
+    journal.commit(root_folder)
+    shutil.rmtree(staging_dir, ignore_errors=True)
+
+def select_files(manifest, paths, keep=True):
+    """
+    Narrows a manifest to some of its files.
+
+    Args:
+        manifest (dict): The release manifest.
+        paths (set): The relative paths, with forward slashes.
+        keep (bool): Whether to keep the given paths, or every other file.
+
+    Returns:
+        dict: A copy of the manifest with only the selected files.
+    """
+    return {**manifest, 'files': {rel_path: entry for rel_path, entry in manifest['files'].items()
+                                  if (rel_path in paths) == keep}}
+
+def verify_untouched_files(staging_dir, root_folder, manifest, index):
+    """
+    Checks the installed files a staged update leaves in place against the
+    manifest of the new release. This runs while the application is still
+    open, so the cutover only has to hash the files it renames. Differences
+    are reported but do not stop the update.
+
+    Args:
+        staging_dir (str): The folder containing the changed files.
+        root_folder (str): The root folder of the application.
+        manifest (dict): The manifest of the new release, or None if it has none.
+        index (installer.FileIndex): The index of the installed tree, updated with the files that were hashed.
+    """
+    if manifest is None:
+        return
+    staged = {rel_path.replace(os.sep, '/') for rel_path in list_files(staging_dir)}
+    report = verify_installation(root_folder, select_files(manifest, staged, keep=False), index)
+    problems = sorted(report['missing'] + report['mismatched'] + report['unreadable'])
+    if problems:
+        print(f"{len(problems)} files not touched by the update differ from the release: {', '.join(problems[:5])}")
+
+def verify_installation(root_folder, manifest, index, installed_paths=(), fast=True):
+    """
+    Checks the installed tree against the manifest of its release, hashing
+    files on all cores. In fast mode, files whose size and modification
+    time match the index are not read, except the ones just installed.
+
+    Args:
+        root_folder (str): The root folder of the application.
+        manifest (dict): The manifest of the installed release.
+        index (installer.FileIndex): The index of the installed tree, updated with the files that were hashed.
+        installed_paths (list): The relative paths the update has just written.
+        fast (bool): Whether to trust files the index already knows.
+
+    Returns:
+        dict: The report from verify.verify_tree.
+    """
+    import verify
+    with telemetry.phase('verify_tree', files=len(manifest['files']), fast=fast) as measurement:
+        report = verify.verify_tree(root_folder, manifest, index, fast, installed_paths)
+        measurement.bytes = report['bytes']
+        measurement.fields.update(hashed=report['hashed'], missing=len(report['missing']),
+                                  mismatched=len(report['mismatched']), unreadable=len(report['unreadable']))
+        if report['missing'] or report['mismatched'] or report['unreadable']:
+            measurement.outcome = 'failed'
+    return report
+
+def verify_command(root_folder='.', fast=False):
+    """
+    Checks the installed application against the manifest recorded by the
+    last update and prints what differs, for support staff.
+
+    Args:
+        root_folder (str): The root folder of the application.
+        fast (bool): Whether to trust files whose size and modification time match the index.
+
+    Returns:
+        bool: True if every file matches the release.
+    """
+    import delta
+    import installer
+    manifest = delta.load_installed_manifest(root_folder)
+    if manifest is None:
+        print("No release manifest is recorded for this installation.")
+        return False
+    index = installer.FileIndex(root_folder)
+    report = verify_installation(root_folder, manifest, index, fast=fast)
+    for key, label in (('missing', 'Missing'), ('mismatched', 'Modified'), ('unreadable', 'Unreadable')):
+        for rel_path in report[key]:
+            print(f"{label}: {rel_path}")
+    print(f"Checked {report['files']} files of {manifest.get('version')}, "
+          f"read {report['hashed']} of them ({report['bytes']} bytes).")
+    try:
+        index.save()
+    except OSError as e:
+        print(f"Could not update the file index: {e}")
+    if report['missing'] or report['mismatched'] or report['unreadable']:
+        print("The installation does not match the release.")
+        return False
+    print("The installation matches the release.")
+    return True
+
+def stage_update(owner, repo, latest_version, staging_dir, index, root_folder='.'):
+    """
+    Downloads, verifies and extracts the changed files of a release into a staging folder.
+
+    Args:
+        owner (str): The GitHub repository owner.
+        repo (str): The GitHub repository name.
+        latest_version (str): The release tag to stage.
+        staging_dir (str): The folder to write the changed files to.
+        index (installer.FileIndex): The index of the installed tree.
+        root_folder (str): The root folder of the application.
+
+    Returns:
+        tuple: The release manifest, built from update.zip when the release publishes none,
+            and the relative paths to remove, or None if staging failed.
+    """
+    import zipfile
+    import delta
+    import planner
+    import pipeline
+    download_url = f"{GITHUB_URL}/{owner}/{repo}/releases/download/{latest_version}/update.zip"
+    update_zip_path = os.path.join(root_folder, 'update.zip')
+
+    # Fetch only the changed files when the release publishes a manifest
+    manifest_url = f"{GITHUB_URL}/{owner}/{repo}/releases/download/{latest_version}/{delta.MANIFEST_NAME}"
+    manifest = delta.fetch_manifest(mirror.pick_url(manifest_url))
+    if manifest is not None:
+        # The manifest gives the size of every changed file, so check space before fetching any
+        diff = delta.diff_manifest(manifest, root_folder)
+        if not check_plan_space(planner.plan_delta(manifest, diff[0], root_folder, staging_dir)):
+            return None
+        with telemetry.phase('delta', version=latest_version) as measurement:
+            removed = delta.stage_delta(mirror.pick_url(download_url), manifest, root_folder, staging_dir, index, diff)
+            measurement.succeeded(removed is not None)
+        if removed is not None:
+            return manifest, removed
+        print("Falling back to the full update.")
+
+    # Check disk space on every volume involved before downloading
+    if not plan_update(download_url, root_folder, staging_dir, index):
+        return None
+
+    # Fetch the expected hash first so the archive is verified as it arrives
+    hash_path = os.path.join(root_folder, 'update.zip.sha256')
+    if not download_file(download_url + '.sha256', hash_path):
+        print("Could not download the SHA-256 hash.")
+        return None
+    expected_hash = pipeline.read_expected_hash(hash_path)
+
+    # Installs sharing the asset cache fetch each release once
+    with asset_cache.locked(expected_hash):
+        cached = asset_cache.copy_to(expected_hash, update_zip_path)
+        resuming = os.path.exists(update_zip_path + '.part.json')
+
+        # Download, verify and extract the changed files in a single pass
+        streamed = False
+        if not cached and not resuming:
+            with telemetry.phase('stream', version=latest_version) as measurement:
+                written = measurement.succeeded(pipeline.stream_update(
+                    mirror.pick_url(download_url), update_zip_path, staging_dir, expected_hash, index))
+                streamed = written is not None
+                if streamed:
+                    measurement.bytes = os.path.getsize(update_zip_path)
+                    measurement.fields['files'], measurement.fields['bytes_written'] = written
+        if not streamed:
+            # Download the update
+            if not cached and not download_file(download_url, update_zip_path):
+                print("Download failed. Run the updater again to resume.")
+                return None
+
+            # Verify the downloaded file's SHA-256 hash
+            if not verify_sha256(update_zip_path, hash_path):
+                print("SHA-256 hash verification failed.")
+                return None
+
+            # Extract the changed files to the staging folder
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            try:
+                extract_zip_file(update_zip_path, staging_dir, index=index)
+            except zipfile.BadZipFile as e:
+                print(f"The update archive is invalid: {e}")
+                return None
+
+        asset_cache.store(update_zip_path, expected_hash)
+
+    # Without a published manifest, the archive describes what gets installed
+    return delta.archive_manifest(update_zip_path, latest_version), []
+
+def build_overlay(root_folder, staging_dir, manifest, overlay_dir):
+    """
+    Builds the tree a staged release produces, out of hardlinks to the
+    installed files and the staged ones, without touching the installation.
+
+    Args:
+        root_folder (str): The root folder of the application.
+        staging_dir (str): The folder holding the staged files.
+        manifest (dict): The manifest of the staged release.
+        overlay_dir (str): The folder to build the tree in.
+
+    Raises:
+        OSError: If a hardlink cannot be made, for example on a volume without hardlinks.
+    """
+    import delta
+    shutil.rmtree(overlay_dir, ignore_errors=True)
+    for rel_path in manifest['files']:
+        source = os.path.join(staging_dir, rel_path)
+        if not os.path.isfile(source):
+            source = os.path.join(root_folder, rel_path)
+        if not os.path.isfile(source):
+            continue
+        target = os.path.join(overlay_dir, rel_path)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.link(source, target)
+    delta.save_installed_manifest(overlay_dir, manifest)
+
+def stage_chain(owner, repo, path, staging_dir, index, root_folder='.'):
+    """
+    Stages every release of an upgrade path before anything is installed,
+    so the application only closes for the final renames.
+
+    The first release is staged against the installed tree. Each later one
+    is a delta staged against the tree the earlier steps produce, built
+    from hardlinks in a scratch folder. Its changed files replace the
+    earlier ones in the staging folder, so a single cutover installs the
+    last release.
+
+    Args:
+        owner (str): The GitHub repository owner.
+        repo (str): The GitHub repository name.
+        path (list): The release tags to install in order, from plan_upgrade_path.
+        staging_dir (str): The folder to write the changed files to.
+        index (installer.FileIndex): The index of the installed tree.
+        root_folder (str): The root folder of the application.
+
+    Returns:
+        tuple: The manifest of the last release and the relative paths to remove, or None if a step could not be staged.
+    """
+    import delta
+    import planner
+    staged = stage_update(owner, repo, path[0], staging_dir, index, root_folder)
+    if staged is None or len(path) == 1:
+        return staged
+    manifest, removed = staged
+    overlay_dir = os.path.join(root_folder, delta.STATE_DIR, 'chain')
+    step_dir = os.path.join(root_folder, delta.STATE_DIR, 'chain-staging')
+    try:
+        build_overlay(root_folder, staging_dir, manifest, overlay_dir)
+        for step_version in path[1:]:
+            release_url = f"{GITHUB_URL}/{owner}/{repo}/releases/download/{step_version}"
+            step_manifest = delta.fetch_manifest(mirror.pick_url(f"{release_url}/{delta.MANIFEST_NAME}"))
+            if step_manifest is None:
+                return None
+            diff = delta.diff_manifest(step_manifest, overlay_dir)
+            if not check_plan_space(planner.plan_delta(step_manifest, diff[0], overlay_dir, step_dir)):
+                return None
+            with telemetry.phase('delta', version=step_version) as measurement:
+                step_removed = delta.stage_delta(mirror.pick_url(f"{release_url}/update.zip"),
+                                                 step_manifest, overlay_dir, step_dir, index, diff)
+                measurement.succeeded(step_removed is not None)
+            if step_removed is None:
+                return None
+            for rel_path in list_files(step_dir):
+                staged_path = os.path.join(staging_dir, rel_path)
+                overlay_path = os.path.join(overlay_dir, rel_path)
+                os.makedirs(os.path.dirname(staged_path), exist_ok=True)
+                os.replace(os.path.join(step_dir, rel_path), staged_path)
+                os.makedirs(os.path.dirname(overlay_path), exist_ok=True)
+                if os.path.exists(overlay_path):
+                    os.remove(overlay_path)
+                os.link(staged_path, overlay_path)
+            for rel_path in step_removed:
+                for folder in (staging_dir, overlay_dir):
+                    if os.path.isfile(os.path.join(folder, rel_path)):
+                        os.remove(os.path.join(folder, rel_path))
+                index.pending.pop(rel_path.replace('\\', '/'), None)
+            removed += step_removed
+            delta.save_installed_manifest(overlay_dir, step_manifest)
+            manifest = step_manifest
+    except OSError as e:
+        print(f"Could not stage the upgrade path: {e}")
+        return None
+    finally:
+        shutil.rmtree(overlay_dir, ignore_errors=True)
+        shutil.rmtree(step_dir, ignore_errors=True)
+
+    removed = sorted({rel_path for rel_path in removed
+                      if rel_path not in manifest['files'] and os.path.isfile(os.path.join(root_folder, rel_path))})
+    return manifest, removed
+
+def plan_upgrade_path(owner, repo, current_version, latest_version, min_interval=0):
+    """
+    Picks the releases to install to reach the latest one, from the release
+    index. A chain of deltas is used when the advertised asset sizes make it
+    cheaper than the full package of the latest release.
+
+    Args:
+        owner (str): The GitHub repository owner.
+        repo (str): The GitHub repository name.
+        current_version (str): The installed version.
+        latest_version (str): The release tag to reach.
+        min_interval (int): Seconds during which cached release pages are used without contacting GitHub.
+
+    Returns:
+        list: The release tags to install in order, ending with the latest version.
+    """
+    releases_url = f"{GITHUB_API_URL}/repos/{owner}/{repo}/releases"
+    with telemetry.phase('upgrade_path', current_version=current_version, latest_version=latest_version) as measurement:
+        try:
+            releases = release_index.load_index(releases_url, current_version, min_interval)
+        except (OSError, ValueError) as e:
+            print(f"Could not read the release index: {e}")
+            measurement.outcome = 'failed'
+            return [latest_version]
+        path, cost = release_index.cheapest_path(releases, current_version, latest_version)
+        measurement.fields.update(releases=len(releases), path=path, estimated_bytes=cost)
+    if len(path) > 1:
+        print(f"Upgrading through {', '.join(path)}, about {cost} bytes to download.")
+    return path
+
+def stage_release(owner, repo, current_version, latest_version, min_interval=0, root_folder='.'):
+    """
+    Prepares a release for the cutover. A matching prefetched release is
+    used as it is; otherwise the upgrade path is staged, and the latest
+    release is staged on its own when a step of the path fails.
+
+    Args:
+        owner (str): The GitHub repository owner.
+        repo (str): The GitHub repository name.
+        current_version (str): The installed version.
+        latest_version (str): The release tag to install.
+        min_interval (int): Seconds during which cached release pages are used without contacting GitHub.
+        root_folder (str): The root folder of the application.
+
+    Returns:
+        tuple: The staging folder, the index of the installed tree, the release manifest and the
+            relative paths to remove, or None if staging failed.
+    """
+    import delta
+    import prefetch
+    import installer
+    index = installer.FileIndex(root_folder)
+    record = prefetch.load_record(root_folder, latest_version, current_version)
+    if record is not None:
+        index.pending.update(record['pending'])
+        return os.path.join(root_folder, prefetch.PREFETCH_DIR), index, record['manifest'], record['removed']
+
+    path = plan_upgrade_path(owner, repo, current_version, latest_version, min_interval)
+    staging_dir = os.path.join(root_folder, delta.STATE_DIR, 'staging')
+    staged = stage_chain(owner, repo, path, staging_dir, index, root_folder)
+    if staged is None and len(path) > 1:
+        print(f"Installing {latest_version} directly instead.")
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        index = installer.FileIndex(root_folder)
+        staged = stage_update(owner, repo, latest_version, staging_dir, index, root_folder)
+    if staged is None:
+        return None
+    return (staging_dir, index) + staged
+
+def rollout_due(owner, repo, latest_version):
+    """
+    Checks whether this machine's turn to install a release has come.
+
+    The release notes may declare a rollout ramp, which lets a growing share
+    of machines install over the hours after publication. Once the ramp
+    reaches this machine, the install is delayed by a jitter of up to
+    RolloutJitter seconds, or placed within the MaintenanceWindow when one
+    is set, so clients do not all download the release at the same moment.
+
+    Args:
+        owner (str): The GitHub repository owner.
+        repo (str): The GitHub repository name.
+        latest_version (str): The release tag to install.
+
+    Returns:
+        bool: True if the release can be installed now.
+    """
+    import rollout
+    url = f"{GITHUB_API_URL}/repos/{owner}/{repo}/releases/latest"
+    default_jitter = rollout.DEFAULT_JITTER if is_scheduled() else 0
+    jitter = int(load_optional_setting('RolloutJitter', default_jitter))
+    windows = rollout.parse_windows(load_optional_setting('MaintenanceWindow', ''))
+
+    with telemetry.phase('rollout', repo=f"{owner}/{repo}", version=latest_version) as measurement:
+        try:
+            # The check has just cached the release, so no request is made
+            release = release_cache.get_release(url, float('inf'))
+        except (OSError, ValueError) as e:
+            print(f"Could not read the rollout of {latest_version}: {e}")
+            measurement.outcome = 'failed'
+            return True
+        install_at = rollout.scheduled_time(release, owner, repo, windows, jitter)
+        if install_at is None:
+            print(f"{latest_version} is not rolled out to this machine yet.")
+            measurement.outcome = 'deferred'
+            return False
+        measurement.fields['install_at'] = round(install_at)
+        if install_at > time.time():
+            print(f"{latest_version} is scheduled for this machine at {time.ctime(install_at)}.")
+            measurement.outcome = 'deferred'
+            return False
+        return True
+
+def prefetch_update(owner, repo, current_version, latest_version):
+    """
+    Stages the next release in the background at low priority, so that
+    installing it later needs no download.
+
+    Args:
+        owner (str): The GitHub repository owner.
+        repo (str): The GitHub repository name.
+        current_version (str): The installed version.
+        latest_version (str): The release tag to prefetch.
+
+    Returns:
+        bool: True if the release is staged and verified, False otherwise.
+    """
+    import prefetch
+    import installer
+    if prefetch.load_record('.', latest_version, current_version):
+        print(f"{latest_version} is already prefetched.")
+        return True
+    if not prefetch.acquire_lock('.'):
+        print("Another prefetch is already running.")
+        return False
+
+    try:
+        prefetch.lower_priority()
+        prefetch_rate = int(load_optional_setting('PrefetchRate', 0))
+        if prefetch_rate:
+            throttle.set_rate(prefetch_rate)
+        prefetch.discard('.')
+        index = installer.FileIndex('.')
+        staging_dir = os.path.join('.', prefetch.PREFETCH_DIR)
+        staged = stage_update(owner, repo, latest_version, staging_dir, index)
+        if staged is None:
+            prefetch.discard('.')
+            return False
+        manifest, removed = staged
+        prefetch.save_record('.', latest_version, current_version, manifest, removed, index.pending)
+        print(f"{latest_version} is downloaded, verified and ready to install.")
+        return True
+    finally:
+        prefetch.release_lock('.')
+
+def background_check(owner, repo, current_version, min_interval=0):
+    """
+    Checks for a new release with short timeouts while the application is
+    already running, and records the result for the next start. With
+    prefetching enabled, the release is also staged so the next start only
+    needs to install it. In launch-first mode a new updater is fetched as well.
+
+    Args:
+        owner (str): The GitHub repository owner.
+        repo (str): The GitHub repository name.
+        current_version (str): The installed version.
+        min_interval (int): Seconds during which a cached answer is used without contacting GitHub.
+
+    Returns:
+        bool: True if the check completed, False otherwise.
+    """
+    import prefetch
+    prefetch.lower_priority()
+    latest_version = check_for_updates(owner, repo, current_version, min_interval, BACKGROUND_CHECK_TIMEOUT)
+    check_state.save('.', current_version, latest_version)
+    if str(load_optional_setting('LaunchFirst', False)) == 'True':
+        check_updater(min_interval)
+    if latest_version and str(load_optional_setting('Prefetch', False)) == 'True' and rollout_due(owner, repo, latest_version):
+        return prefetch_update(owner, repo, current_version, latest_version)
+    return True
+
+def check_updater(min_interval=0):
+    """
+    Looks for a new kalymos-updater.exe on behalf of updater_manager.py,
+    which starts the updater without waiting in launch-first mode. Since
+    this updater is running, a new one is only downloaded and verified,
+    and the next launch installs it.
+
+    Args:
+        min_interval (int): Seconds during which a cached answer is used without contacting GitHub.
+    """
+    import updater_manager
+    updater_version = load_optional_setting('Updater', None)
+    if updater_version:
+        updater_manager.background_self_update(updater_version, updater_manager.UPDATER_FILENAME, min_interval,
+                                               BACKGROUND_CHECK_TIMEOUT)
+
+def spawn_updater(*args):
+    """
+    Starts another instance of the updater in the background, detached from this one.
+
+    Args:
+        *args (str): The command-line arguments to pass to the updater.
+    """
+    import subprocess
+    if getattr(sys, 'frozen', False):
+        command = [sys.executable]
+    else:
+        command = [sys.executable, os.path.abspath(sys.argv[0])]
+    flags = subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP if os.name == 'nt' else 0
+    subprocess.Popen(command + list(args), creationflags=flags, close_fds=True,
+                     stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+def configure_sources():
+    """
+    Applies the mirror, shared asset cache and bandwidth settings from the registry.
+    """
+    mirror.set_mirror(load_optional_setting('MirrorUrl', ''))
+    # Read without the default for empty values, since an empty CacheDir turns the cache off
+    asset_cache.set_cache_dir(config_store.default_store().values().get('CacheDir', asset_cache.default_cache_dir()))
+    throttle.set_connections(int(load_optional_setting('MaxConnections', 0)))
+    throttle.set_rate(int(load_optional_setting('MaxRate', 0)))
+
+def update_all_apps(install=False):
+    """
+    Updates every application listed in the registry from a single run.
+    Release checks and downloads run concurrently, sharing the connection
+    and bandwidth budget, then the updates are applied one application at a time.
+
+    Args:
+        install (bool): Install releases whose rollout has not reached this machine yet.
+
+    Returns:
+        bool: True if every application is up to date, False otherwise.
+    """
+    import prefetch
+    from concurrent.futures import ThreadPoolExecutor
+    apps = load_app_entries()
+    if not apps:
+        print("No applications are listed under Apps in the configuration store.")
+        return False
+
+    # Roll back cutovers that were interrupted by a crash, before a new journal replaces their backup
+    for app in apps:
+        if journal.is_pending(app['Folder']):
+            print(f"{app['Name']}: the last update was interrupted. Rolling back.")
+            previous_version = journal.rollback(app['Folder'], only_pending=True)
+            if previous_version is not None:
+                update_registry_version(previous_version, app['Store'])
+                app['Version'] = previous_version
+
+    min_interval = int(load_optional_setting('CheckInterval', 0))
+
+    with ThreadPoolExecutor(max_workers=len(apps)) as executor:
+        latest_versions = list(executor.map(
+            lambda app: check_for_updates(app['Owner'], app['Repo'], app['Version'], min_interval), apps))
+    pending = [(app, latest) for app, latest in zip(apps, latest_versions)
+               if latest and (install or rollout_due(app['Owner'], app['Repo'], latest))]
+    if not pending:
+        return True
+    print(f"Updates available for: {', '.join(app['Name'] for app, _ in pending)}")
+    if not confirm_update():
+        print("Update cancelled.")
+        return False
+
+    def stage(item):
+        app, latest_version = item
+        try:
+            result = stage_release(app['Owner'], app['Repo'], app['Version'], latest_version, min_interval, app['Folder'])
+            if result is not None:
+                verify_untouched_files(result[0], app['Folder'], result[2], result[1])
+        except Exception as e:
+            # One broken application must not stop the others from updating
+            print(f"{app['Name']}: an error occurred while staging the update: {e}")
+            result = None
+        return result
+
+    with ThreadPoolExecutor(max_workers=len(pending)) as executor:
+        staged = list(executor.map(stage, pending))
+
+    success = True
+    for (app, latest_version), result in zip(pending, staged):
+        if result is None:
+            print(f"{app['Name']}: staging failed.")
+            success = False
+            continue
+        if not close_application(app['MainExecutable'], root_folder=app['Folder']):
+            print(f"{app['Name']}: the application is still running.")
+            success = False
+            continue
+        staging_dir, index, manifest, removed = result
+        try:
+            apply_staged_update(staging_dir, app['Folder'], removed, manifest, index, app['Version'])
+        except OSError as e:
+            print(f"{app['Name']}: failed to apply the update: {e}. Rolling back.")
+            journal.rollback(app['Folder'], only_pending=True)
+            success = False
+            continue
+        update_registry_version(latest_version, app['Store'])
+        prefetch.discard(app['Folder'])
+        print(f"{app['Name']} updated to {latest_version}.")
+    return success
+
+def launch_application(executable, updated, failed=False):
     """
     Launches the main application executable in the same process.
 
     Args:
         executable (str): The name of the main executable to launch.
         updated (bool): Indicates if the application has been updated.
+        failed (bool): Indicates that the update failed and the previous version was restored.
     """
+    telemetry.emit('launch', outcome='started', executable=executable, seconds_since_start=round(telemetry.elapsed(), 4))
+    # Only report HTTP statistics when the run made requests; importing the client would load requests
+    if 'http_client' in sys.modules:
+        telemetry.emit('http', **sys.modules['http_client'].get_stats())
     try:
-        if updated:
+        if failed:
+            # The old version is back; tell the application without claiming an update
+            os.execv(executable, [executable, '--update-failed'])
+        elif updated:
             # Passa o argumento '--updated' ao executar o aplicativo
             os.execv(executable, [executable, '--updated'])
         else:
@@ -261,90 +1083,186 @@ def launch_application(executable, updated):
         print(f"Failed to launch {executable}: {e}")
         sys.exit(1)
 
-def prompt_for_update():
+def prompt_for_update(ready=False):
     """
     Prompts the user with a message box to ask if they want to update now.
 
+    Args:
+        ready (bool): Indicates that the update is already downloaded and only needs to be installed.
+
     Returns:
         bool: True if the user wants to update, False otherwise.
     """
+    import tkinter as tk
+    from tkinter import messagebox
     root = tk.Tk()
     root.withdraw()  # Hide the main Tkinter window
-    response = messagebox.askyesno("Update Available", "A new version is available. Would you like to update now?")
+    if ready:
+        response = messagebox.askyesno("Update Ready", "A new version has been downloaded and is ready to install. Would you like to install it now?")
+    else:
+        response = messagebox.askyesno("Update Available", "A new version is available. Would you like to update now?")
     root.destroy()  # Close the Tkinter window
     return response
 
-def update_registry_version(new_version):
+def is_scheduled():
+    """
+    Checks whether updates are installed on schedule, without asking the user.
+
+    Returns:
+        bool: True if UpdateMode is 'scheduled'.
     """
-    Updates the 'Version' value in the Windows registry.
+    return str(load_optional_setting('UpdateMode', 'interactive')) == 'scheduled'
+
+def confirm_update(ready=False):
+    """
+    Confirms that an update should be installed now: at once in scheduled
+    mode, otherwise by asking the user.
 
     Args:
-        new_version (str): The new version to set in the registry.
+        ready (bool): Indicates that the update is already downloaded and only needs to be installed.
+
+    Returns:
+        bool: True if the update should be installed.
     """
-    registry_key = r"Software\KalymosApp"
-    value_name = "Version"
+    if is_scheduled():
+        print("Installing the update on schedule.")
+        return True
+    return prompt_for_update(ready)
 
-    try:
-        print(f"New version to be set: {new_version}")
-        # Open the registry key where the 'Version' value is stored
-        with winreg.OpenKey(winreg.HKEY_CURRENT_USER, registry_key, 0, winreg.KEY_SET_VALUE) as reg_key:
-            # Update the 'Version' value
-            winreg.SetValueEx(reg_key, value_name, 0, winreg.REG_SZ, new_version)
-            print(f"Successfully updated {value_name} to {new_version} in the registry.")
-    
-    except FileNotFoundError:
-        print(f"Registry key {registry_key} not found.")
-    except PermissionError:
-        print("Permission denied. Please run the script with administrator privileges.")
-    except Exception as e:
-        print(f"An error occurred while updating the registry: {e}")
+def update_registry_version(new_version, store=None):
+    """
+    Updates the 'Version' value in the configuration store.
+
+    Args:
+        new_version (str): The new version to store.
+        store (config_store.ConfigStore, optional): The store of the application. Defaults to the store of the process.
+    """
+    with telemetry.phase('registry_update', version=new_version) as measurement:
+        try:
+            print(f"New version to be set: {new_version}")
+            if (store or config_store.default_store()).update({'Version': new_version}):
+                print(f"Successfully updated Version to {new_version}.")
+            else:
+                measurement.outcome = 'unchanged'
+        except PermissionError:
+            print("Permission denied. Please run the script with administrator privileges.")
+            measurement.outcome = 'failed'
+        except Exception as e:
+            print(f"An error occurred while updating the configuration: {e}")
+            measurement.outcome = 'failed'
+
+def print_progress(report):
+    """
+    Prints the progress of a transfer with its speed and the time left.
+
+    Args:
+        report (dict): The progress report from telemetry.Progress.
+    """
+    if report['total']:
+        eta = f", {report['eta']:.0f}s left" if report['eta'] is not None else ""
+        print(f"{report['name']}: {report['done'] * 100 // report['total']}% at {report['speed'] / 1e6:.1f} MB/s{eta}")
 
 def main():
     """
     Main function to check for updates, download and verify them, and replace the current version with the updated one.
     """
+    parser = argparse.ArgumentParser(description='Kalymos Updater')
+    parser.add_argument('--rollback', action='store_true', help='Undo the last update using its backup journal.')
+    parser.add_argument('--prefetch', action='store_true', help='Download and verify the next release in the background without installing it.')
+    parser.add_argument('--all-apps', action='store_true', help='Update every application listed under Software\\KalymosApp\\Apps.')
+    parser.add_argument('--check', action='store_true', help='Check for a new release in the background and record the result for the next start.')
+    parser.add_argument('--verify', action='store_true', help='Check the installed files against the release manifest and report what differs.')
+    parser.add_argument('--fast', action='store_true', help='With --verify, only read the files whose size or modification time changed.')
+    parser.add_argument('--install', action='store_true', help='Check for and install an update now, even in launch-first mode or before its rollout reaches this machine.')
+    args, _ = parser.parse_known_args()
+    # Read without the default for empty values, since an empty MetricsPath turns metrics off
+    telemetry.configure('updater', config_store.default_store().values().get('MetricsPath', telemetry.METRICS_PATH))
+    telemetry.add_progress_callback(print_progress)
+    configure_sources()
+    if args.all_apps:
+        sys.exit(0 if update_all_apps(args.install) else 1)
+    if args.verify:
+        sys.exit(0 if verify_command('.', args.fast) else 1)
+
     owner, repo, current_version, main_executable = load_config()
     print(main_executable)
+
+    if args.rollback:
+        close_application(main_executable)
+        sys.exit(0 if rollback_update('.') else 1)
+
+    # Roll back a cutover that was interrupted by a crash
+    if journal.is_pending('.'):
+        print("The last update was interrupted. Rolling back.")
+        rollback_update('.', only_pending=True)
+
     # Check for updates
-    latest_version = check_for_updates(owner, repo, current_version)
+    min_interval = int(load_optional_setting('CheckInterval', 0))
+    if args.check:
+        sys.exit(0 if background_check(owner, repo, current_version, min_interval) else 1)
+
+    if str(load_optional_setting('LaunchFirst', False)) == 'True' and not args.install and not args.prefetch:
+        # Start the application at once and use the result of the last background check
+        state = check_state.load('.', current_version)
+        latest_version = state['latest_version'] if state else None
+        if state is None or time.time() - state['checked_at'] >= min_interval:
+            # Look again even when a release is recorded, since a newer one may be out
+            spawn_updater('--check')
+        if not latest_version:
+            launch_application(main_executable, True)
+            sys.exit(0)
+    else:
+        latest_version = check_for_updates(owner, repo, current_version, min_interval)
+    # Wait for this machine's turn when the release is rolled out in stages
+    if latest_version and not args.install and not rollout_due(owner, repo, latest_version):
+        latest_version = None
+    if args.prefetch:
+        sys.exit(0 if not latest_version or prefetch_update(owner, repo, current_version, latest_version) else 1)
     if not latest_version:
         launch_application(main_executable, True)
         sys.exit(0)
 
+    import prefetch
+
+    # With prefetching enabled, download in the background and only prompt once the update is ready
+    record = prefetch.load_record('.', latest_version, current_version)
+    if record is None and str(load_optional_setting('Prefetch', False)) == 'True':
+        if not prefetch.is_running('.'):
+            print("Downloading the update in the background.")
+            spawn_updater('--prefetch')
+        launch_application(main_executable, True)
+        sys.exit(0)
+
     # Confirm with user if they want to update
-    if not prompt_for_update():
+    if not confirm_update(ready=record is not None):
         print("Update cancelled.")
         launch_application(main_executable, True)
         sys.exit(0)
-        
-    close_application(main_executable)
-
-    # Create a backup of the current application
-    create_backup('.')
 
-    # Prepare to download the update
-    download_url = f"https://github.com/{owner}/{repo}/releases/download/{latest_version}/update.zip"
-    update_zip_path = os.path.join('.', 'update.zip')
-    
-    # Check disk space before downloading
-    file_size = int(requests.head(download_url).headers.get('content-length', 0))
-    if not check_disk_space(file_size):
-        print("Not enough disk space. Exiting update.")
+    # Build the new version in the staging folder while the application keeps running
+    staged = stage_release(owner, repo, current_version, latest_version, min_interval)
+    if staged is None:
+        print("Exiting update.")
         sys.exit(1)
+    staging_dir, index, manifest, removed = staged
+    verify_untouched_files(staging_dir, '.', manifest, index)
 
-    # Download the update
-    download_file(download_url, update_zip_path)
-
-    # Verify the downloaded file's SHA-256 hash
-    if not verify_sha256(update_zip_path, 'update.zip.sha256'):
-        print("SHA-256 hash verification failed. Exiting update.")
-        
-
-    # Extract the update to the root folder
-    extract_zip_file(update_zip_path, '.')
+    # Downtime starts here and only covers renaming and hashing the changed files
+    if not close_application(main_executable):
+        print("The application is still running. Exiting update.")
+        sys.exit(1)
+    try:
+        apply_staged_update(staging_dir, '.', removed, manifest, index, current_version)
+    except OSError as e:
+        print(f"Failed to apply the update: {e}. Rolling back.")
+        rollback_update('.', only_pending=True)
+        launch_application(main_executable, False, failed=True)
+        sys.exit(1)
 
     # Update registry with the new version
     update_registry_version(latest_version)
+    prefetch.discard('.')
+    check_state.clear('.')
 
     # Launch the updated application
     launch_application(main_executable, True)
@@ -0,0 +1,51 @@
+import logging
+
+GITHUB_URL = 'https://github.com'
+
+_mirror_url = None
+
+def set_mirror(base_url):
+    """
+    Configures a mirror serving release assets with the same layout as
+    GitHub, '{base_url}/{owner}/{repo}/releases/download/{tag}/{file}'.
+
+    Args:
+        base_url (str): The base URL of the mirror, or an empty value to disable it.
+    """
+    global _mirror_url
+    _mirror_url = base_url.rstrip('/') if base_url else None
+
+def candidates(url):
+    """
+    Lists the URLs to try for a release asset, the mirror first.
+
+    Args:
+        url (str): The GitHub URL of the asset.
+
+    Returns:
+        list: The URLs to try, in order.
+    """
+    if _mirror_url and url.startswith(GITHUB_URL + '/'):
+        return [_mirror_url + url[len(GITHUB_URL):], url]
+    return [url]
+
+def pick_url(url):
+    """
+    Returns the mirror URL of an asset if the mirror has it, otherwise the GitHub URL.
+
+    Args:
+        url (str): The GitHub URL of the asset.
+
+    Returns:
+        str: The URL to download the asset from.
+    """
+    import requests
+    import http_client
+    for candidate in candidates(url)[:-1]:
+        try:
+            response = http_client.head(candidate, allow_redirects=True, timeout=5, retries=0)
+            if response.ok:
+                return candidate
+        except requests.exceptions.RequestException as e:
+            logging.warning(f"Mirror unavailable for {url}: {e}")
+    return url
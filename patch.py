@@ -0,0 +1,163 @@
+import os
+import lzma
+import zlib
+import struct
+import hashlib
+
+MAGIC = b'KPATCH1\x00'
+BLOCK_SIZE = 256
+BUFFER_SIZE = 1024 * 1024
+MAX_LITERAL_RATIO = 0.5
+OP_COPY = b'C'
+OP_INSERT = b'I'
+
+def make_patch(base_path, target_path, patch_path, block_size=BLOCK_SIZE):
+    """
+    Writes a binary patch that rebuilds the target file from the base file.
+
+    The base is indexed by aligned blocks and the target is scanned for
+    them at every offset, so inserted or moved code is still matched. The
+    patch is a list of copies from the base and literal inserts, compressed
+    with LZMA. Generation reads both files into memory and is meant to run
+    when a release is built.
+
+    Args:
+        base_path (str): The file of the previous version.
+        target_path (str): The file of the new version.
+        patch_path (str): The path to write the patch to.
+        block_size (int): The size of the blocks matched between the files.
+
+    Returns:
+        bool: True if the patch was written, False if the files share too
+            little for a patch to be worth it.
+    """
+    with open(base_path, 'rb') as f:
+        base = f.read()
+    with open(target_path, 'rb') as f:
+        target = f.read()
+
+    blocks = {}
+    for offset in range(0, len(base) - block_size + 1, block_size):
+        blocks.setdefault(base[offset:offset + block_size], offset)
+
+    ops = []
+    literal_start = position = 0
+    literal_bytes = 0
+    max_literal = len(target) * MAX_LITERAL_RATIO
+    last = len(target) - block_size
+    while position <= last:
+        base_offset = blocks.get(target[position:position + block_size])
+        if base_offset is None:
+            position += 1
+            if position - literal_start + literal_bytes > max_literal:
+                return False
+            continue
+
+        # Grow the match backwards into the pending literal, then forwards
+        start = position
+        while start > literal_start and base_offset > 0 and target[start - 1] == base[base_offset - 1]:
+            start -= 1
+            base_offset -= 1
+        length = position + block_size - start
+        while start + length + block_size <= len(target) and base_offset + length + block_size <= len(base) \
+                and target[start + length:start + length + block_size] == base[base_offset + length:base_offset + length + block_size]:
+            length += block_size
+        while start + length < len(target) and base_offset + length < len(base) \
+                and target[start + length] == base[base_offset + length]:
+            length += 1
+
+        if start > literal_start:
+            ops.append((OP_INSERT, literal_start, start - literal_start))
+            literal_bytes += start - literal_start
+        ops.append((OP_COPY, base_offset, length))
+        position = literal_start = start + length
+
+    if literal_start < len(target):
+        ops.append((OP_INSERT, literal_start, len(target) - literal_start))
+        literal_bytes += len(target) - literal_start
+    if literal_bytes > max_literal:
+        return False
+
+    os.makedirs(os.path.dirname(patch_path) or '.', exist_ok=True)
+    with lzma.open(patch_path, 'wb', preset=6) as f:
+        f.write(MAGIC + struct.pack('<Q', len(target)))
+        for op, offset, length in ops:
+            if op == OP_COPY:
+                f.write(OP_COPY + struct.pack('<QQ', offset, length))
+            else:
+                f.write(OP_INSERT + struct.pack('<Q', length))
+                f.write(target[offset:offset + length])
+    return True
+
+def read_exact(stream, size):
+    data = stream.read(size)
+    if len(data) != size:
+        raise ValueError("Patch ended unexpectedly")
+    return data
+
+def apply_patch(base_path, patch_file, output_path):
+    """
+    Rebuilds a file from its base and a patch written by make_patch. The
+    patch is read sequentially, so it can come straight from a remote
+    archive entry.
+
+    Args:
+        base_path (str): The installed file the patch was made against.
+        patch_file (file): A binary file object holding the patch.
+        output_path (str): The path to write the rebuilt file to.
+
+    Returns:
+        tuple: The SHA-256 hash and the CRC-32 of the rebuilt file.
+
+    Raises:
+        ValueError: If the patch is corrupt or does not fit the base file.
+        lzma.LZMAError: If the patch cannot be decompressed.
+        OSError: If a file cannot be read or written.
+    """
+    sha256 = hashlib.sha256()
+    crc = 0
+    written = 0
+    base_size = os.path.getsize(base_path)
+
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    try:
+        with lzma.open(patch_file, 'rb') as patch, open(base_path, 'rb') as base, \
+                open(output_path, 'wb', buffering=BUFFER_SIZE) as output:
+            if read_exact(patch, len(MAGIC)) != MAGIC:
+                raise ValueError("Not a patch file")
+            target_size, = struct.unpack('<Q', read_exact(patch, 8))
+
+            def write(data):
+                nonlocal crc, written
+                output.write(data)
+                sha256.update(data)
+                crc = zlib.crc32(data, crc)
+                written += len(data)
+
+            while True:
+                op = patch.read(1)
+                if not op:
+                    break
+                if op == OP_COPY:
+                    offset, length = struct.unpack('<QQ', read_exact(patch, 16))
+                    if offset + length > base_size:
+                        raise ValueError("Patch copies past the end of the base file")
+                    base.seek(offset)
+                    while length:
+                        data = read_exact(base, min(BUFFER_SIZE, length))
+                        write(data)
+                        length -= len(data)
+                elif op == OP_INSERT:
+                    length, = struct.unpack('<Q', read_exact(patch, 8))
+                    while length:
+                        data = read_exact(patch, min(BUFFER_SIZE, length))
+                        write(data)
+                        length -= len(data)
+                else:
+                    raise ValueError(f"Unknown patch operation {op!r}")
+    except EOFError:
+        raise ValueError("Patch ended unexpectedly") from None
+
+    if written != target_size:
+        raise ValueError(f"Patched file has {written} bytes, expected {target_size}")
+    return sha256.hexdigest(), crc
@@ -0,0 +1,292 @@
+import os
+import shutil
+import struct
+import hashlib
+import zipfile
+import zlib
+import requests
+import delta
+import downloader
+import http_client
+import throttle
+import installer
+import telemetry
+
+LOCAL_HEADER_SIGNATURE = b'PK\x03\x04'
+LOCAL_HEADER_FORMAT = '<HHHHHIIIHH'
+ZIP64_EXTRA_ID = 0x0001
+CHUNK_SIZE = 1024 * 1024
+
+class StreamingUnsupported(Exception):
+    """Raised when an archive entry cannot be extracted before the download completes."""
+
+class HashingStream:
+    """
+    Reads an HTTP response sequentially, writing every byte to the local
+    archive and feeding it to SHA-256 as it arrives.
+    """
+
+    def __init__(self, response, file, progress=None):
+        self.chunks = response.iter_content(CHUNK_SIZE)
+        self.progress = progress
+        self.file = file
+        self.sha256 = hashlib.sha256()
+        self.buffer = b""
+        self.offset = 0
+        self.received = 0
+
+    def fill(self):
+        chunk = next(self.chunks, b"")
+        if chunk:
+            throttle.consume(len(chunk))
+            self.file.write(chunk)
+            self.sha256.update(chunk)
+            self.received += len(chunk)
+            if self.progress is not None:
+                self.progress.update(len(chunk))
+            self.buffer = self.buffer[self.offset:] + chunk
+            self.offset = 0
+        return bool(chunk)
+
+    def read(self, size):
+        while len(self.buffer) - self.offset < size and self.fill():
+            pass
+        data = self.buffer[self.offset:self.offset + size]
+        self.offset += len(data)
+        return data
+
+    def read_exact(self, size):
+        data = self.read(size)
+        if len(data) != size:
+            raise EOFError("Archive ended unexpectedly")
+        return data
+
+    def drain(self):
+        self.buffer, self.offset = b"", 0
+        while self.fill():
+            self.buffer = b""
+
+def zip64_sizes(extra, compressed_size, uncompressed_size):
+    """
+    Reads the real entry sizes from a ZIP64 extra field when the local header
+    only holds placeholders.
+
+    Args:
+        extra (bytes): The extra field of the local header.
+        compressed_size (int): The compressed size from the local header.
+        uncompressed_size (int): The uncompressed size from the local header.
+
+    Returns:
+        tuple: The compressed and uncompressed sizes.
+    """
+    offset = 0
+    while offset + 4 <= len(extra):
+        header_id, length = struct.unpack_from('<HH', extra, offset)
+        if header_id == ZIP64_EXTRA_ID:
+            values = list(struct.unpack_from(f'<{length // 8}Q', extra, offset + 4))
+            if uncompressed_size == 0xFFFFFFFF:
+                uncompressed_size = values.pop(0)
+            if compressed_size == 0xFFFFFFFF:
+                compressed_size = values.pop(0)
+            break
+        offset += 4 + length
+    return compressed_size, uncompressed_size
+
+def extract_entry(stream, name, method, crc, compressed_size, staging_dir):
+    """
+    Decompresses one entry from the stream into the staging directory.
+
+    Args:
+        stream (HashingStream): The stream positioned at the entry's data.
+        name (str): The entry name.
+        method (int): The compression method.
+        crc (int): The expected CRC-32 of the entry.
+        compressed_size (int): The number of compressed bytes to read.
+        staging_dir (str): The staging directory.
+    """
+    target = os.path.join(staging_dir, name)
+    if name.endswith('/'):
+        # A deflated directory still carries an empty compressed stream
+        os.makedirs(target, exist_ok=True)
+        skip_entry(stream, compressed_size)
+        return
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+
+    decompressor = zlib.decompressobj(-15) if method == zipfile.ZIP_DEFLATED else None
+    actual_crc = 0
+    remaining = compressed_size
+    with open(target, 'wb') as f:
+        try:
+            while remaining:
+                data = stream.read_exact(min(remaining, CHUNK_SIZE))
+                remaining -= len(data)
+                if decompressor:
+                    data = decompressor.decompress(data)
+                actual_crc = zlib.crc32(data, actual_crc)
+                f.write(data)
+            if decompressor:
+                data = decompressor.flush()
+                actual_crc = zlib.crc32(data, actual_crc)
+                f.write(data)
+        except zlib.error:
+            raise zipfile.BadZipFile(f"Corrupt entry {name}") from None
+    if actual_crc != crc:
+        raise zipfile.BadZipFile(f"CRC mismatch for {name}")
+
+def skip_entry(stream, compressed_size):
+    """
+    Consumes the data of an entry that does not need to be extracted.
+
+    Args:
+        stream (HashingStream): The stream positioned at the entry's data.
+        compressed_size (int): The number of compressed bytes to skip.
+    """
+    remaining = compressed_size
+    while remaining:
+        remaining -= len(stream.read_exact(min(remaining, CHUNK_SIZE)))
+
+def extract_stream(stream, staging_dir, index=None):
+    """
+    Walks the local file headers of an archive as it downloads and
+    extracts each entry as soon as its data has arrived. Entries identical
+    to the installed files are skipped.
+
+    Args:
+        stream (HashingStream): The stream positioned at the start of the archive.
+        staging_dir (str): The staging directory.
+        index (installer.FileIndex, optional): The index of the installed tree.
+
+    Returns:
+        tuple: The number of files and bytes written.
+
+    Raises:
+        StreamingUnsupported: If an entry can only be read through the central directory.
+    """
+    files_written = bytes_written = 0
+    while stream.read(4) == LOCAL_HEADER_SIGNATURE:
+        (_, flags, method, _, _, crc, compressed_size, uncompressed_size,
+         name_length, extra_length) = struct.unpack(LOCAL_HEADER_FORMAT, stream.read_exact(26))
+        name = stream.read_exact(name_length).decode('utf-8' if flags & 0x800 else 'cp437')
+        extra = stream.read_exact(extra_length)
+
+        if flags & 0x01 or flags & 0x08:
+            raise StreamingUnsupported(f"{name} is encrypted or has no sizes in its local header")
+        if method not in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+            raise StreamingUnsupported(f"{name} uses unsupported compression method {method}")
+        if not delta.is_safe_path(name):
+            raise zipfile.BadZipFile(f"Unsafe path in archive: {name}")
+
+        compressed_size, uncompressed_size = zip64_sizes(extra, compressed_size, uncompressed_size)
+        if index is not None and not name.endswith('/') and index.is_unchanged(name, uncompressed_size, crc):
+            skip_entry(stream, compressed_size)
+            continue
+        extract_entry(stream, name, method, crc, compressed_size, staging_dir)
+        if not name.endswith('/'):
+            files_written += 1
+            bytes_written += uncompressed_size
+            if index is not None:
+                index.expect(name, crc)
+    return files_written, bytes_written
+
+def read_expected_hash(hash_path):
+    """
+    Reads the expected SHA-256 hash from a downloaded '.sha256' file.
+
+    Args:
+        hash_path (str): The path to the hash file.
+
+    Returns:
+        str: The expected hash in lowercase, or None if it cannot be read.
+    """
+    try:
+        with open(hash_path, 'r') as hash_file:
+            return hash_file.read().split()[0].lower()
+    except (OSError, IndexError):
+        return None
+
+def restore_pending(index, pending):
+    """
+    Puts back the expected CRCs an index held before a download, dropping
+    the ones recorded from entries that were streamed but then rejected.
+
+    Args:
+        index (installer.FileIndex): The index of the installed tree, or None.
+        pending (dict): The expected CRCs to keep.
+    """
+    if index is not None:
+        index.pending.clear()
+        index.pending.update(pending)
+
+def stream_update(url, zip_path, staging_dir, expected_hash, index=None):
+    """
+    Downloads the update archive, hashing it as the bytes arrive and
+    extracting entries into the staging directory while the download is
+    still running. The archive is kept on disk but never read back unless
+    it cannot be extracted from the stream.
+
+    Args:
+        url (str): The URL of update.zip.
+        zip_path (str): The local path of update.zip.
+        staging_dir (str): The directory to extract the new files to.
+        expected_hash (str): The SHA-256 hash published for the archive.
+        index (installer.FileIndex, optional): The index of the installed tree, to skip unchanged entries.
+
+    Returns:
+        tuple: The number of files and bytes written once the archive was verified and fully
+            extracted to the staging directory, or None if it was not.
+    """
+    shutil.rmtree(staging_dir, ignore_errors=True)
+    os.makedirs(staging_dir)
+    part_path = zip_path + '.part'
+    stream = None
+    pending = dict(index.pending) if index is not None else None
+
+    try:
+        with throttle.connection():
+            response = http_client.get(url, stream=True)
+            response.raise_for_status()
+            size = int(response.headers.get('content-length', 0))
+            with open(part_path, 'wb', buffering=CHUNK_SIZE) as f:
+                stream = HashingStream(response, f, telemetry.Progress(os.path.basename(zip_path), size))
+                try:
+                    files_written, bytes_written = extract_stream(stream, staging_dir, index)
+                    streamed = True
+                except StreamingUnsupported as e:
+                    print(f"Extracting after download: {e}")
+                    streamed = False
+                stream.drain()
+    except (requests.exceptions.RequestException, OSError, EOFError) as e:
+        print(f"An error occurred while streaming the update: {e}")
+        if stream is not None and size:
+            # Let the resumable downloader pick up the complete segments
+            done = set(range(stream.received // downloader.SEGMENT_SIZE))
+            downloader.save_state(part_path + '.json', url, size, response.headers.get('etag'), done)
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        restore_pending(index, pending)
+        return None
+    except zipfile.BadZipFile as e:
+        print(f"The update archive is invalid: {e}")
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        restore_pending(index, pending)
+        return None
+
+    os.replace(part_path, zip_path)
+    file_hash = stream.sha256.hexdigest()
+    if file_hash != expected_hash:
+        print(f"Hash mismatch: Expected {expected_hash}, but got {file_hash}")
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        restore_pending(index, pending)
+        return None
+    print(f"SHA-256 hash verified: {file_hash}")
+
+    if not streamed and index is not None:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        restore_pending(index, pending)
+        files_written, bytes_written = installer.extract_changed(zip_path, staging_dir, index)
+    elif not streamed:
+        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+            zip_ref.extractall(staging_dir)
+            entries = [info for info in zip_ref.infolist() if not info.is_dir()]
+        files_written, bytes_written = len(entries), sum(info.file_size for info in entries)
+    print(f"Extracted {zip_path} to {staging_dir}: {files_written} files changed, {bytes_written} bytes written")
+    return files_written, bytes_written
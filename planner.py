@@ -0,0 +1,185 @@
+import os
+import shutil
+import zipfile
+import asset_cache
+from delta import is_safe_path
+from journal import JOURNAL_DIR
+from remote_file import RemoteFile
+
+CLUSTER_SIZE = 4096
+PLAN_TIMEOUT = (10, 30)
+
+def allocated(size):
+    """
+    Rounds a file size up to whole clusters, the space it takes on disk.
+
+    Args:
+        size (int): The size of the file, in bytes.
+
+    Returns:
+        int: The space the file takes, in bytes.
+    """
+    return -(-size // CLUSTER_SIZE) * CLUSTER_SIZE
+
+def volume_of(path):
+    """
+    Identifies the volume a path is on, or will be on once it is created.
+
+    Args:
+        path (str): The path, which does not need to exist yet.
+
+    Returns:
+        tuple: The device ID of the volume and the nearest existing folder on it.
+    """
+    path = os.path.abspath(path)
+    while not os.path.exists(path) and os.path.dirname(path) != path:
+        path = os.path.dirname(path)
+    return os.stat(path).st_dev, path
+
+def supports_hardlinks(folder):
+    """
+    Checks whether the backup journal can keep files as hardlinks in a folder.
+
+    Args:
+        folder (str): The folder to probe, created if missing.
+
+    Returns:
+        bool: True if a hardlink could be made in the folder.
+    """
+    probe = os.path.join(folder, f".link-probe-{os.getpid()}")
+    try:
+        os.makedirs(folder, exist_ok=True)
+        open(probe, 'wb').close()
+        os.link(probe, probe + '.link')
+        os.remove(probe + '.link')
+        return True
+    except OSError:
+        return False
+    finally:
+        if os.path.exists(probe):
+            os.remove(probe)
+
+def plan_volumes(needs):
+    """
+    Adds up the space needed on each volume and reads the space free on it.
+
+    Args:
+        needs (list): A (path, required bytes, optional) tuple per folder written to.
+
+    Returns:
+        list: A dict per volume with 'path', 'required', 'free' and 'optional'
+            (True when only optional folders are on it).
+    """
+    volumes = {}
+    for path, required, optional in needs:
+        device, existing = volume_of(path)
+        volume = volumes.setdefault(device, {'path': existing, 'required': 0, 'optional': True})
+        volume['required'] += required
+        volume['optional'] = volume['optional'] and optional
+    for volume in volumes.values():
+        volume['free'] = shutil.disk_usage(volume['path']).free
+    return list(volumes.values())
+
+def journal_need(root_folder, paths):
+    """
+    Works out the space the backup journal takes for the installed files an
+    update replaces: nothing when it can keep them as hardlinks.
+
+    Args:
+        root_folder (str): The root folder of the application.
+        paths (list): The relative paths the update replaces.
+
+    Returns:
+        tuple: The journal folder and the bytes it needs.
+    """
+    journal_dir = os.path.join(root_folder, JOURNAL_DIR)
+    replaced_bytes = 0
+    for rel_path in paths:
+        installed_path = os.path.join(root_folder, rel_path)
+        if os.path.isfile(installed_path):
+            replaced_bytes += allocated(os.path.getsize(installed_path))
+    if replaced_bytes and supports_hardlinks(journal_dir):
+        replaced_bytes = 0
+    return journal_dir, replaced_bytes
+
+def plan_delta(manifest, changed, root_folder, staging_dir):
+    """
+    Works out the space a delta update needs from its manifest, before any
+    file is fetched: the changed files in the staging folder, the backup
+    journal and the copies kept in the asset cache.
+
+    Args:
+        manifest (dict): The manifest of the new release.
+        changed (list): The relative paths to fetch, from delta.diff_manifest.
+        root_folder (str): The root folder of the application.
+        staging_dir (str): The folder the changed files are staged in.
+
+    Returns:
+        dict: The plan, with 'changed', 'changed_bytes' and 'volumes' as in plan_update.
+    """
+    changed_bytes = sum(allocated(manifest['files'][rel_path]['size']) for rel_path in changed)
+    needs = [(staging_dir, changed_bytes, False), journal_need(root_folder, changed) + (False,)]
+    cache_dir = asset_cache.get_cache_dir()
+    if cache_dir:
+        needs.append((cache_dir, changed_bytes, True))
+    return {'changed': len(changed), 'changed_bytes': changed_bytes, 'volumes': plan_volumes(needs)}
+
+def plan_update(zip_url, root_folder, staging_dir, index, timeout=PLAN_TIMEOUT):
+    """
+    Works out what installing an update archive takes, before downloading it.
+
+    Only the end of central directory record and the central directory are
+    fetched, through Range requests. Each entry's size and CRC-32 are
+    compared to the index of the installed tree, and the space is added up
+    on every volume the update writes to: the archive and the staged files
+    in the root folder, the backup journal (nothing when it can hardlink)
+    and the copy kept in the asset cache. Sizes are rounded up to whole
+    clusters.
+
+    Args:
+        zip_url (str): The URL of update.zip.
+        root_folder (str): The root folder of the application.
+        staging_dir (str): The folder the changed files are staged in.
+        index (installer.FileIndex): The index of the installed tree.
+        timeout (tuple): The connect and read timeouts of each request, in seconds.
+
+    Returns:
+        dict: The plan, with 'entries', 'changed', 'unchanged', 'compressed',
+            'uncompressed', 'changed_bytes', 'fetched' (the bytes read to make
+            the plan) and 'volumes', a list of dicts with 'path', 'required',
+            'free' and 'optional' (True when only the asset cache is on it).
+
+    Raises:
+        requests.exceptions.RequestException: If the archive cannot be reached.
+        OSError: If the server does not support Range requests.
+        zipfile.BadZipFile: If the archive is invalid or holds an unsafe path.
+    """
+    plan = {'entries': 0, 'changed': 0, 'unchanged': 0, 'uncompressed': 0, 'changed_bytes': 0}
+    changed = []
+    with RemoteFile(zip_url, timeout=timeout) as remote, zipfile.ZipFile(remote) as zip_ref:
+        for info in zip_ref.infolist():
+            if not is_safe_path(info.filename):
+                raise zipfile.BadZipFile(f"Unsafe path in archive: {info.filename}")
+            if info.is_dir():
+                continue
+            plan['entries'] += 1
+            plan['uncompressed'] += info.file_size
+            if index.is_unchanged(info.filename, info.file_size, info.CRC):
+                plan['unchanged'] += 1
+                continue
+            plan['changed'] += 1
+            plan['changed_bytes'] += allocated(info.file_size)
+            changed.append(info.filename)
+        plan['compressed'] = remote.size
+        plan['fetched'] = remote.fetched
+
+    needs = [
+        (root_folder, allocated(plan['compressed']), False),
+        (staging_dir, plan['changed_bytes'], False),
+        journal_need(root_folder, changed) + (False,),
+    ]
+    cache_dir = asset_cache.get_cache_dir()
+    if cache_dir:
+        needs.append((cache_dir, allocated(plan['compressed']), True))
+    plan['volumes'] = plan_volumes(needs)
+    return plan
@@ -0,0 +1,127 @@
+import os
+import json
+import shutil
+import psutil
+from delta import STATE_DIR
+
+PREFETCH_DIR = os.path.join(STATE_DIR, 'prefetch')
+RECORD_PATH = os.path.join(STATE_DIR, 'prefetch.json')
+LOCK_PATH = os.path.join(STATE_DIR, 'prefetch.lock')
+
+def lower_priority():
+    """
+    Lowers the priority of the current process so a background prefetch
+    does not compete with the running application.
+    """
+    try:
+        psutil.Process().nice(psutil.IDLE_PRIORITY_CLASS if os.name == 'nt' else 19)
+    except (psutil.Error, OSError) as e:
+        print(f"Could not lower the process priority: {e}")
+
+def acquire_lock(root_folder):
+    """
+    Makes sure only one prefetch runs at a time. A lock left behind by a
+    process that no longer exists is taken over.
+
+    Args:
+        root_folder (str): The root folder of the application.
+
+    Returns:
+        bool: True if the lock was acquired, False if another prefetch is running.
+    """
+    lock_path = os.path.join(root_folder, LOCK_PATH)
+    os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+    for _ in range(2):
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            os.write(fd, str(os.getpid()).encode())
+            os.close(fd)
+            return True
+        except FileExistsError:
+            if is_running(root_folder):
+                return False
+            os.remove(lock_path)
+    return False
+
+def is_running(root_folder):
+    """
+    Checks whether a prefetch currently holds the lock.
+
+    Args:
+        root_folder (str): The root folder of the application.
+
+    Returns:
+        bool: True if the process recorded in the lock is alive.
+    """
+    try:
+        with open(os.path.join(root_folder, LOCK_PATH), 'r') as f:
+            return psutil.pid_exists(int(f.read()))
+    except (OSError, ValueError):
+        return False
+
+def release_lock(root_folder):
+    """
+    Releases the prefetch lock.
+
+    Args:
+        root_folder (str): The root folder of the application.
+    """
+    try:
+        os.remove(os.path.join(root_folder, LOCK_PATH))
+    except OSError:
+        pass
+
+def save_record(root_folder, version, base_version, manifest, removed, pending):
+    """
+    Records a verified, fully staged release so the next run can apply it
+    without any download.
+
+    Args:
+        root_folder (str): The root folder of the application.
+        version (str): The prefetched release tag.
+        base_version (str): The installed version the staging was computed against.
+        manifest (dict): The manifest of the release, or None if it has none.
+        removed (list): The relative paths the release no longer ships.
+        pending (dict): The CRC-32 of each staged file, keyed by relative path.
+    """
+    record = {'version': version, 'base_version': base_version, 'manifest': manifest,
+              'removed': removed, 'pending': pending}
+    record_path = os.path.join(root_folder, RECORD_PATH)
+    with open(record_path + '.tmp', 'w') as f:
+        json.dump(record, f)
+    os.replace(record_path + '.tmp', record_path)
+
+def load_record(root_folder, version, base_version):
+    """
+    Loads the prefetched release if it matches the release to install.
+
+    Args:
+        root_folder (str): The root folder of the application.
+        version (str): The release tag to install.
+        base_version (str): The installed version.
+
+    Returns:
+        dict: The prefetch record, or None if no matching release is staged.
+    """
+    try:
+        with open(os.path.join(root_folder, RECORD_PATH), 'r') as f:
+            record = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if record.get('version') != version or record.get('base_version') != base_version \
+            or not os.path.isdir(os.path.join(root_folder, PREFETCH_DIR)):
+        return None
+    return record
+
+def discard(root_folder):
+    """
+    Removes the prefetched release and its record.
+
+    Args:
+        root_folder (str): The root folder of the application.
+    """
+    try:
+        os.remove(os.path.join(root_folder, RECORD_PATH))
+    except OSError:
+        pass
+    shutil.rmtree(os.path.join(root_folder, PREFETCH_DIR), ignore_errors=True)
@@ -0,0 +1,158 @@
+import os
+import time
+import psutil
+
+PID_DIR = os.path.join('.kalymos', 'pids')
+
+def same_path(path, folder):
+    """
+    Checks whether a path lies inside a folder.
+
+    Args:
+        path (str): The path to check.
+        folder (str): The folder.
+
+    Returns:
+        bool: True if the path is inside the folder.
+    """
+    path = os.path.normcase(os.path.abspath(path))
+    folder = os.path.normcase(os.path.abspath(folder))
+    try:
+        return os.path.commonpath([path, folder]) == folder
+    except ValueError:
+        # Paths on different Windows drives have no common path
+        return False
+
+def is_instance(process, executable_name, root_folder):
+    """
+    Checks that a process is an instance of the executable installed in the root folder.
+
+    Args:
+        process (psutil.Process): The process to check.
+        executable_name (str): The name of the executable.
+        root_folder (str): The root folder of the application.
+
+    Returns:
+        bool: True if the process matches.
+    """
+    try:
+        if process.name() != executable_name:
+            return False
+        exe = process.exe()
+    except psutil.AccessDenied:
+        # Same name but the path cannot be read, as before
+        return True
+    except psutil.Error:
+        return False
+    return not exe or same_path(exe, root_folder)
+
+def registered_instances(executable_name, root_folder):
+    """
+    Finds running instances from the PID files the application registers
+    at startup. Stale PID files are removed.
+
+    Args:
+        executable_name (str): The name of the executable.
+        root_folder (str): The root folder of the application.
+
+    Returns:
+        list: The running instances found, as psutil.Process objects.
+    """
+    pid_dir = os.path.join(root_folder, PID_DIR)
+    try:
+        pid_files = os.listdir(pid_dir)
+    except OSError:
+        return []
+
+    processes = []
+    for pid_file in pid_files:
+        try:
+            process = psutil.Process(int(pid_file))
+            if is_instance(process, executable_name, root_folder):
+                processes.append(process)
+                continue
+        except (ValueError, psutil.Error):
+            pass
+        try:
+            os.remove(os.path.join(pid_dir, pid_file))
+        except OSError:
+            pass
+    return processes
+
+def scan_instances(executable_name, root_folder):
+    """
+    Finds every running instance in a single pass over the process table.
+
+    Args:
+        executable_name (str): The name of the executable.
+        root_folder (str): The root folder of the application.
+
+    Returns:
+        list: The running instances found, as psutil.Process objects.
+    """
+    return [process for process in psutil.process_iter(['name'])
+            if process.info['name'] == executable_name and is_instance(process, executable_name, root_folder)]
+
+def find_instances(executable_name, root_folder='.'):
+    """
+    Finds the running instances of an executable from the registered PID
+    files and one filtered scan of the process table. The scan catches
+    instances that never registered, such as one started without the
+    updater.
+
+    Args:
+        executable_name (str): The name of the executable.
+        root_folder (str): The root folder of the application.
+
+    Returns:
+        list: The running instances found, as psutil.Process objects.
+    """
+    processes = {process.pid: process for process in registered_instances(executable_name, root_folder)}
+    for process in scan_instances(executable_name, root_folder):
+        processes.setdefault(process.pid, process)
+    return list(processes.values())
+
+def stop_instances(processes, timeout=10, kill_timeout=5):
+    """
+    Terminates all processes at once, waits up to a deadline and kills
+    whatever is still running. A process this user may not signal, such as
+    another user's instance on a terminal server, is reported as alive
+    without waiting for it.
+
+    Args:
+        processes (list): The psutil.Process objects to stop.
+        timeout (float): Seconds to wait for a graceful exit.
+        kill_timeout (float): Seconds to wait after killing the remaining processes.
+
+    Returns:
+        dict: The duration of the 'terminate' and 'kill' phases, and the processes still 'alive'.
+    """
+    report = {'terminate': 0.0, 'kill': 0.0, 'alive': []}
+
+    denied = []
+    start = time.monotonic()
+    for process in processes:
+        try:
+            process.terminate()
+        except psutil.NoSuchProcess:
+            pass
+        except psutil.AccessDenied:
+            denied.append(process)
+    _, alive = psutil.wait_procs([process for process in processes if process not in denied], timeout=timeout)
+    report['terminate'] = time.monotonic() - start
+
+    if alive:
+        start = time.monotonic()
+        for process in list(alive):
+            try:
+                process.kill()
+            except psutil.NoSuchProcess:
+                pass
+            except psutil.AccessDenied:
+                alive.remove(process)
+                denied.append(process)
+        _, alive = psutil.wait_procs(alive, timeout=kill_timeout)
+        report['kill'] = time.monotonic() - start
+
+    report['alive'] = alive + denied
+    return report
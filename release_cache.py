@@ -0,0 +1,106 @@
+import os
+import json
+import time
+import logging
+import threading
+
+CACHE_PATH = os.path.join('.kalymos', 'release-cache.json')
+TIMEOUT = 10
+_lock = threading.Lock()
+
+def load_cache(cache_path=CACHE_PATH):
+    """
+    Loads the cached release metadata.
+
+    Args:
+        cache_path (str): The path to the cache file.
+
+    Returns:
+        dict: The cache entries keyed by API URL.
+    """
+    try:
+        with open(cache_path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_cache(cache, cache_path=CACHE_PATH):
+    """
+    Writes the cached release metadata atomically.
+
+    Args:
+        cache (dict): The cache entries keyed by API URL.
+        cache_path (str): The path to the cache file.
+    """
+    try:
+        os.makedirs(os.path.dirname(cache_path) or '.', exist_ok=True)
+        with open(cache_path + '.tmp', 'w') as f:
+            json.dump(cache, f)
+        os.replace(cache_path + '.tmp', cache_path)
+    except OSError as e:
+        logging.warning(f"Could not write the release cache: {e}")
+
+def get_release(url, min_interval=0, cache_path=CACHE_PATH, timeout=TIMEOUT, retries=None):
+    """
+    Fetches release metadata from the GitHub API through an on-disk cache.
+
+    Requests carry the cached ETag and Last-Modified values, so an unchanged
+    release is answered with a 304 that does not count against the rate
+    limit. Within min_interval seconds of the last check the cached release
+    is returned without any network call, and a failed request falls back
+    to the cached release when there is one.
+
+    Args:
+        url (str): The GitHub API URL of the release.
+        min_interval (int): The minimum number of seconds between two network checks.
+        cache_path (str): The path to the cache file.
+        timeout (float or tuple): The connect and read timeouts of the request, in seconds.
+        retries (int, optional): The number of retries, the HTTP client's default if not given.
+
+    Returns:
+        dict: The parsed release JSON.
+
+    Raises:
+        requests.exceptions.RequestException: If the request fails and nothing is cached.
+        ValueError: If the response is not valid JSON and nothing is cached.
+    """
+    cache = load_cache(cache_path)
+    entry = cache.get(url)
+    now = time.time()
+    if entry and now - entry['checked_at'] < min_interval:
+        logging.info(f"Using cached release metadata for {url}")
+        return entry['release']
+
+    import requests
+    import http_client
+    headers = {'Accept': 'application/vnd.github+json'}
+    if entry and entry.get('etag'):
+        headers['If-None-Match'] = entry['etag']
+    if entry and entry.get('last_modified'):
+        headers['If-Modified-Since'] = entry['last_modified']
+
+    try:
+        options = {} if retries is None else {'retries': retries}
+        response = http_client.get(url, headers=headers, timeout=timeout, **options)
+        if response.status_code == 304 and entry:
+            logging.info(f"Release metadata for {url} is unchanged.")
+            entry['checked_at'] = now
+        else:
+            response.raise_for_status()
+            entry = {
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'checked_at': now,
+                'release': response.json(),
+            }
+        with _lock:
+            # Reload so concurrent checks of other repositories are kept
+            cache = load_cache(cache_path)
+            cache[url] = entry
+            save_cache(cache, cache_path)
+        return entry['release']
+    except (requests.exceptions.RequestException, ValueError) as e:
+        if entry:
+            logging.warning(f"Using cached release metadata after a failed check: {e}")
+            return entry['release']
+        raise
@@ -0,0 +1,140 @@
+import release_cache
+
+PER_PAGE = 100
+MAX_PAGES = 10
+FULL_ASSET = 'update.zip'
+MANIFEST_ASSET = 'update.manifest.json'
+PATCHES_ASSET = 'update.patches.zip'
+# The manifest and the requests made for each release installed on the way
+STEP_OVERHEAD = 64 * 1024
+
+def parse_version(tag):
+    """
+    Parses a release tag with PEP 440 semantics, so 'v1.10' sorts above 'v1.9'.
+
+    Args:
+        tag (str): The release tag.
+
+    Returns:
+        packaging.version.Version: The parsed version, or None if the tag is not a version.
+    """
+    from packaging import version
+    try:
+        return version.parse(tag)
+    except version.InvalidVersion:
+        return None
+
+def is_newer(tag, current_version):
+    """
+    Checks whether a release tag is a later version than the installed one.
+    Tags that are not versions are compared as strings.
+
+    Args:
+        tag (str): The release tag.
+        current_version (str): The installed version.
+
+    Returns:
+        bool: True if the release is newer.
+    """
+    if tag == current_version:
+        # The common no-update answer, without loading packaging
+        return False
+    new, current = parse_version(tag), parse_version(current_version)
+    if new is None or current is None:
+        return tag > current_version
+    return new > current
+
+def load_index(releases_url, current_version, min_interval=0, timeout=release_cache.TIMEOUT):
+    """
+    Builds the index of published releases from the paginated releases list.
+
+    Each page goes through the release cache, so unchanged pages are
+    revalidated with conditional requests. Pages are read until the one
+    listing the installed version, since older releases cannot be on an
+    upgrade path. Drafts, pre-releases and tags that are not versions are
+    left out.
+
+    Args:
+        releases_url (str): The GitHub API URL of the repository's releases.
+        current_version (str): The installed version.
+        min_interval (int): Seconds during which cached pages are used without contacting GitHub.
+        timeout (float or tuple): The connect and read timeouts of each request, in seconds.
+
+    Returns:
+        list: A dict per release with 'tag', 'version' and 'assets' (asset sizes keyed by name), oldest first.
+
+    Raises:
+        requests.exceptions.RequestException: If a page cannot be fetched and is not cached.
+        ValueError: If a page is not valid JSON and is not cached.
+    """
+    releases = []
+    for page in range(1, MAX_PAGES + 1):
+        batch = release_cache.get_release(f"{releases_url}?per_page={PER_PAGE}&page={page}", min_interval, timeout=timeout)
+        for release in batch:
+            parsed = parse_version(release.get('tag_name', ''))
+            if parsed is None or release.get('draft') or release.get('prerelease'):
+                continue
+            releases.append({
+                'tag': release['tag_name'],
+                'version': parsed,
+                'assets': {asset['name']: asset.get('size', 0) for asset in release.get('assets', [])},
+            })
+        if len(batch) < PER_PAGE or any(release.get('tag_name') == current_version for release in batch):
+            break
+    releases.sort(key=lambda release: release['version'])
+    return releases
+
+def cheapest_path(releases, current_version, target_version):
+    """
+    Picks the cheapest way from the installed version to the target release,
+    judged by the sizes of the assets each release advertises.
+
+    A release can be installed from any earlier version with its full
+    update.zip. It can also be installed from the release right before it
+    with a delta, when it publishes a manifest and binary patches; patches
+    are built against the previous release, so the delta is estimated at
+    the size of update.patches.zip. Every release installed on the way adds
+    a fixed overhead, so a chain has to save more than it costs.
+
+    The delta estimate is a lower bound: changed files without a patch are
+    fetched whole from update.zip, and their sizes are only known from the
+    manifest, which the index does not download. A chain is therefore only
+    picked when it is cheaper even so, and the caller falls back to the
+    full package of the target when a step cannot be staged.
+
+    Args:
+        releases (list): The release index from load_index.
+        current_version (str): The installed version.
+        target_version (str): The release tag to reach.
+
+    Returns:
+        tuple: The tags to install in order, ending with the target, and the estimated bytes to download.
+            The path is just the target when the index does not cover it.
+    """
+    current, target = parse_version(current_version), parse_version(target_version)
+    if current is None or target is None:
+        return [target_version], None
+    steps = [release for release in releases if current < release['version'] <= target]
+    if not steps or steps[-1]['version'] != target:
+        return [target_version], None
+
+    # Releases are in version order, so each one is reached from an earlier one
+    previous_installed = any(release['version'] == current for release in releases)
+    costs = [0]
+    paths = [[]]
+    for position, release in enumerate(steps):
+        best_cost, best_path = None, None
+        if FULL_ASSET in release['assets']:
+            best_cost = release['assets'][FULL_ASSET] + STEP_OVERHEAD
+            best_path = [release['tag']]
+        has_delta = MANIFEST_ASSET in release['assets'] and PATCHES_ASSET in release['assets']
+        if has_delta and costs[position] is not None and (position > 0 or previous_installed):
+            cost = costs[position] + release['assets'][PATCHES_ASSET] + STEP_OVERHEAD
+            if best_cost is None or cost < best_cost:
+                best_cost, best_path = cost, paths[position] + [release['tag']]
+        costs.append(best_cost)
+        paths.append(best_path)
+
+    if paths[-1] is None:
+        return [target_version], None
+    return paths[-1], costs[-1]
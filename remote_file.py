@@ -0,0 +1,106 @@
+import io
+import throttle
+import http_client
+
+TIMEOUT = (10, 60)
+
+class RemoteFile(io.RawIOBase):
+    """
+    A read-only, seekable file object backed by HTTP Range requests.
+
+    Passing an instance to zipfile.ZipFile lets the caller read the central
+    directory and individual entries of a remote archive without downloading
+    the whole file.
+    """
+
+    def __init__(self, url, block_size=1024 * 1024, timeout=TIMEOUT):
+        """
+        Resolves redirects once and reads the total size of the remote file.
+
+        Args:
+            url (str): The URL of the remote file.
+            block_size (int): The minimum number of bytes fetched per request.
+            timeout (tuple): The connect and read timeouts of each request, in seconds.
+
+        Raises:
+            requests.exceptions.RequestException: If the file cannot be reached.
+            OSError: If the server does not support Range requests.
+        """
+        super().__init__()
+        self.timeout = timeout
+        response = http_client.head(url, allow_redirects=True, timeout=timeout)
+        response.raise_for_status()
+        if response.headers.get('accept-ranges', '').lower() != 'bytes':
+            raise OSError(f"Server does not support Range requests for {url}")
+        self.url = response.url
+        self.size = int(response.headers.get('content-length', 0))
+        self.block_size = block_size
+        self.position = 0
+        self.buffer = b""
+        self.buffer_start = 0
+        self.fetched = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self.position = offset
+        elif whence == io.SEEK_CUR:
+            self.position += offset
+        elif whence == io.SEEK_END:
+            self.position = self.size + offset
+        else:
+            raise ValueError(f"Invalid whence: {whence}")
+        self.position = max(0, self.position)
+        return self.position
+
+    def fetch(self, start, end):
+        """
+        Fetches an inclusive byte range from the remote file.
+
+        Args:
+            start (int): The first byte to fetch.
+            end (int): The last byte to fetch.
+
+        Returns:
+            bytes: The requested bytes.
+        """
+        with throttle.connection():
+            response = http_client.get(self.url, headers={'Range': f"bytes={start}-{end}"}, timeout=self.timeout)
+        response.raise_for_status()
+        if response.status_code != 206:
+            raise OSError(f"Server ignored the Range request for {self.url}")
+        self.fetched += len(response.content)
+        return response.content
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self.size - self.position
+        size = min(size, self.size - self.position)
+        if size <= 0:
+            return b""
+
+        offset = self.position - self.buffer_start
+        if offset < 0 or offset + size > len(self.buffer):
+            # Read ahead so that zipfile's many small reads share one request
+            end = min(self.position + max(size, self.block_size), self.size) - 1
+            self.buffer = self.fetch(self.position, end)
+            self.buffer_start = self.position
+            offset = 0
+
+        data = self.buffer[offset:offset + size]
+        self.position += len(data)
+        return data
+
+    def readinto(self, b):
+        data = self.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
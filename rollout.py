@@ -0,0 +1,191 @@
+import os
+import re
+import time
+import hashlib
+
+RAMP_PATTERN = re.compile(r'^\s*rollout:(.*)$', re.IGNORECASE | re.MULTILINE)
+STEP_PATTERN = re.compile(r'(\d+(?:\.\d+)?)h\s*=\s*(\d+(?:\.\d+)?)%')
+MACHINE_ID_PATHS = ['/etc/machine-id', '/var/lib/dbus/machine-id']
+DEFAULT_JITTER = 60 * 60
+
+def machine_id():
+    """
+    Returns a stable identifier of this machine: the Windows MachineGuid,
+    the systemd machine ID elsewhere, or the MAC address as a last resort.
+
+    Returns:
+        str: The machine identifier.
+    """
+    if os.name == 'nt':
+        import winreg
+        try:
+            with winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, r"SOFTWARE\Microsoft\Cryptography", 0,
+                                winreg.KEY_READ | winreg.KEY_WOW64_64KEY) as reg_key:
+                return winreg.QueryValueEx(reg_key, 'MachineGuid')[0]
+        except OSError:
+            pass
+    for path in MACHINE_ID_PATHS:
+        try:
+            with open(path, 'r') as f:
+                value = f.read().strip()
+            if value:
+                return value
+        except OSError:
+            pass
+    import uuid
+    return f"{uuid.getnode():012x}"
+
+def fraction(*parts):
+    """
+    Maps values to a number in [0, 1) that is the same on every run.
+
+    Args:
+        *parts (str): The values to hash.
+
+    Returns:
+        float: The deterministic fraction.
+    """
+    digest = hashlib.sha256(':'.join(parts).encode()).hexdigest()
+    return int(digest[:13], 16) / 16 ** 13
+
+def parse_ramp(notes):
+    """
+    Reads the rollout ramp declared in release notes, as a line such as
+    'rollout: 0h=5%, 24h=25%, 72h=100%': the share of clients allowed to
+    install, by hours since the release was published.
+
+    Args:
+        notes (str): The release notes.
+
+    Returns:
+        list: The (hours, percent) steps in order, or None if the release declares no ramp.
+    """
+    match = RAMP_PATTERN.search(notes or '')
+    if not match:
+        return None
+    steps = sorted((float(hours), min(float(percent), 100.0)) for hours, percent in STEP_PATTERN.findall(match.group(1)))
+    return steps or None
+
+def hours_until_bucket(ramp, bucket):
+    """
+    Works out when a ramp reaches a bucket, interpolating linearly between its steps.
+
+    Args:
+        ramp (list): The (hours, percent) steps from parse_ramp.
+        bucket (float): The bucket of the client, in [0, 100).
+
+    Returns:
+        float: The hours after publication at which the client may install, or None if the ramp never reaches it.
+    """
+    previous_hours, previous_percent = 0.0, 0.0
+    for hours, percent in ramp:
+        if percent > bucket:
+            if percent == previous_percent or hours == previous_hours:
+                return hours
+            return previous_hours + (bucket - previous_percent) * (hours - previous_hours) / (percent - previous_percent)
+        previous_hours, previous_percent = hours, percent
+    return None
+
+def parse_windows(spec):
+    """
+    Reads maintenance windows such as '02:00-05:00, 22:30-23:30', in local time.
+    A window may wrap past midnight.
+
+    Args:
+        spec (str): The windows, separated by commas.
+
+    Returns:
+        list: The (start, end) minutes after midnight of each window.
+    """
+    windows = []
+    for part in (spec or '').split(','):
+        match = re.fullmatch(r'\s*(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})\s*', part)
+        if match:
+            start_hour, start_minute, end_hour, end_minute = map(int, match.groups())
+            windows.append((start_hour * 60 + start_minute, end_hour * 60 + end_minute))
+    return windows
+
+def window_openings(after, windows):
+    """
+    Lists the maintenance windows that are open at a given time or open later.
+
+    Args:
+        after (float): The time, as a timestamp.
+        windows (list): The windows from parse_windows.
+
+    Returns:
+        list: The (opens, closes) timestamps of each window from the day before to the day after.
+    """
+    local = time.localtime(after)
+    midnight = time.mktime((local.tm_year, local.tm_mon, local.tm_mday, 0, 0, 0, 0, 0, -1))
+    openings = []
+    for day in (-1, 0, 1):
+        for start, end in windows:
+            opens = midnight + day * 86400 + start * 60
+            closes = opens + ((end - start) % 1440 or 1440) * 60
+            if closes > after:
+                openings.append((opens, closes))
+    return sorted(openings)
+
+def window_time(after, windows, jitter_fraction):
+    """
+    Picks the moment to install within the first maintenance window that
+    is still open at a given time. The moment is spread over the part of
+    the window that is left, so clients do not all start when it opens.
+
+    Args:
+        after (float): The earliest time, as a timestamp.
+        windows (list): The windows from parse_windows.
+        jitter_fraction (float): Where in the window to install, in [0, 1).
+
+    Returns:
+        float: The time to install, as a timestamp.
+    """
+    opens, closes = window_openings(after, windows)[0]
+    opens = max(opens, after)
+    return opens + jitter_fraction * (closes - opens)
+
+def scheduled_time(release, owner, repo, windows=(), jitter=0, machine=None):
+    """
+    Works out when this client may install a release.
+
+    The client's bucket, from a hash of the machine ID and the repository,
+    is compared to the ramp declared in the release notes. From the moment
+    the ramp reaches the bucket, or from publication without a ramp, a jitter drawn from the machine ID and the
+    tag delays the install, within the maintenance windows when there are
+    any, so downloads are spread out over time. A machine that was off at
+    its moment installs in the next window.
+
+    Args:
+        release (dict): The release JSON from the GitHub API.
+        owner (str): The GitHub repository owner.
+        repo (str): The GitHub repository name.
+        windows (list): The maintenance windows from parse_windows.
+        jitter (float): The longest delay, in seconds, outside maintenance windows.
+        machine (str, optional): The machine identifier. Defaults to machine_id().
+
+    Returns:
+        float: The earliest time to install, as a timestamp, or None if the ramp does not include this client yet.
+            A release without a publication date can be installed at once.
+    """
+    import datetime
+    published = release.get('published_at')
+    if not published:
+        return time.time()
+    machine = machine or machine_id()
+    eligible = datetime.datetime.fromisoformat(published.replace('Z', '+00:00')).timestamp()
+    ramp = parse_ramp(release.get('body'))
+    if ramp:
+        hours = hours_until_bucket(ramp, fraction(machine, owner, repo) * 100)
+        if hours is None:
+            return None
+        eligible += hours * 3600
+    jitter_fraction = fraction(machine, owner, repo, release.get('tag_name', ''))
+    if windows:
+        install_at = window_time(eligible, windows, jitter_fraction)
+        now = time.time()
+        if install_at < now and window_openings(now, windows)[0][0] > now:
+            # The machine missed its moment, so it waits for the next window
+            install_at = window_time(now, windows, jitter_fraction)
+        return install_at
+    return eligible + jitter_fraction * jitter
@@ -0,0 +1,191 @@
+import os
+import json
+import time
+import uuid
+import socket
+import logging
+import threading
+import contextlib
+
+METRICS_PATH = os.path.join('.kalymos', 'metrics.jsonl')
+MAX_METRICS_SIZE = 1024 * 1024
+PROGRESS_INTERVAL = 0.5
+
+_started = time.monotonic()
+_session = uuid.uuid4().hex
+_host = socket.gethostname()
+_entry_point = None
+_metrics_path = METRICS_PATH
+_write_lock = threading.Lock()
+_callbacks = []
+
+def configure(entry_point, metrics_path=METRICS_PATH):
+    """
+    Names the program the records come from and where they are written.
+
+    Args:
+        entry_point (str): The name of the program, e.g. 'updater' or 'manager'.
+        metrics_path (str): The JSON lines file to append records to, or an empty value to disable it.
+    """
+    global _entry_point, _metrics_path
+    _entry_point = entry_point
+    _metrics_path = metrics_path or None
+
+def elapsed():
+    """
+    Returns the number of seconds since the process started.
+
+    Returns:
+        float: The seconds since the process started.
+    """
+    return time.monotonic() - _started
+
+def emit(phase, **fields):
+    """
+    Appends one record to the metrics file. The file is rotated once it
+    grows past MAX_METRICS_SIZE so it never needs to be cleaned up.
+
+    Args:
+        phase (str): The name of the phase.
+        **fields: The values to record.
+    """
+    if _metrics_path is None:
+        return
+    record = {'time': round(time.time(), 3), 'session': _session, 'host': _host,
+              'entry_point': _entry_point, 'phase': phase}
+    record.update(fields)
+    try:
+        with _write_lock:
+            os.makedirs(os.path.dirname(_metrics_path) or '.', exist_ok=True)
+            if os.path.exists(_metrics_path) and os.path.getsize(_metrics_path) > MAX_METRICS_SIZE:
+                os.replace(_metrics_path, _metrics_path + '.1')
+            with open(_metrics_path, 'a') as f:
+                f.write(json.dumps(record) + '\n')
+    except OSError as e:
+        logging.warning(f"Could not write the metrics record: {e}")
+
+class Phase:
+    """
+    The measurement of one running phase. The code inside the phase sets
+    the number of bytes it processed, an outcome other than 'ok' and any
+    extra fields worth recording.
+    """
+
+    def __init__(self, name, fields):
+        self.name = name
+        self.bytes = 0
+        self.outcome = 'ok'
+        self.fields = fields
+
+    def succeeded(self, result):
+        """
+        Sets the outcome from the return value of the work done in the phase.
+
+        Args:
+            result: The return value; a falsy value marks the phase as failed.
+
+        Returns:
+            The return value, unchanged.
+        """
+        self.outcome = 'ok' if result else 'failed'
+        return result
+
+@contextlib.contextmanager
+def phase(name, **fields):
+    """
+    Times a phase and records its duration, bytes processed and outcome.
+    An exception escaping the phase is recorded as an 'error' and re-raised.
+
+    Args:
+        name (str): The name of the phase.
+        **fields: Extra values to record with the phase.
+    """
+    measurement = Phase(name, fields)
+    start = time.monotonic()
+    try:
+        yield measurement
+    except SystemExit as e:
+        if e.code not in (None, 0):
+            measurement.outcome = 'failed'
+        raise
+    except Exception as e:
+        measurement.outcome = 'error'
+        measurement.fields['error'] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        seconds = time.monotonic() - start
+        emit(name, seconds=round(seconds, 4), bytes=measurement.bytes, outcome=measurement.outcome,
+             mb_per_s=round(measurement.bytes / seconds / 1e6, 2) if measurement.bytes and seconds else None,
+             **measurement.fields)
+
+def add_progress_callback(callback):
+    """
+    Registers a function called with the progress of every transfer, so a
+    user interface can show the speed and the time left.
+
+    Args:
+        callback (callable): Called with a dict holding 'name', 'done' and
+            'total' bytes, 'speed' in bytes per second and 'eta' in seconds
+            (None when the total is unknown).
+    """
+    _callbacks.append(callback)
+
+def remove_progress_callback(callback):
+    """
+    Unregisters a progress callback.
+
+    Args:
+        callback (callable): The callback to remove.
+    """
+    if callback in _callbacks:
+        _callbacks.remove(callback)
+
+class Progress:
+    """
+    Tracks the bytes of one transfer, which may be received by several
+    threads, and reports them to the progress callbacks at most every
+    PROGRESS_INTERVAL seconds.
+    """
+
+    def __init__(self, name, total=0, done=0):
+        """
+        Args:
+            name (str): The name of the transfer, usually the file name.
+            total (int): The expected number of bytes, 0 if unknown.
+            done (int): The bytes already available, e.g. from a resumed download.
+        """
+        self.name = name
+        self.total = total
+        self.done = done
+        self.initial = done
+        self.start = time.monotonic()
+        self.reported = 0.0
+        self.lock = threading.Lock()
+
+    def update(self, amount):
+        """
+        Accounts for received bytes.
+
+        Args:
+            amount (int): The number of bytes received.
+        """
+        if not _callbacks:
+            return
+        with self.lock:
+            self.done += amount
+            now = time.monotonic()
+            finished = self.total and self.done >= self.total
+            if now - self.reported < PROGRESS_INTERVAL and not finished:
+                return
+            self.reported = now
+            done = min(self.done, self.total) if self.total else self.done
+            elapsed_time = now - self.start
+            speed = (done - self.initial) / elapsed_time if elapsed_time else 0.0
+            eta = (self.total - done) / speed if self.total and speed else None
+
+        report = {'name': self.name, 'done': done, 'total': self.total, 'speed': speed, 'eta': eta}
+        for callback in list(_callbacks):
+            try:
+                callback(report)
+            except Exception as e:
+                logging.warning(f"Progress callback failed: {e}")
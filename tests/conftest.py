@@ -0,0 +1,49 @@
+import os
+import sys
+import hashlib
+import zipfile
+import pytest
+
+# The modules live at the top of the repository, next to kalymos-updater.py
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, os.path.join(REPO_DIR, 'benchmarks'))
+
+import telemetry
+import stubs
+
+@pytest.fixture(autouse=True)
+def no_metrics():
+    """Keeps the phases timed by the tests out of the metrics file."""
+    telemetry.configure('tests', None)
+
+@pytest.fixture(scope='session')
+def updater():
+    """The kalymos-updater.py module, with its dialogs answering 'yes'."""
+    return stubs.load_updater()
+
+@pytest.fixture
+def fake_github(tmp_path):
+    """A local fake GitHub server serving the releases under tmp_path/'releases'."""
+    import fake_github
+    server = fake_github.FakeGitHub(str(tmp_path / 'releases'))
+    server.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def publish(tmp_path, fake_github):
+    """Builds a release with an update.zip of the given files on the fake server and marks it the latest."""
+    def publish(repo, tag, files, notes=None, owner='o'):
+        folder = tmp_path / 'releases' / owner / repo / tag
+        folder.mkdir(parents=True)
+        with zipfile.ZipFile(folder / 'update.zip', 'w', zipfile.ZIP_DEFLATED) as zip_ref:
+            for name, data in files.items():
+                zip_ref.writestr(name, data)
+        (folder / 'update.zip.sha256').write_text(hashlib.sha256((folder / 'update.zip').read_bytes()).hexdigest())
+        if notes is not None:
+            (folder / 'NOTES.md').write_text(notes)
+        fake_github.publish(owner, repo, tag)
+        return folder
+    return publish
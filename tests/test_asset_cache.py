@@ -0,0 +1,50 @@
+import os
+import time
+import pytest
+import asset_cache
+import config_store
+import mirror
+import telemetry
+import throttle
+
+SHA256 = 'ab' * 32
+
+def test_lock_is_refreshed_while_the_transfer_progresses(tmp_path, monkeypatch):
+    monkeypatch.setattr(asset_cache, '_cache_dir', str(tmp_path))
+    monkeypatch.setattr(asset_cache, 'LOCK_REFRESH_INTERVAL', 0)
+    lock_path = asset_cache.entry_path(SHA256) + '.lock'
+    with asset_cache.locked(SHA256):
+        old = time.time() - asset_cache.LOCK_STALE_AFTER - 60
+        os.utime(lock_path, (old, old))
+        telemetry.Progress('update.zip', 10).update(10)
+        assert time.time() - os.path.getmtime(lock_path) < asset_cache.LOCK_STALE_AFTER
+    assert not os.path.exists(lock_path)
+    assert not telemetry._callbacks
+
+def test_abandoned_lock_is_broken(tmp_path, monkeypatch):
+    monkeypatch.setattr(asset_cache, '_cache_dir', str(tmp_path))
+    lock_path = asset_cache.entry_path(SHA256) + '.lock'
+    os.makedirs(os.path.dirname(lock_path))
+    open(lock_path, 'w').close()
+    old = time.time() - asset_cache.LOCK_STALE_AFTER - 60
+    os.utime(lock_path, (old, old))
+    start = time.monotonic()
+    with asset_cache.locked(SHA256, timeout=5):
+        assert time.time() - os.path.getmtime(lock_path) < 60
+    assert time.monotonic() - start < 1
+
+def test_wait_gives_up_before_a_live_lock_turns_stale():
+    assert asset_cache.LOCK_TIMEOUT < asset_cache.LOCK_STALE_AFTER
+
+@pytest.mark.parametrize('settings, expected', [({}, asset_cache.default_cache_dir()),
+                                                ({'CacheDir': ''}, None),
+                                                ({'CacheDir': '/srv/cache'}, '/srv/cache')])
+def test_cache_dir_setting(tmp_path, monkeypatch, updater, settings, expected):
+    for module, name in ((asset_cache, '_cache_dir'), (mirror, '_mirror_url'),
+                         (throttle, '_bucket'), (throttle, '_connections')):
+        monkeypatch.setattr(module, name, getattr(module, name))
+    store = config_store.FileStore(str(tmp_path / 'kalymos.json'))
+    store.update(settings)
+    monkeypatch.setattr(config_store, '_default_store', store)
+    updater.configure_sources()
+    assert asset_cache.get_cache_dir() == expected
@@ -0,0 +1,22 @@
+import check_state
+
+def test_result_round_trip(tmp_path):
+    check_state.save(str(tmp_path), 'v1', 'v2')
+    state = check_state.load(str(tmp_path), 'v1')
+    assert state['latest_version'] == 'v2'
+    check_state.clear(str(tmp_path))
+    assert check_state.load(str(tmp_path), 'v1') is None
+
+def test_result_for_another_installed_version_is_ignored(tmp_path):
+    check_state.save(str(tmp_path), 'v1', 'v2')
+    assert check_state.load(str(tmp_path), 'v2') is None
+
+def test_up_to_date_result_is_kept(tmp_path):
+    check_state.save(str(tmp_path), 'v1', None)
+    assert check_state.load(str(tmp_path), 'v1')['latest_version'] is None
+
+def test_missing_or_broken_result(tmp_path):
+    assert check_state.load(str(tmp_path), 'v1') is None
+    (tmp_path / check_state.STATE_PATH).parent.mkdir(parents=True)
+    (tmp_path / check_state.STATE_PATH).write_text('{not json')
+    assert check_state.load(str(tmp_path), 'v1') is None
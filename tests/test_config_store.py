@@ -0,0 +1,78 @@
+import os
+import json
+import pytest
+import config_store
+
+@pytest.mark.parametrize('name', ['kalymos.json', 'kalymos.ini'])
+def test_file_store_round_trip(tmp_path, name):
+    path = str(tmp_path / name)
+    store = config_store.FileStore(path)
+    assert store.update({'Owner': 'o', 'Repo': 'r', 'Version': 'v1', 'Prefetch': True}) == \
+        {'Owner': 'o', 'Repo': 'r', 'Version': 'v1', 'Prefetch': 'True'}
+
+    reopened = config_store.FileStore(path)
+    assert reopened.get('Version') == 'v1'
+    assert reopened.get('Prefetch') == 'True'
+    assert reopened.get('Missing', 'default') == 'default'
+    assert not os.path.exists(path + '.tmp')
+
+def test_only_changed_values_are_written(tmp_path, monkeypatch):
+    store = config_store.FileStore(str(tmp_path / 'kalymos.json'))
+    store.update({'Owner': 'o', 'Version': 'v1'})
+    writes = []
+    monkeypatch.setattr(store, 'save_document', lambda: writes.append(dict(store.document[config_store.INI_SECTION])))
+    assert store.update({'Owner': 'o', 'Version': 'v1'}) == {}
+    assert writes == []
+    assert store.update({'Owner': 'o', 'Version': 'v2'}) == {'Version': 'v2'}
+    assert len(writes) == 1
+
+def test_empty_values_fall_back_to_the_default(tmp_path):
+    path = tmp_path / 'kalymos.json'
+    path.write_text(json.dumps({'MirrorUrl': '', 'CheckInterval': '60'}))
+    store = config_store.FileStore(str(path))
+    assert store.get('MirrorUrl', 'default') == 'default'
+    assert store.values()['MirrorUrl'] == ''
+    assert store.get('CheckInterval') == '60'
+
+@pytest.mark.parametrize('name', ['kalymos.json', 'kalymos.ini'])
+def test_children_round_trip(tmp_path, name):
+    path = str(tmp_path / name)
+    store = config_store.FileStore(path)
+    store.update({'Owner': 'top'})
+    store.load_document()['Apps/first'] = {'Owner': 'a', 'Version': 'v1'}
+    store.load_document()['Apps/second'] = {'Owner': 'b', 'Version': 'v1'}
+    store.save_document()
+
+    children = config_store.FileStore(path).children('Apps')
+    assert sorted(children) == ['first', 'second']
+    children['first'].update({'Version': 'v2'})
+
+    reopened = config_store.FileStore(path)
+    assert reopened.get('Owner') == 'top'
+    assert reopened.children('Apps')['first'].get('Version') == 'v2'
+    assert reopened.children('Apps')['second'].get('Version') == 'v1'
+
+def test_json_layout_nests_groups(tmp_path):
+    path = tmp_path / 'kalymos.json'
+    path.write_text(json.dumps({'Owner': 'top', 'Apps': {'first': {'Owner': 'a'}}}))
+    config_store.FileStore(str(path)).children('Apps')['first'].update({'Version': 'v2'})
+    assert json.loads(path.read_text()) == {'Owner': 'top', 'Apps': {'first': {'Owner': 'a', 'Version': 'v2'}}}
+
+def test_unreadable_file_is_an_empty_store(tmp_path):
+    path = tmp_path / 'kalymos.json'
+    path.write_text('{not json')
+    assert config_store.FileStore(str(path)).values() == {}
+
+def test_open_store(tmp_path, monkeypatch):
+    monkeypatch.setenv(config_store.CONFIG_ENV, str(tmp_path / 'settings.ini'))
+    store = config_store.open_store()
+    assert isinstance(store, config_store.FileStore) and store.is_ini()
+    assert isinstance(config_store.open_store('env'), config_store.EnvStore)
+    assert isinstance(config_store.open_store('registry'), config_store.RegistryStore)
+
+def test_env_store(monkeypatch):
+    monkeypatch.setenv('KalymosTestSetting', 'one')
+    store = config_store.EnvStore()
+    assert store.get('KalymosTestSetting') == 'one'
+    store.update({'KalymosTestSetting': 'two'})
+    assert os.environ['KalymosTestSetting'] == 'two'
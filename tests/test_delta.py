@@ -0,0 +1,37 @@
+import io
+import hashlib
+import zipfile
+import pytest
+import asset_cache
+import delta
+
+@pytest.mark.parametrize('name', ['../evil.txt', 'a/../../evil.txt', '/evil.txt', 'C:evil.txt', 'C:/evil.txt',
+                                  '\\evil.txt', '..\\evil.txt'])
+def test_escaping_names_are_unsafe(name):
+    assert not delta.is_safe_path(name)
+
+@pytest.mark.parametrize('name', ['app.exe', 'data/', 'data/config.json', 'a/../b.txt', '.kalymos/manifest.json'])
+def test_relative_names_are_safe(name):
+    assert delta.is_safe_path(name)
+
+def test_corrupt_remote_entry_falls_back_to_the_full_update(tmp_path, monkeypatch):
+    data = b'new contents ' * 100
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zip_ref:
+        zip_ref.writestr('app.dll', data)
+    body = bytearray(buffer.getvalue())
+    # A deflate block of the reserved type 3 cannot be decoded
+    body[body.index(b'app.dll') + len('app.dll')] = 0x07
+    zip_path = tmp_path / 'update.zip'
+    zip_path.write_bytes(bytes(body))
+
+    root = tmp_path / 'app'
+    root.mkdir()
+    (root / 'app.dll').write_bytes(b'old')
+    monkeypatch.setattr(asset_cache, '_cache_dir', None)
+    monkeypatch.setattr(delta, 'RemoteFile', lambda url: open(zip_path, 'rb'))
+    manifest = {'files': {'app.dll': {'size': len(data), 'sha256': hashlib.sha256(data).hexdigest()}}}
+    staging = tmp_path / 'staging'
+
+    assert delta.stage_delta('http://example.invalid/update.zip', manifest, str(root), str(staging)) is None
+    assert not staging.exists()
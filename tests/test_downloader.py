@@ -0,0 +1,63 @@
+import os
+import json
+import pytest
+import downloader
+
+SEGMENT_SIZE = 64 * 1024
+
+@pytest.fixture
+def asset(tmp_path, fake_github, monkeypatch):
+    monkeypatch.setattr(downloader, 'SEGMENT_SIZE', SEGMENT_SIZE)
+    folder = tmp_path / 'releases' / 'o' / 'r' / 'v1'
+    folder.mkdir(parents=True)
+    data = os.urandom(5 * SEGMENT_SIZE + 123)
+    (folder / 'update.zip').write_bytes(data)
+    return f"{fake_github.url}/o/r/releases/download/v1/update.zip", data
+
+def test_segmented_download(tmp_path, asset):
+    url, data = asset
+    destination = tmp_path / 'update.zip'
+    assert downloader.download(url, str(destination))
+    assert destination.read_bytes() == data
+    assert not os.path.exists(str(destination) + '.part')
+    assert not os.path.exists(str(destination) + '.part.json')
+
+def test_resume_only_fetches_missing_segments(tmp_path, asset, fake_github):
+    url, data = asset
+    destination = tmp_path / 'update.zip'
+    part = bytearray(len(data))
+    for index in (0, 2, 5):
+        part[index * SEGMENT_SIZE:(index + 1) * SEGMENT_SIZE] = data[index * SEGMENT_SIZE:(index + 1) * SEGMENT_SIZE]
+    (tmp_path / 'update.zip.part').write_bytes(bytes(part))
+    downloader.save_state(str(tmp_path / 'update.zip.part.json'), url, len(data), None, {0, 2, 5})
+
+    assert downloader.download(url, str(destination))
+    assert destination.read_bytes() == data
+    assert fake_github.stats['bytes_sent'] == 3 * SEGMENT_SIZE
+
+def test_state_of_another_file_is_ignored(tmp_path, asset, fake_github):
+    url, data = asset
+    destination = tmp_path / 'update.zip'
+    (tmp_path / 'update.zip.part').write_bytes(bytes(len(data)))
+    downloader.save_state(str(tmp_path / 'update.zip.part.json'), url, len(data) + 1, None, {0, 1, 2, 3, 4, 5})
+
+    assert downloader.download(url, str(destination))
+    assert destination.read_bytes() == data
+    assert fake_github.stats['bytes_sent'] == len(data)
+
+def test_load_state_checks_the_segment_size(tmp_path):
+    state_path = str(tmp_path / 'state.json')
+    downloader.save_state(state_path, 'u', 10, 'etag', {1, 0})
+    assert downloader.load_state(state_path, 'u', 10, 'etag') == {0, 1}
+    assert downloader.load_state(state_path, 'u', 10, 'other') == set()
+    with open(state_path) as f:
+        state = json.load(f)
+    state['segment_size'] *= 2
+    with open(state_path, 'w') as f:
+        json.dump(state, f)
+    assert downloader.load_state(state_path, 'u', 10, 'etag') == set()
+
+def test_missing_file_fails(tmp_path, fake_github):
+    url = f"{fake_github.url}/o/r/releases/download/v1/missing.zip"
+    assert not downloader.download(url, str(tmp_path / 'missing.zip'))
+    assert not (tmp_path / 'missing.zip').exists()
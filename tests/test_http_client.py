@@ -0,0 +1,57 @@
+import time
+import email.utils
+import pytest
+import requests
+import http_client
+
+def response(status, **headers):
+    result = requests.Response()
+    result.status_code = status
+    result.headers.update(headers)
+    return result
+
+def test_retry_after_seconds():
+    assert http_client.retry_delay(response(503, **{'Retry-After': '7'}), 1) == 7
+    assert http_client.retry_delay(response(429, **{'Retry-After': '0'}), 3) == 0
+
+def test_retry_after_date():
+    when = email.utils.formatdate(time.time() + 20, usegmt=True)
+    assert 15 < http_client.retry_delay(response(503, **{'Retry-After': when}), 1) <= 20
+    past = email.utils.formatdate(time.time() - 20, usegmt=True)
+    assert http_client.retry_delay(response(503, **{'Retry-After': past}), 1) == 0
+
+def test_long_waits_are_not_retried():
+    too_long = str(http_client.MAX_RETRY_WAIT + 1)
+    assert http_client.retry_delay(response(503, **{'Retry-After': too_long}), 1) is None
+    reset = str(int(time.time()) + 3600)
+    assert http_client.retry_delay(response(403, **{'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset': reset}), 1) is None
+
+def test_rate_limit_waits_for_the_reset():
+    reset = str(int(time.time()) + 10)
+    delay = http_client.retry_delay(response(403, **{'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset': reset}), 1)
+    assert 8 < delay <= 10
+
+def test_invalid_retry_after_falls_back_to_backoff():
+    assert 0.5 <= http_client.retry_delay(response(502, **{'Retry-After': 'soon'}), 1) <= 1
+
+@pytest.mark.parametrize('status', [200, 304, 400, 403, 404])
+def test_other_statuses_are_not_retried(status):
+    assert http_client.retry_delay(response(status), 1) is None
+
+@pytest.mark.parametrize('attempt, low, high', [(1, 0.5, 1), (2, 1, 2), (3, 2, 4), (10, 15, 30)])
+def test_backoff_doubles_up_to_the_cap(attempt, low, high):
+    delay = http_client.retry_delay(None, attempt)
+    assert low <= delay <= high
+
+def test_failed_requests_are_retried_then_raised(monkeypatch):
+    monkeypatch.setattr(http_client, 'retry_delay', lambda response, attempt: 0)
+    attempts = []
+
+    def fail(*args, **kwargs):
+        attempts.append(1)
+        raise requests.exceptions.ConnectionError('refused')
+
+    monkeypatch.setattr(http_client.get_session(), 'request', fail)
+    with pytest.raises(requests.exceptions.ConnectionError):
+        http_client.get('http://example.invalid/', retries=2)
+    assert len(attempts) == 3
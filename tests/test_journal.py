@@ -0,0 +1,103 @@
+import os
+import pytest
+import journal
+
+def make_tree(root, files):
+    for name, data in files.items():
+        path = root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+
+def apply_update(root, files, removed=()):
+    for name, data in files.items():
+        path = root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp = path.with_name(path.name + '.new')
+        temp.write_bytes(data)
+        temp.replace(path)
+    for name in removed:
+        (root / name).unlink()
+
+def test_rollback_restores_replaced_and_removed_files(tmp_path):
+    make_tree(tmp_path, {'app.exe': b'v1', 'lib/a.dll': b'a1', 'old.txt': b'old'})
+    journal.begin(str(tmp_path), ['app.exe', 'lib/a.dll', 'new/b.dll', 'old.txt'], 'v1')
+    apply_update(tmp_path, {'app.exe': b'v2', 'lib/a.dll': b'a2', 'new/b.dll': b'b2'}, removed=['old.txt'])
+
+    assert journal.is_pending(str(tmp_path))
+    assert journal.rollback(str(tmp_path), only_pending=True) == 'v1'
+    assert (tmp_path / 'app.exe').read_bytes() == b'v1'
+    assert (tmp_path / 'lib' / 'a.dll').read_bytes() == b'a1'
+    assert (tmp_path / 'old.txt').read_bytes() == b'old'
+    assert not (tmp_path / 'new' / 'b.dll').exists()
+    assert journal.load_journal(str(tmp_path)) is None
+
+def test_committed_update_is_only_rolled_back_on_request(tmp_path, capsys):
+    make_tree(tmp_path, {'app.exe': b'v1'})
+    journal.begin(str(tmp_path), ['app.exe'], 'v1')
+    apply_update(tmp_path, {'app.exe': b'v2'})
+    journal.commit(str(tmp_path))
+
+    assert not journal.is_pending(str(tmp_path))
+    assert journal.rollback(str(tmp_path), only_pending=True) is None
+    assert "already committed" in capsys.readouterr().out
+    assert (tmp_path / 'app.exe').read_bytes() == b'v2'
+
+    assert journal.rollback(str(tmp_path)) == 'v1'
+    assert (tmp_path / 'app.exe').read_bytes() == b'v1'
+
+def test_rollback_without_journal(tmp_path):
+    assert journal.rollback(str(tmp_path)) is None
+
+def test_new_journal_replaces_the_previous_one(tmp_path):
+    make_tree(tmp_path, {'app.exe': b'v1'})
+    journal.begin(str(tmp_path), ['app.exe'], 'v1')
+    apply_update(tmp_path, {'app.exe': b'v2'})
+    journal.commit(str(tmp_path))
+    journal.begin(str(tmp_path), ['app.exe'], 'v2')
+    apply_update(tmp_path, {'app.exe': b'v3'})
+
+    assert journal.rollback(str(tmp_path)) == 'v2'
+    assert (tmp_path / 'app.exe').read_bytes() == b'v2'
+
+def test_interrupted_rollback_can_be_run_again(tmp_path, monkeypatch):
+    make_tree(tmp_path, {'a.dll': b'a1', 'b.dll': b'b1', 'c.dll': b'c1'})
+    journal.begin(str(tmp_path), ['a.dll', 'b.dll', 'c.dll', 'new.dll'], 'v1')
+    apply_update(tmp_path, {'a.dll': b'a2', 'b.dll': b'b2', 'c.dll': b'c2', 'new.dll': b'n2'})
+
+    real_replace = os.replace
+    calls = []
+    def crash_on_second(source, destination):
+        calls.append(destination)
+        if len(calls) == 2:
+            raise KeyboardInterrupt
+        real_replace(source, destination)
+    monkeypatch.setattr(os, 'replace', crash_on_second)
+    with pytest.raises(KeyboardInterrupt):
+        journal.rollback(str(tmp_path), only_pending=True)
+    monkeypatch.setattr(os, 'replace', real_replace)
+
+    assert journal.is_pending(str(tmp_path))
+    assert journal.rollback(str(tmp_path), only_pending=True) == 'v1'
+    assert [(tmp_path / name).read_bytes() for name in ('a.dll', 'b.dll', 'c.dll')] == [b'a1', b'b1', b'c1']
+    assert not (tmp_path / 'new.dll').exists()
+    assert not journal.is_pending(str(tmp_path))
+
+def test_locked_file_keeps_the_journal_for_another_rollback(tmp_path, monkeypatch, capsys):
+    make_tree(tmp_path, {'a.dll': b'a1', 'b.dll': b'b1'})
+    journal.begin(str(tmp_path), ['a.dll', 'b.dll'], 'v1')
+    apply_update(tmp_path, {'a.dll': b'a2', 'b.dll': b'b2'})
+
+    real_replace = os.replace
+    def locked(source, destination):
+        if destination.endswith('b.dll'):
+            raise PermissionError("in use")
+        real_replace(source, destination)
+    monkeypatch.setattr(os, 'replace', locked)
+    assert journal.rollback(str(tmp_path), only_pending=True) is None
+    assert "Could not restore b.dll" in capsys.readouterr().out
+    assert journal.is_pending(str(tmp_path))
+    monkeypatch.setattr(os, 'replace', real_replace)
+
+    assert journal.rollback(str(tmp_path), only_pending=True) == 'v1'
+    assert (tmp_path / 'a.dll').read_bytes() == b'a1'
+    assert (tmp_path / 'b.dll').read_bytes() == b'b1'
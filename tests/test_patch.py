@@ -0,0 +1,120 @@
+import io
+import lzma
+import zlib
+import random
+import struct
+import hashlib
+import pytest
+import zipfile
+import asset_cache
+import delta
+import patch
+
+def write(path, data):
+    path.write_bytes(data)
+    return str(path)
+
+def make_pair(tmp_path, size=64 * 1024, seed=1):
+    rnd = random.Random(seed)
+    base = bytearray(rnd.randbytes(size))
+    target = bytearray(base)
+    target[1000:1010] = rnd.randbytes(10)
+    target[20000:20000] = rnd.randbytes(300)
+    del target[40000:40500]
+    target += rnd.randbytes(100)
+    return write(tmp_path / 'base', bytes(base)), write(tmp_path / 'target', bytes(target)), bytes(target)
+
+def test_round_trip(tmp_path):
+    base_path, target_path, target = make_pair(tmp_path)
+    patch_path = str(tmp_path / 'out.patch')
+    assert patch.make_patch(base_path, target_path, patch_path)
+    with open(patch_path, 'rb') as f:
+        sha256, crc = patch.apply_patch(base_path, f, str(tmp_path / 'rebuilt'))
+    assert (tmp_path / 'rebuilt').read_bytes() == target
+    assert sha256 == hashlib.sha256(target).hexdigest()
+    assert crc == zlib.crc32(target)
+
+@pytest.mark.parametrize('target', [b'', bytes(range(256)) * 3, bytes(range(256)) * 4 + b'tail'])
+def test_round_trip_edge_targets(tmp_path, target):
+    base_path = write(tmp_path / 'base', bytes(range(256)) * 4)
+    target_path = write(tmp_path / 'target', target)
+    patch_path = str(tmp_path / 'out.patch')
+    assert patch.make_patch(base_path, target_path, patch_path)
+    with open(patch_path, 'rb') as f:
+        patch.apply_patch(base_path, f, str(tmp_path / 'rebuilt'))
+    assert (tmp_path / 'rebuilt').read_bytes() == target
+
+def test_unrelated_files_are_not_patched(tmp_path):
+    rnd = random.Random(2)
+    base_path = write(tmp_path / 'base', rnd.randbytes(32 * 1024))
+    target_path = write(tmp_path / 'target', rnd.randbytes(32 * 1024))
+    assert not patch.make_patch(base_path, target_path, str(tmp_path / 'out.patch'))
+
+def apply_bytes(tmp_path, base_path, data):
+    return patch.apply_patch(base_path, io.BytesIO(data), str(tmp_path / 'rebuilt'))
+
+def test_truncated_patch_is_rejected(tmp_path):
+    base_path, target_path, _ = make_pair(tmp_path)
+    patch_path = tmp_path / 'out.patch'
+    assert patch.make_patch(base_path, target_path, str(patch_path))
+    raw = lzma.decompress(patch_path.read_bytes())
+    for cut in (4, len(patch.MAGIC) + 4, len(raw) // 2, len(raw) - 1):
+        with pytest.raises(ValueError):
+            apply_bytes(tmp_path, base_path, lzma.compress(raw[:cut]))
+
+def test_truncated_compressed_stream_is_rejected(tmp_path):
+    base_path, target_path, _ = make_pair(tmp_path)
+    patch_path = tmp_path / 'out.patch'
+    assert patch.make_patch(base_path, target_path, str(patch_path))
+    data = patch_path.read_bytes()
+    with pytest.raises(ValueError, match="ended unexpectedly"):
+        apply_bytes(tmp_path, base_path, data[:len(data) // 2])
+
+def test_corrupt_compressed_stream_is_rejected(tmp_path):
+    base_path = write(tmp_path / 'base', b'x' * 1024)
+    with pytest.raises(lzma.LZMAError):
+        apply_bytes(tmp_path, base_path, b'not an lzma stream at all')
+
+def test_bad_magic_is_rejected(tmp_path):
+    base_path = write(tmp_path / 'base', b'x' * 1024)
+    with pytest.raises(ValueError, match="Not a patch file"):
+        apply_bytes(tmp_path, base_path, lzma.compress(b'NOTPATCH' + struct.pack('<Q', 0)))
+
+def test_unknown_operation_is_rejected(tmp_path):
+    base_path = write(tmp_path / 'base', b'x' * 1024)
+    raw = patch.MAGIC + struct.pack('<Q', 4) + b'Z' + struct.pack('<Q', 4)
+    with pytest.raises(ValueError, match="Unknown patch operation"):
+        apply_bytes(tmp_path, base_path, lzma.compress(raw))
+
+def test_copy_past_base_is_rejected(tmp_path):
+    base_path = write(tmp_path / 'base', b'x' * 1024)
+    raw = patch.MAGIC + struct.pack('<Q', 100) + patch.OP_COPY + struct.pack('<QQ', 1000, 100)
+    with pytest.raises(ValueError, match="past the end"):
+        apply_bytes(tmp_path, base_path, lzma.compress(raw))
+
+def test_wrong_target_size_is_rejected(tmp_path):
+    base_path = write(tmp_path / 'base', b'x' * 1024)
+    raw = patch.MAGIC + struct.pack('<Q', 10) + patch.OP_INSERT + struct.pack('<Q', 4) + b'abcd'
+    with pytest.raises(ValueError, match="expected 10"):
+        apply_bytes(tmp_path, base_path, lzma.compress(raw))
+
+def test_truncated_patch_falls_back_to_full_file(tmp_path, monkeypatch):
+    root = tmp_path / 'app'
+    root.mkdir()
+    base_path, target_path, target = make_pair(tmp_path)
+    (root / 'big.bin').write_bytes((tmp_path / 'base').read_bytes())
+    patch_path = tmp_path / 'out.patch'
+    assert patch.make_patch(base_path, target_path, str(patch_path))
+    data = patch_path.read_bytes()
+    patches_zip = tmp_path / delta.PATCHES_NAME
+    with zipfile.ZipFile(patches_zip, 'w') as zf:
+        zf.writestr('big.bin.patch', data[:len(data) // 2])
+
+    monkeypatch.setattr(asset_cache, '_cache_dir', None)
+    monkeypatch.setattr(delta, 'RemoteFile', lambda url: open(patches_zip, 'rb'))
+    manifest = {'files': {'big.bin': {'size': len(target), 'sha256': hashlib.sha256(target).hexdigest(),
+                                      'patches': {delta.hash_file(base_path): 'big.bin.patch'}}}}
+    staging = tmp_path / 'staging'
+    patched = delta.stage_patches('unused', manifest, str(root), str(staging), ['big.bin'])
+    assert patched == set()
+    assert not (staging / 'big.bin').exists()
@@ -0,0 +1,155 @@
+import io
+import hashlib
+import zlib
+import zipfile
+import pytest
+import installer
+import pipeline
+
+class FakeResponse:
+    """Serves a body in small chunks, so reads cross chunk boundaries."""
+
+    def __init__(self, body, chunk_size=7):
+        self.body = body
+        self.chunk_size = chunk_size
+        self.headers = {'content-length': str(len(body))}
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, _):
+        for offset in range(0, len(self.body), self.chunk_size):
+            yield self.body[offset:offset + self.chunk_size]
+
+class Unseekable(io.RawIOBase):
+    """A write-only file, so zipfile falls back to data descriptors."""
+
+    def __init__(self):
+        self.data = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self.data += b
+        return len(b)
+
+FILES = {
+    'app.exe': bytes(range(256)) * 200,
+    'data/config.json': b'{"key": "value"}',
+    'data/empty.bin': b'',
+    'docs/readme.txt': b'hello ' * 5000,
+}
+
+def build_zip(files=FILES, compression=zipfile.ZIP_DEFLATED):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', compression) as zip_ref:
+        zip_ref.writestr('data/', b'')
+        for name, data in files.items():
+            zip_ref.writestr(name, data)
+    return buffer.getvalue()
+
+def stream_of(body):
+    return pipeline.HashingStream(FakeResponse(body), io.BytesIO())
+
+@pytest.mark.parametrize('compression', [zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED])
+def test_extracts_every_entry(tmp_path, compression):
+    body = build_zip(compression=compression)
+    stream = stream_of(body)
+    pipeline.extract_stream(stream, str(tmp_path))
+    stream.drain()
+    for name, data in FILES.items():
+        assert (tmp_path / name).read_bytes() == data
+    assert stream.file.getvalue() == body
+    assert stream.received == len(body)
+
+def test_unchanged_entries_are_skipped(tmp_path):
+    root, staging = tmp_path / 'root', tmp_path / 'staging'
+    root.mkdir()
+    (root / 'app.exe').write_bytes(FILES['app.exe'])
+    index = installer.FileIndex(str(root))
+    assert pipeline.extract_stream(stream_of(build_zip()), str(staging), index) == \
+        (3, sum(len(data) for name, data in FILES.items() if name != 'app.exe'))
+    assert not (staging / 'app.exe').exists()
+    assert (staging / 'docs' / 'readme.txt').read_bytes() == FILES['docs/readme.txt']
+    assert index.pending['docs/readme.txt'] == zlib.crc32(FILES['docs/readme.txt'])
+    assert 'app.exe' not in index.pending
+
+def test_crc_mismatch_is_rejected(tmp_path):
+    body = bytearray(build_zip({'a.txt': b'A' * 1000}, zipfile.ZIP_STORED))
+    body[body.index(b'A' * 10)] ^= 0xFF
+    with pytest.raises(zipfile.BadZipFile, match="CRC mismatch"):
+        pipeline.extract_stream(stream_of(bytes(body)), str(tmp_path))
+
+def corrupt_deflate(body, name):
+    # A deflate block of the reserved type 3 cannot be decoded
+    body = bytearray(body)
+    body[body.index(name.encode()) + len(name)] = 0x07
+    return bytes(body)
+
+def test_corrupt_deflate_data_is_rejected(tmp_path):
+    body = corrupt_deflate(build_zip({'a.txt': b'A' * 1000}, zipfile.ZIP_DEFLATED), 'a.txt')
+    with pytest.raises(zipfile.BadZipFile, match="Corrupt entry a.txt"):
+        pipeline.extract_stream(stream_of(body), str(tmp_path))
+
+def test_truncated_archive_is_rejected(tmp_path):
+    body = build_zip({'a.txt': b'A' * 1000}, zipfile.ZIP_STORED)
+    with pytest.raises(EOFError):
+        pipeline.extract_stream(stream_of(body[:200]), str(tmp_path))
+
+def test_unsafe_path_is_rejected(tmp_path):
+    body = build_zip({'../evil.txt': b'x'})
+    with pytest.raises(zipfile.BadZipFile, match="Unsafe path"):
+        pipeline.extract_stream(stream_of(body), str(tmp_path / 'staging'))
+    assert not (tmp_path / 'evil.txt').exists()
+
+def test_data_descriptors_are_not_streamed(tmp_path):
+    output = Unseekable()
+    with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as zip_ref:
+        zip_ref.writestr('a.txt', b'hello')
+        with zip_ref.open('b.txt', 'w') as f:
+            f.write(b'world')
+    with pytest.raises(pipeline.StreamingUnsupported):
+        pipeline.extract_stream(stream_of(bytes(output.data)), str(tmp_path))
+
+def test_zip64_sizes_replace_placeholders():
+    import struct
+    extra = struct.pack('<HHQQ', pipeline.ZIP64_EXTRA_ID, 16, 5_000_000_000, 4_000_000_000)
+    assert pipeline.zip64_sizes(extra, 0xFFFFFFFF, 0xFFFFFFFF) == (4_000_000_000, 5_000_000_000)
+    assert pipeline.zip64_sizes(b'', 10, 20) == (10, 20)
+
+@pytest.mark.parametrize('corruption', ['hash', 'crc', 'deflate'])
+def test_rejected_stream_leaves_index_unchanged(tmp_path, monkeypatch, corruption):
+    root = tmp_path / 'root'
+    root.mkdir()
+    body = build_zip(compression=zipfile.ZIP_STORED)
+    expected_hash = hashlib.sha256(body).hexdigest()
+    if corruption == 'hash':
+        expected_hash = '0' * 64
+    elif corruption == 'deflate':
+        body = corrupt_deflate(build_zip(), 'app.exe')
+    else:
+        body = bytearray(body)
+        body[body.index(b'hello ' * 10)] ^= 0xFF
+        body = bytes(body)
+    monkeypatch.setattr(pipeline.http_client, 'get', lambda url, **kwargs: FakeResponse(body, 4096))
+    index = installer.FileIndex(str(root))
+    index.pending['kept.txt'] = 1234
+
+    assert pipeline.stream_update('http://example.invalid/update.zip', str(tmp_path / 'update.zip'),
+                                      str(tmp_path / 'staging'), expected_hash, index) is None
+    assert index.pending == {'kept.txt': 1234}
+    assert not (tmp_path / 'staging').exists()
+
+def test_stream_update_reports_written_files(tmp_path, monkeypatch, capsys):
+    root = tmp_path / 'root'
+    root.mkdir()
+    (root / 'app.exe').write_bytes(FILES['app.exe'])
+    body = build_zip()
+    monkeypatch.setattr(pipeline.http_client, 'get', lambda url, **kwargs: FakeResponse(body, 4096))
+    index = installer.FileIndex(str(root))
+
+    written = pipeline.stream_update('http://example.invalid/update.zip', str(tmp_path / 'update.zip'),
+                                     str(tmp_path / 'staging'), hashlib.sha256(body).hexdigest(), index)
+    assert written == (3, sum(len(data) for name, data in FILES.items() if name != 'app.exe'))
+    assert f"{written[0]} files changed, {written[1]} bytes written" in capsys.readouterr().out
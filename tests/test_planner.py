@@ -0,0 +1,77 @@
+import os
+import zipfile
+import pytest
+import asset_cache
+import installer
+import planner
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    previous = asset_cache.get_cache_dir()
+    asset_cache.set_cache_dir(str(tmp_path / 'cache'))
+    yield tmp_path / 'cache'
+    asset_cache.set_cache_dir(previous)
+
+@pytest.mark.parametrize('size, expected', [(0, 0), (1, 4096), (4096, 4096), (4097, 8192)])
+def test_allocated_rounds_up_to_clusters(size, expected):
+    assert planner.allocated(size) == expected
+
+def test_volume_of_a_folder_not_created_yet(tmp_path):
+    device, existing = planner.volume_of(str(tmp_path / 'not' / 'yet'))
+    assert existing == str(tmp_path)
+    assert device == os.stat(tmp_path).st_dev
+
+def test_plan_volumes_adds_up_each_volume(tmp_path):
+    volumes = planner.plan_volumes([(str(tmp_path / 'a'), 100, False), (str(tmp_path / 'b'), 50, True)])
+    assert len(volumes) == 1
+    assert volumes[0]['required'] == 150
+    assert volumes[0]['optional'] is False
+    assert volumes[0]['free'] > 0
+    assert planner.plan_volumes([(str(tmp_path), 10, True)])[0]['optional'] is True
+
+def test_journal_needs_no_space_with_hardlinks(tmp_path, monkeypatch):
+    (tmp_path / 'big.bin').write_bytes(bytes(10000))
+    (tmp_path / 'small.bin').write_bytes(b'x')
+    paths = ['big.bin', 'small.bin', 'new.bin']
+    assert planner.journal_need(str(tmp_path), paths)[1] == 0
+    monkeypatch.setattr(planner, 'supports_hardlinks', lambda folder: False)
+    journal_dir, need = planner.journal_need(str(tmp_path), paths)
+    assert need == 12288 + 4096
+    assert journal_dir == os.path.join(str(tmp_path), planner.JOURNAL_DIR)
+
+def test_plan_delta(tmp_path, cache_dir):
+    manifest = {'files': {'a.bin': {'size': 5000}, 'b.bin': {'size': 10}, 'c.bin': {'size': 1}}}
+    plan = planner.plan_delta(manifest, ['a.bin', 'b.bin'], str(tmp_path), str(tmp_path / 'staging'))
+    assert plan['changed'] == 2
+    assert plan['changed_bytes'] == 8192 + 4096
+    assert sum(volume['required'] for volume in plan['volumes']) == 2 * plan['changed_bytes']
+
+def test_plan_update_reads_only_the_central_directory(tmp_path, fake_github, cache_dir):
+    root = tmp_path / 'root'
+    root.mkdir()
+    (root / 'same.bin').write_bytes(b'same' * 1000)
+    folder = tmp_path / 'releases' / 'o' / 'r' / 'v2'
+    folder.mkdir(parents=True)
+    with zipfile.ZipFile(folder / 'update.zip', 'w') as zip_ref:
+        zip_ref.writestr('same.bin', b'same' * 1000)
+        zip_ref.writestr('data/', b'')
+        zip_ref.writestr('data/new.bin', os.urandom(1_000_000))
+    url = f"{fake_github.url}/o/r/releases/download/v2/update.zip"
+
+    plan = planner.plan_update(url, str(root), str(root / 'staging'), installer.FileIndex(str(root)))
+    assert (plan['entries'], plan['changed'], plan['unchanged']) == (2, 1, 1)
+    assert plan['uncompressed'] == 1_004_000
+    assert plan['changed_bytes'] == planner.allocated(1_000_000)
+    assert plan['compressed'] == os.path.getsize(folder / 'update.zip')
+    assert plan['fetched'] < 100_000
+    assert sum(volume['required'] for volume in plan['volumes']) == \
+        2 * planner.allocated(plan['compressed']) + plan['changed_bytes']
+
+def test_plan_update_rejects_unsafe_paths(tmp_path, fake_github, cache_dir):
+    folder = tmp_path / 'releases' / 'o' / 'r' / 'v2'
+    folder.mkdir(parents=True)
+    with zipfile.ZipFile(folder / 'update.zip', 'w') as zip_ref:
+        zip_ref.writestr('../evil.bin', b'x')
+    url = f"{fake_github.url}/o/r/releases/download/v2/update.zip"
+    with pytest.raises(zipfile.BadZipFile):
+        planner.plan_update(url, str(tmp_path), str(tmp_path / 'staging'), installer.FileIndex(str(tmp_path)))
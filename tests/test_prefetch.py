@@ -0,0 +1,42 @@
+import os
+import sys
+import subprocess
+import prefetch
+
+def stage(root, version='v2', base_version='v1'):
+    (root / prefetch.PREFETCH_DIR).mkdir(parents=True, exist_ok=True)
+    (root / prefetch.PREFETCH_DIR / 'lib.dll').write_bytes(b'new')
+    prefetch.save_record(str(root), version, base_version, None, [], {'lib.dll': 1})
+
+def test_record_matches_its_release_and_base_version(tmp_path):
+    stage(tmp_path)
+    assert prefetch.load_record(str(tmp_path), 'v2', 'v1')['pending'] == {'lib.dll': 1}
+
+def test_record_for_another_release_is_ignored(tmp_path):
+    stage(tmp_path)
+    assert prefetch.load_record(str(tmp_path), 'v3', 'v1') is None
+
+def test_record_for_another_installed_version_is_ignored(tmp_path):
+    stage(tmp_path)
+    assert prefetch.load_record(str(tmp_path), 'v2', 'v1.5') is None
+
+def test_record_without_its_staged_files_is_ignored(tmp_path):
+    stage(tmp_path)
+    prefetch.discard(str(tmp_path))
+    assert prefetch.load_record(str(tmp_path), 'v2', 'v1') is None
+
+def test_held_lock_prevents_a_second_prefetch(tmp_path):
+    assert prefetch.acquire_lock(str(tmp_path))
+    assert prefetch.is_running(str(tmp_path))
+    assert not prefetch.acquire_lock(str(tmp_path))
+    prefetch.release_lock(str(tmp_path))
+    assert prefetch.acquire_lock(str(tmp_path))
+
+def test_lock_of_a_dead_process_is_taken_over(tmp_path):
+    finished = subprocess.Popen([sys.executable, '-c', 'pass'])
+    finished.wait()
+    lock_path = tmp_path / prefetch.LOCK_PATH
+    lock_path.parent.mkdir(parents=True)
+    lock_path.write_text(str(finished.pid))
+    assert prefetch.acquire_lock(str(tmp_path))
+    assert lock_path.read_text() == str(os.getpid())
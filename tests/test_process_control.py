@@ -0,0 +1,42 @@
+import sys
+import ntpath
+import time
+import subprocess
+import psutil
+import pytest
+import process_control
+
+@pytest.fixture
+def child():
+    popen = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(60)'])
+    yield psutil.Process(popen.pid)
+    popen.kill()
+    popen.wait()
+
+def test_running_instances_are_stopped(child):
+    report = process_control.stop_instances([child], timeout=5)
+    assert report['alive'] == []
+    assert not child.is_running()
+
+def test_instances_that_cannot_be_signalled_are_reported_alive(child, monkeypatch):
+    def denied():
+        raise psutil.AccessDenied(child.pid)
+    monkeypatch.setattr(child, 'terminate', denied)
+    monkeypatch.setattr(child, 'kill', denied)
+    start = time.monotonic()
+    report = process_control.stop_instances([child], timeout=5)
+    assert report['alive'] == [child]
+    assert time.monotonic() - start < 1
+
+@pytest.mark.parametrize('path, expected', [('C:\\App\\app.exe', True), ('c:\\app\\bin\\app.exe', True),
+                                            ('C:\\Other\\app.exe', False), ('D:\\App\\app.exe', False)])
+def test_same_path_across_windows_drives(monkeypatch, path, expected):
+    monkeypatch.setattr(process_control.os, 'path', ntpath)
+    assert process_control.same_path(path, 'C:\\App') is expected
+
+def test_unregistered_instances_are_found_next_to_registered_ones(tmp_path, monkeypatch):
+    registered, unregistered = psutil.Process(), psutil.Process(psutil.Process().ppid())
+    monkeypatch.setattr(process_control, 'registered_instances', lambda *args: [registered])
+    monkeypatch.setattr(process_control, 'scan_instances', lambda *args: [registered, unregistered])
+    assert sorted(p.pid for p in process_control.find_instances('app.exe', str(tmp_path))) == \
+        sorted([registered.pid, unregistered.pid])
@@ -0,0 +1,78 @@
+import threading
+import pytest
+import release_cache
+
+@pytest.fixture
+def release_url(tmp_path, fake_github):
+    (tmp_path / 'releases' / 'o' / 'r' / 'v2').mkdir(parents=True)
+    fake_github.publish('o', 'r', 'v2')
+    return f"{fake_github.url}/repos/o/r/releases/latest"
+
+def test_unchanged_release_is_revalidated_with_its_etag(tmp_path, release_url, fake_github):
+    cache_path = str(tmp_path / 'cache.json')
+    assert release_cache.get_release(release_url, cache_path=cache_path)['tag_name'] == 'v2'
+    entry = release_cache.load_cache(cache_path)[release_url]
+    assert entry['etag']
+
+    assert release_cache.get_release(release_url, cache_path=cache_path)['tag_name'] == 'v2'
+    assert fake_github.stats['not_modified'] == 1
+    assert release_cache.load_cache(cache_path)[release_url]['checked_at'] > entry['checked_at']
+
+def test_changed_release_replaces_the_cached_one(tmp_path, release_url, fake_github):
+    cache_path = str(tmp_path / 'cache.json')
+    release_cache.get_release(release_url, cache_path=cache_path)
+    (tmp_path / 'releases' / 'o' / 'r' / 'v3').mkdir()
+    fake_github.publish('o', 'r', 'v3')
+    assert release_cache.get_release(release_url, cache_path=cache_path)['tag_name'] == 'v3'
+    assert fake_github.stats['not_modified'] == 0
+
+def test_check_interval_answers_from_the_cache(tmp_path, release_url, fake_github):
+    cache_path = str(tmp_path / 'cache.json')
+    release_cache.get_release(release_url, 3600, cache_path)
+    requests = fake_github.stats['requests']
+    assert release_cache.get_release(release_url, 3600, cache_path)['tag_name'] == 'v2'
+    assert fake_github.stats['requests'] == requests
+
+def test_failed_check_falls_back_to_the_cache(tmp_path, release_url, fake_github):
+    cache_path = str(tmp_path / 'cache.json')
+    release_cache.get_release(release_url, cache_path=cache_path)
+    fake_github.latest.clear()
+    assert release_cache.get_release(release_url, cache_path=cache_path, retries=0)['tag_name'] == 'v2'
+
+def test_failed_check_without_cache_raises(tmp_path, release_url, fake_github):
+    import requests
+    fake_github.latest.clear()
+    with pytest.raises(requests.exceptions.RequestException):
+        release_cache.get_release(release_url, cache_path=str(tmp_path / 'cache.json'), retries=0)
+
+def test_concurrent_checks_keep_every_entry(tmp_path, fake_github):
+    urls = []
+    for repo in [f"r{i}" for i in range(8)]:
+        (tmp_path / 'releases' / 'o' / repo / 'v1').mkdir(parents=True)
+        fake_github.publish('o', repo, 'v1')
+        urls.append(f"{fake_github.url}/repos/o/{repo}/releases/latest")
+    cache_path = str(tmp_path / 'cache.json')
+    threads = [threading.Thread(target=release_cache.get_release, args=(url, 0, cache_path)) for url in urls]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(release_cache.load_cache(cache_path)) == sorted(urls)
+
+def test_last_modified_is_sent_back(tmp_path, monkeypatch):
+    import http_client
+    url = 'http://example.invalid/repos/o/r/releases/latest'
+    cache_path = str(tmp_path / 'cache.json')
+    release_cache.save_cache({url: {'etag': None, 'last_modified': 'Wed, 01 Jul 2026 00:00:00 GMT',
+                                    'checked_at': 0, 'release': {'tag_name': 'v2'}}}, cache_path)
+    sent = {}
+    class NotModified:
+        status_code = 304
+    def get(url, headers, **kwargs):
+        sent.update(headers)
+        return NotModified()
+    monkeypatch.setattr(http_client, 'get', get)
+
+    assert release_cache.get_release(url, cache_path=cache_path)['tag_name'] == 'v2'
+    assert sent['If-Modified-Since'] == 'Wed, 01 Jul 2026 00:00:00 GMT'
+    assert 'If-None-Match' not in sent
@@ -0,0 +1,67 @@
+import pytest
+import release_index
+from release_index import FULL_ASSET, MANIFEST_ASSET, PATCHES_ASSET, STEP_OVERHEAD
+
+@pytest.mark.parametrize('tag, current, newer', [
+    ('v1.10', 'v1.9', True),
+    ('v1.9', 'v1.10', False),
+    ('v2.0', 'v2.0', False),
+    ('v2.0.1', 'v2.0', True),
+    ('nightly-b', 'nightly-a', True),
+])
+def test_is_newer(tag, current, newer):
+    assert release_index.is_newer(tag, current) is newer
+
+def release(tag, full=None, patches=None):
+    assets = {}
+    if full is not None:
+        assets[FULL_ASSET] = full
+    if patches is not None:
+        assets[MANIFEST_ASSET] = 1000
+        assets[PATCHES_ASSET] = patches
+    return {'tag': tag, 'version': release_index.parse_version(tag), 'assets': assets}
+
+def test_chain_of_small_deltas_beats_the_full_package():
+    releases = [release('v1.8', 100_000_000), release('v1.9', 100_000_000, 1_000_000),
+                release('v1.10', 100_000_000, 2_000_000)]
+    path, cost = release_index.cheapest_path(releases, 'v1.8', 'v1.10')
+    assert path == ['v1.9', 'v1.10']
+    assert cost == 3_000_000 + 2 * STEP_OVERHEAD
+
+def test_full_package_wins_when_the_deltas_add_up():
+    releases = [release('v1', 10_000_000), release('v2', 10_000_000, 6_000_000), release('v3', 10_000_000, 6_000_000)]
+    assert release_index.cheapest_path(releases, 'v1', 'v3') == (['v3'], 10_000_000 + STEP_OVERHEAD)
+
+def test_delta_needs_the_installed_release_as_its_base():
+    releases = [release('v2', 50_000_000, 1_000), release('v3', 50_000_000, 1_000)]
+    # v1 is not in the index, so the patches of v2 may not apply to what is installed
+    assert release_index.cheapest_path(releases, 'v1', 'v3') == (['v3'], 50_000_000 + STEP_OVERHEAD)
+    releases.insert(0, release('v1', 50_000_000))
+    assert release_index.cheapest_path(releases, 'v1', 'v3') == (['v2', 'v3'], 2_000 + 2 * STEP_OVERHEAD)
+
+def test_target_missing_from_the_index():
+    releases = [release('v1', 100), release('v2', 100, 10)]
+    assert release_index.cheapest_path(releases, 'v1', 'v3') == (['v3'], None)
+    assert release_index.cheapest_path(releases, 'not-a-version', 'v2') == (['v2'], None)
+
+def test_load_index_skips_drafts_and_stops_at_the_installed_release(monkeypatch):
+    pages = {
+        1: [{'tag_name': f'v1.{minor}', 'assets': [{'name': FULL_ASSET, 'size': minor}]}
+            for minor in range(199, 99, -1)],
+        2: [{'tag_name': 'v1.99', 'draft': True}, {'tag_name': 'v1.98', 'prerelease': True},
+            {'tag_name': 'latest'}, {'tag_name': 'v1.97'}] + [{'tag_name': 'v1.0'}] * 96,
+    }
+    requested = []
+
+    def get_release(url, min_interval, timeout):
+        page = int(url.rsplit('=', 1)[1])
+        requested.append(page)
+        return pages[page]
+
+    monkeypatch.setattr(release_index.release_cache, 'get_release', get_release)
+    releases = release_index.load_index('https://api.example/releases', 'v1.97')
+    assert requested == [1, 2]
+    tags = [release['tag'] for release in releases]
+    assert 'v1.99' not in tags and 'v1.98' not in tags and 'latest' not in tags
+    assert tags[-3:] == ['v1.197', 'v1.198', 'v1.199']
+    assert releases[-1]['assets'] == {FULL_ASSET: 199}
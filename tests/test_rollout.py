@@ -0,0 +1,66 @@
+import time
+import pytest
+import rollout
+
+def local(hour, minute=0, day=15):
+    return time.mktime((2026, 6, day, hour, minute, 0, 0, 0, -1))
+
+def test_parse_ramp():
+    notes = "Fixes.\nRollout: 72h=100%, 0h=5%, 24h = 25%\nMore notes."
+    assert rollout.parse_ramp(notes) == [(0.0, 5.0), (24.0, 25.0), (72.0, 100.0)]
+    assert rollout.parse_ramp("rollout: 0h=150%") == [(0.0, 100.0)]
+    assert rollout.parse_ramp("No ramp here") is None
+    assert rollout.parse_ramp(None) is None
+
+@pytest.mark.parametrize('bucket, hours', [(0, 0.0), (4.9, 0.0), (5, 0.0), (15, 12.0), (62.5, 48.0), (99.9, 71.936)])
+def test_hours_until_bucket_interpolates(bucket, hours):
+    ramp = [(0.0, 5.0), (24.0, 25.0), (72.0, 100.0)]
+    assert rollout.hours_until_bucket(ramp, bucket) == pytest.approx(hours, abs=1e-3)
+
+def test_bucket_beyond_the_ramp_is_never_reached():
+    assert rollout.hours_until_bucket([(0.0, 10.0), (24.0, 50.0)], 75) is None
+
+def test_fraction_is_stable_and_spread():
+    assert rollout.fraction('machine', 'owner', 'repo') == rollout.fraction('machine', 'owner', 'repo')
+    values = [rollout.fraction(str(machine), 'owner', 'repo') for machine in range(1000)]
+    assert all(0 <= value < 1 for value in values)
+    assert 0.4 < sum(values) / len(values) < 0.6
+
+def test_parse_windows():
+    assert rollout.parse_windows('02:00-05:00, 22:30-01:15, bad') == [(120, 300), (1350, 75)]
+    assert rollout.parse_windows('') == []
+
+def test_window_time_within_the_window():
+    windows = rollout.parse_windows('02:00-04:00')
+    assert rollout.window_time(local(1), windows, 0.5) == local(3)
+    # Already inside the window, the rest of it is used
+    assert rollout.window_time(local(3), windows, 0.5) == local(3, 30)
+    # Past the window, the next day's one is used
+    assert rollout.window_time(local(5), windows, 0.0) == local(2, day=16)
+
+def test_window_wrapping_past_midnight():
+    windows = rollout.parse_windows('23:00-01:00')
+    assert rollout.window_time(local(0, 30), windows, 0.0) == local(0, 30)
+    assert rollout.window_time(local(12), windows, 0.5) == local(0, day=16)
+
+def release(hours_ago, body='', tag='v2'):
+    published = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(time.time() - hours_ago * 3600))
+    return {'tag_name': tag, 'published_at': published, 'body': body}
+
+def test_scheduled_time_without_publication_date():
+    now = time.time()
+    assert rollout.scheduled_time({'tag_name': 'v2'}, 'o', 'r') >= now
+
+def test_ramp_excludes_machines_above_its_share():
+    machines = [str(machine) for machine in range(200)]
+    ramp = release(1, 'rollout: 0h=10%')
+    included = [machine for machine in machines if rollout.scheduled_time(ramp, 'o', 'r', machine=machine) is not None]
+    assert included == [machine for machine in machines if rollout.fraction(machine, 'o', 'r') < 0.1]
+    assert 5 < len(included) < 40
+
+def test_jitter_spreads_installs_after_publication():
+    published = release(0)
+    eligible = rollout.scheduled_time(published, 'o', 'r', machine='m')
+    delayed = rollout.scheduled_time(published, 'o', 'r', jitter=3600, machine='m')
+    assert 0 <= delayed - eligible < 3600
+    assert delayed - eligible == pytest.approx(rollout.fraction('m', 'o', 'r', 'v2') * 3600)
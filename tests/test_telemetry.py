@@ -0,0 +1,56 @@
+import json
+import pytest
+import config_store
+import telemetry
+
+def records(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+def test_phase_writes_one_record(tmp_path):
+    path = tmp_path / 'metrics.jsonl'
+    telemetry.configure('tests', str(path))
+    with telemetry.phase('download', file='update.zip') as measurement:
+        measurement.bytes = 1000
+    [record] = records(path)
+    assert record['phase'] == 'download'
+    assert record['entry_point'] == 'tests'
+    assert record['bytes'] == 1000
+    assert record['outcome'] == 'ok'
+    assert record['seconds'] >= 0
+    assert record['file'] == 'update.zip'
+
+def test_escaping_error_is_recorded(tmp_path):
+    path = tmp_path / 'metrics.jsonl'
+    telemetry.configure('tests', str(path))
+    with pytest.raises(ValueError):
+        with telemetry.phase('extract'):
+            raise ValueError("bad archive")
+    [record] = records(path)
+    assert record['outcome'] == 'error'
+    assert record['error'] == "ValueError: bad archive"
+
+def test_empty_metrics_path_disables_writing(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    telemetry.configure('tests', '')
+    with telemetry.phase('download'):
+        pass
+    assert not (tmp_path / telemetry.METRICS_PATH).exists()
+
+def test_metrics_file_is_rotated(tmp_path, monkeypatch):
+    path = tmp_path / 'metrics.jsonl'
+    monkeypatch.setattr(telemetry, 'MAX_METRICS_SIZE', 100)
+    telemetry.configure('tests', str(path))
+    for _ in range(5):
+        telemetry.emit('check', padding='x' * 50)
+    assert path.exists() and (tmp_path / 'metrics.jsonl.1').exists()
+
+def test_registry_updates_are_recorded(tmp_path, monkeypatch):
+    import updater_manager
+    path = tmp_path / 'metrics.jsonl'
+    telemetry.configure('tests', str(path))
+    monkeypatch.setattr(config_store, '_default_store', config_store.FileStore(str(tmp_path / 'kalymos.json')))
+    updater_manager.update_registry('Updater', 'v2')
+    [record] = records(path)
+    assert record['phase'] == 'registry_update'
+    assert record['setting'] == 'Updater'
+    assert config_store.default_store().get('Updater') == 'v2'
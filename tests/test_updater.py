@@ -0,0 +1,178 @@
+import os
+import sys
+import json
+import time
+import pytest
+import asset_cache
+import check_state
+import config_store
+import journal
+import mirror
+import telemetry
+import throttle
+
+@pytest.fixture
+def env(tmp_path, monkeypatch, fake_github, updater):
+    """Points the updater at the fake server, without the shared cache, with settings in a JSON store."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(updater, 'GITHUB_URL', fake_github.url)
+    monkeypatch.setattr(updater, 'GITHUB_API_URL', fake_github.url)
+    monkeypatch.setattr(asset_cache, '_cache_dir', None)
+    monkeypatch.setattr(mirror, '_mirror_url', None)
+    for name in ('_bucket', '_connections'):
+        monkeypatch.setattr(throttle, name, getattr(throttle, name))
+    monkeypatch.setattr(telemetry, '_callbacks', [])
+
+    def configure(settings):
+        (tmp_path / 'kalymos.json').write_text(json.dumps(settings))
+        store = config_store.FileStore(str(tmp_path / 'kalymos.json'))
+        monkeypatch.setattr(config_store, '_default_store', store)
+        return store
+    return configure
+
+def make_app(tmp_path, name, files):
+    folder = tmp_path / name
+    for rel_path, data in files.items():
+        (folder / rel_path).parent.mkdir(parents=True, exist_ok=True)
+        (folder / rel_path).write_bytes(data)
+    return {'Owner': 'o', 'Repo': name, 'Version': 'v1', 'MainExecutable': f'{name}.exe', 'Folder': str(folder)}
+
+def app_versions():
+    return {name: store.get('Version') for name, store in config_store.default_store().children('Apps').items()}
+
+def test_all_apps_are_updated(tmp_path, env, publish, updater):
+    env({'Apps': {name: make_app(tmp_path, name, {'lib.dll': b'old', 'keep.txt': b'same'}) for name in ('one', 'two')}})
+    for name in ('one', 'two'):
+        publish(name, 'v2', {'lib.dll': f'new {name}'.encode(), 'keep.txt': b'same'})
+
+    assert updater.update_all_apps()
+    assert app_versions() == {'one': 'v2', 'two': 'v2'}
+    assert (tmp_path / 'one' / 'lib.dll').read_bytes() == b'new one'
+    assert (tmp_path / 'two' / 'lib.dll').read_bytes() == b'new two'
+
+def test_failed_staging_does_not_stop_the_other_apps(tmp_path, env, publish, updater):
+    env({'Apps': {name: make_app(tmp_path, name, {'lib.dll': b'old'}) for name in ('one', 'two')}})
+    publish('one', 'v2', {'lib.dll': b'new'})
+    (publish('two', 'v2', {'lib.dll': b'new'}) / 'update.zip').unlink()
+
+    assert not updater.update_all_apps()
+    assert app_versions() == {'one': 'v2', 'two': 'v1'}
+    assert (tmp_path / 'one' / 'lib.dll').read_bytes() == b'new'
+    assert (tmp_path / 'two' / 'lib.dll').read_bytes() == b'old'
+
+def test_failed_cutover_is_rolled_back_for_that_app_only(tmp_path, env, publish, updater, monkeypatch):
+    env({'Apps': {name: make_app(tmp_path, name, {'lib.dll': b'old'}) for name in ('one', 'two')}})
+    for name in ('one', 'two'):
+        publish(name, 'v2', {'lib.dll': b'new', 'added.dll': b'added'})
+
+    replace_files = updater.replace_files
+    def fail_for_two(source, destination):
+        replace_files(source, destination)
+        if destination.endswith('two'):
+            raise OSError("locked")
+    monkeypatch.setattr(updater, 'replace_files', fail_for_two)
+
+    assert not updater.update_all_apps()
+    assert app_versions() == {'one': 'v2', 'two': 'v1'}
+    assert (tmp_path / 'one' / 'lib.dll').read_bytes() == b'new'
+    assert (tmp_path / 'two' / 'lib.dll').read_bytes() == b'old'
+    assert not (tmp_path / 'two' / 'added.dll').exists()
+    assert not journal.is_pending(str(tmp_path / 'two'))
+
+def test_install_skips_the_rollout_schedule(tmp_path, env, publish, updater):
+    env({'Apps': {'one': make_app(tmp_path, 'one', {'lib.dll': b'old'})}})
+    publish('one', 'v2', {'lib.dll': b'new'}, notes="Rollout: 0h=0%")
+
+    assert updater.update_all_apps()
+    assert app_versions() == {'one': 'v1'}
+    assert updater.update_all_apps(install=True)
+    assert app_versions() == {'one': 'v2'}
+
+def test_prefetched_release_is_installed_without_download(tmp_path, env, publish, updater, fake_github):
+    import prefetch
+    env({'Apps': {'one': make_app(tmp_path, 'one', {'lib.dll': b'old'})}})
+    (publish('one', 'v2', {'lib.dll': b'new'}) / 'update.zip').unlink()
+    staged = tmp_path / 'one' / prefetch.PREFETCH_DIR / 'lib.dll'
+    staged.parent.mkdir(parents=True)
+    staged.write_bytes(b'new')
+    prefetch.save_record(str(tmp_path / 'one'), 'v2', 'v1', None, [], {})
+
+    assert updater.update_all_apps()
+    assert app_versions() == {'one': 'v2'}
+    assert (tmp_path / 'one' / 'lib.dll').read_bytes() == b'new'
+    assert prefetch.load_record(str(tmp_path / 'one'), 'v2', 'v1') is None
+
+@pytest.fixture
+def run_main(monkeypatch, updater):
+    """Runs main() with the given arguments, recording launches and spawned workers instead of starting them."""
+    calls = {'launched': [], 'spawned': []}
+    def launch(executable, updated, failed=False):
+        calls['launched'].append((updated, failed))
+        sys.exit(0)
+    monkeypatch.setattr(updater, 'launch_application', launch)
+    monkeypatch.setattr(updater, 'spawn_updater', lambda *args: calls['spawned'].append(args))
+
+    def run(*args):
+        monkeypatch.setattr(sys, 'argv', ['kalymos-updater.py', *args])
+        with pytest.raises(SystemExit):
+            updater.main()
+        return calls
+    return run
+
+def launch_first_app(tmp_path, env, interval=3600):
+    (tmp_path / 'lib.dll').write_bytes(b'old')
+    return env({'Owner': 'o', 'Repo': 'app', 'Version': 'v1', 'MainExecutable': 'app.exe', 'LaunchFirst': 'True',
+                'CheckInterval': str(interval), 'MetricsPath': '', 'CacheDir': ''})
+
+def test_launch_first_starts_at_once_and_checks_in_the_background(tmp_path, env, publish, run_main, fake_github):
+    launch_first_app(tmp_path, env)
+    publish('app', 'v2', {'lib.dll': b'new'})
+
+    calls = run_main()
+    assert calls == {'launched': [(True, False)], 'spawned': [('--check',)]}
+    assert fake_github.stats['requests'] == 0
+    assert (tmp_path / 'lib.dll').read_bytes() == b'old'
+
+def test_fresh_up_to_date_result_starts_no_check(tmp_path, env, run_main):
+    launch_first_app(tmp_path, env)
+    check_state.save(str(tmp_path), 'v1', None)
+    assert run_main() == {'launched': [(True, False)], 'spawned': []}
+
+def test_recorded_release_is_installed_on_the_next_start(tmp_path, env, publish, run_main):
+    store = launch_first_app(tmp_path, env)
+    publish('app', 'v2', {'lib.dll': b'new'})
+    check_state.save(str(tmp_path), 'v1', 'v2')
+
+    calls = run_main()
+    assert calls == {'launched': [(True, False)], 'spawned': []}
+    assert (tmp_path / 'lib.dll').read_bytes() == b'new'
+    assert store.get('Version') == 'v2'
+    assert check_state.load(str(tmp_path), 'v1') is None
+
+def test_stale_recorded_release_starts_a_new_check(tmp_path, env, publish, run_main):
+    store = launch_first_app(tmp_path, env, interval=60)
+    publish('app', 'v2', {'lib.dll': b'new'})
+    check_state.save(str(tmp_path), 'v1', 'v2')
+    state_path = tmp_path / check_state.STATE_PATH
+    state = json.loads(state_path.read_text())
+    state['checked_at'] -= 120
+    state_path.write_text(json.dumps(state))
+
+    calls = run_main()
+    # A newer release may be out, so the check runs again while the recorded one is installed
+    assert calls == {'launched': [(True, False)], 'spawned': [('--check',)]}
+    assert store.get('Version') == 'v2'
+
+def test_prefetch_does_not_run_twice(tmp_path, env, publish, updater, fake_github, monkeypatch):
+    import prefetch
+    monkeypatch.setattr(prefetch, 'lower_priority', lambda: None)
+    env({'Owner': 'o', 'Repo': 'app', 'Version': 'v1', 'MainExecutable': 'app.exe'})
+    publish('app', 'v2', {'lib.dll': b'new'})
+    assert prefetch.acquire_lock('.')
+
+    assert not updater.prefetch_update('o', 'app', 'v1', 'v2')
+    assert fake_github.stats['requests'] == 0
+    prefetch.release_lock('.')
+    assert updater.prefetch_update('o', 'app', 'v1', 'v2')
+    assert prefetch.load_record('.', 'v2', 'v1') is not None
+    assert not os.path.exists(prefetch.LOCK_PATH)
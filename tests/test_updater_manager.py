@@ -0,0 +1,77 @@
+import os
+import hashlib
+import pytest
+import asset_cache
+import config_store
+import mirror
+import updater_manager
+
+EXE = 'kalymos-updater.exe'
+
+@pytest.fixture
+def releases(tmp_path, monkeypatch, fake_github):
+    """Serves updater releases from the fake server, with settings in a JSON store."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(updater_manager, 'UPDATER_RELEASES_URL', f"{fake_github.url}/o/updater/releases/download")
+    monkeypatch.setattr(asset_cache, '_cache_dir', None)
+    monkeypatch.setattr(mirror, '_mirror_url', None)
+    monkeypatch.setattr(config_store, '_default_store', config_store.FileStore(str(tmp_path / 'kalymos.json')))
+
+    def release(tag, data, published_hash=None):
+        folder = tmp_path / 'releases' / 'o' / 'updater' / tag
+        folder.mkdir(parents=True)
+        (folder / EXE).write_bytes(data)
+        (folder / (EXE + '.sha256')).write_text(published_hash or hashlib.sha256(data).hexdigest())
+        return folder
+    return release
+
+def test_matching_updater_is_not_downloaded(tmp_path, releases):
+    (releases('v2', b'new updater') / EXE).unlink()
+    (tmp_path / EXE).write_bytes(b'new updater')
+    assert updater_manager.download_updater('v2', EXE) == 'v2'
+    assert (tmp_path / EXE).read_bytes() == b'new updater'
+
+def test_updater_not_matching_its_hash_is_rejected(tmp_path, releases):
+    releases('v2', b'tampered updater', hashlib.sha256(b'new updater').hexdigest())
+    (tmp_path / EXE).write_bytes(b'old updater')
+    assert updater_manager.download_updater('v2', EXE) is None
+    assert (tmp_path / EXE).read_bytes() == b'old updater'
+    assert sorted(os.listdir(tmp_path)) == [EXE, 'releases']
+
+def test_running_updater_keeps_the_new_one_pending(tmp_path, releases, monkeypatch):
+    releases('v2', b'new updater')
+    (tmp_path / EXE).write_bytes(b'old updater')
+    replace = os.replace
+    def locked(source, destination):
+        if os.path.basename(destination) == EXE:
+            raise PermissionError("in use")
+        replace(source, destination)
+    monkeypatch.setattr(os, 'replace', locked)
+
+    assert updater_manager.download_updater('v2', EXE) is None
+    assert (tmp_path / EXE).read_bytes() == b'old updater'
+    assert (tmp_path / (EXE + '.pending')).read_bytes() == b'new updater'
+    assert (tmp_path / (EXE + '.pending.json')).exists()
+    # Still in use at the next launch
+    assert updater_manager.install_pending_updater(EXE) is None
+    assert (tmp_path / (EXE + '.pending.json')).exists()
+
+    monkeypatch.setattr(os, 'replace', replace)
+    assert updater_manager.install_pending_updater(EXE) == 'v2'
+    assert (tmp_path / EXE).read_bytes() == b'new updater'
+    assert not (tmp_path / (EXE + '.pending.json')).exists()
+    assert config_store.default_store().get('Updater') == 'v2'
+
+def test_previous_updater_is_restored_when_missing(tmp_path, releases):
+    releases('v2', b'new updater')
+    (tmp_path / EXE).write_bytes(b'old updater')
+    assert updater_manager.download_updater('v2', EXE) == 'v2'
+    assert (tmp_path / (EXE + '.previous')).read_bytes() == b'old updater'
+
+    (tmp_path / EXE).unlink()
+    assert updater_manager.restore_previous_updater(EXE)
+    assert (tmp_path / EXE).read_bytes() == b'old updater'
+    assert (tmp_path / (EXE + '.previous')).exists()
+
+def test_nothing_to_restore_without_a_previous_updater(tmp_path, releases):
+    assert not updater_manager.restore_previous_updater(EXE)
@@ -0,0 +1,78 @@
+import os
+import pytest
+import delta
+import installer
+import journal
+import verify
+
+def make_release(root, count=6, size=5000):
+    root.mkdir(exist_ok=True)
+    for i in range(count):
+        (root / f'f{i}.bin').write_bytes(os.urandom(size))
+    (root / 'sub').mkdir(exist_ok=True)
+    (root / 'sub' / 'nested.txt').write_bytes(b'nested')
+    return delta.build_manifest(str(root), 'v2')
+
+def rewrite_same_size(path):
+    data = bytearray(path.read_bytes())
+    data[0] ^= 0xFF
+    path.write_bytes(bytes(data))
+    os.utime(path, ns=(1, 1))
+
+def test_verify_tree_reports_each_problem(tmp_path):
+    manifest = make_release(tmp_path)
+    os.remove(tmp_path / 'f0.bin')
+    (tmp_path / 'f1.bin').write_bytes(b'short')
+    rewrite_same_size(tmp_path / 'f2.bin')
+
+    report = verify.verify_tree(str(tmp_path), manifest)
+    assert report['files'] == 7
+    assert report['missing'] == ['f0.bin']
+    assert report['mismatched'] == ['f1.bin', 'f2.bin']
+    assert report['unreadable'] == []
+
+def test_fast_mode_only_reads_files_the_index_does_not_know(tmp_path):
+    manifest = make_release(tmp_path)
+    index = installer.FileIndex(str(tmp_path))
+    first = verify.verify_tree(str(tmp_path), manifest, index, fast=True)
+    assert first['hashed'] == 7
+    assert not first['mismatched']
+
+    second = verify.verify_tree(str(tmp_path), manifest, index, fast=True, hash_paths=['sub' + os.sep + 'nested.txt'])
+    assert second['hashed'] == 1
+
+    rewrite_same_size(tmp_path / 'f3.bin')
+    third = verify.verify_tree(str(tmp_path), manifest, index, fast=True)
+    assert third['mismatched'] == ['f3.bin']
+    assert third['hashed'] == 1
+
+def test_cutover_only_hashes_the_renamed_files(tmp_path, monkeypatch, updater):
+    root, staging = tmp_path / 'root', tmp_path / 'staging'
+    manifest = make_release(root)
+    staging.mkdir()
+    (staging / 'f0.bin').write_bytes(b'new contents')
+    manifest['files']['f0.bin'] = {'size': 12, 'sha256': delta.hash_file(str(staging / 'f0.bin'))}
+    index = installer.FileIndex(str(root))
+
+    updater.verify_untouched_files(str(staging), str(root), manifest, index)
+    assert sorted(index.entries) == sorted(set(manifest['files']) - {'f0.bin'})
+    checked = []
+    verify_tree = verify.verify_tree
+    monkeypatch.setattr(verify, 'verify_tree', lambda root_folder, manifest, *args:
+                        checked.append(sorted(manifest['files'])) or verify_tree(root_folder, manifest, *args))
+    updater.apply_staged_update(str(staging), str(root), [], manifest, index, 'v1')
+    assert checked == [['f0.bin']]
+    assert (root / 'f0.bin').read_bytes() == b'new contents'
+    assert not journal.is_pending(str(root))
+
+def test_broken_renamed_file_fails_the_cutover(tmp_path, updater):
+    root, staging = tmp_path / 'root', tmp_path / 'staging'
+    manifest = make_release(root)
+    staging.mkdir()
+    (staging / 'f0.bin').write_bytes(b'not what the manifest says')
+    index = installer.FileIndex(str(root))
+    with pytest.raises(OSError, match='f0.bin'):
+        updater.apply_staged_update(str(staging), str(root), [], manifest, index, 'v1')
+    assert journal.is_pending(str(root))
+    assert journal.rollback(str(root), only_pending=True) == 'v1'
+    assert delta.hash_file(str(root / 'f0.bin')) == manifest['files']['f0.bin']['sha256']
@@ -0,0 +1,85 @@
+import time
+import threading
+import contextlib
+
+class TokenBucket:
+    """
+    A token bucket shared by every download thread. Each byte received
+    takes one token; a thread that runs the bucket into debt sleeps until
+    the debt is paid back at the configured rate.
+    """
+
+    def __init__(self, rate, burst=None):
+        """
+        Args:
+            rate (int): The sustained rate, in bytes per second.
+            burst (int, optional): The number of bytes allowed at once. Defaults to one second of traffic.
+        """
+        self.rate = rate
+        self.capacity = burst or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def consume(self, amount):
+        """
+        Takes tokens for the bytes just received, sleeping if the rate is exceeded.
+
+        Args:
+            amount (int): The number of bytes received.
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= amount
+            delay = -self.tokens / self.rate if self.tokens < 0 else 0
+        if delay:
+            time.sleep(delay)
+
+_bucket = None
+
+def set_rate(bytes_per_second):
+    """
+    Caps the combined download rate of the process.
+
+    Args:
+        bytes_per_second (int): The cap in bytes per second, or 0 to remove it.
+    """
+    global _bucket
+    _bucket = TokenBucket(bytes_per_second) if bytes_per_second else None
+
+def consume(amount):
+    """
+    Accounts for received bytes against the process-wide cap, if one is set.
+
+    Args:
+        amount (int): The number of bytes received.
+    """
+    bucket = _bucket
+    if bucket is not None:
+        bucket.consume(amount)
+
+_connections = None
+
+def set_connections(limit):
+    """
+    Caps the number of download connections open at the same time across the process.
+
+    Args:
+        limit (int): The maximum number of connections, or 0 to remove the cap.
+    """
+    global _connections
+    _connections = threading.BoundedSemaphore(limit) if limit else None
+
+@contextlib.contextmanager
+def connection():
+    """
+    Holds one slot of the process-wide connection budget for the duration of a request.
+    """
+    semaphore = _connections
+    if semaphore is None:
+        yield
+        return
+    with semaphore:
+        yield
@@ -1,143 +1,285 @@
 import os
 import sys
-import winreg
+import json
+import shutil
 import requests
 import ctypes
 from packaging import version
 import logging
+import downloader
+import http_client
+import throttle
+import release_cache
+import mirror
+import asset_cache
+import telemetry
+import config_store
+import process_control
 
 logging.basicConfig(level=logging.INFO)
 
+LAUNCH_FIRST_TIMEOUT = (3, 5)
+UPDATER_FILENAME = 'kalymos-updater.exe'
+UPDATER_RELEASES_URL = 'https://github.com/MrOz59/Kalymos-Updater/releases/download'
+PREVIOUS_SUFFIX = '.previous'
+PENDING_SUFFIX = '.pending'
+
 def load_config():
-    env_vars = ['Updater', 'SkipUpdate', 'Repo', 'Owner','Version','MainExecutable']
+    env_vars = ['Updater', 'SkipUpdate', 'Repo', 'Owner','Version','MainExecutable', 'CheckInterval', 'Prefetch', 'PrefetchRate', 'MirrorUrl', 'LaunchFirst', 'MaxRate', 'UpdateMode', 'MaintenanceWindow', 'RolloutJitter']
     loaded_vars = {}
     
-    for var in env_vars:
-        value = os.environ.get(var)
-        if value is not None:
-            if value == 'False':
-                value = False
-            elif value == 'True':
-                value = True
-            loaded_vars[var] = value
-            logging.info(f"{var} loaded with value: {value}")
-        else:
-            logging.info(f"{var} is not set.")
+    with telemetry.phase('config_load'):
+        for var in env_vars:
+            value = os.environ.get(var)
+            if value is not None:
+                if value == 'False':
+                    value = False
+                elif value == 'True':
+                    value = True
+                loaded_vars[var] = value
+                logging.info(f"{var} loaded with value: {value}")
+            else:
+                logging.info(f"{var} is not set.")
     
     return loaded_vars
 
-def set_registry_value(key, value):
+def update_registry(var_name, new_value):
+    """
+    Updates the registry value if the new value is greater than the current value.
+
+    Args:
+        var_name (str): The name of the registry variable to update.
+        new_value (str): The new value to be set in the registry.
+    """
+    store = config_store.default_store()
+    with telemetry.phase('registry_update', setting=var_name, version=new_value):
+        current_value = store.get(var_name)
+        
+        if current_value is None or version.parse(current_value) < version.parse(new_value):
+            store.update({var_name: new_value})
+            logging.info(f"{var_name} updated to {new_value}")
+        else:
+            logging.info(f"{var_name} remains at {current_value}")
+
+def fetch_published_hash(url):
     """
-    Sets a string value in the Windows registry.
+    Fetches a published SHA-256 hash, from the mirror first.
 
     Args:
-        key (str): The registry key path.
-        value (str): The value to be set.
+        url (str): The GitHub URL of the '.sha256' file.
 
-    Raises:
-        Exception: If an error occurs while setting the registry value.
+    Returns:
+        str: The hash in lowercase, or None if it is not published.
+    """
+    for candidate in mirror.candidates(url):
+        try:
+            response = http_client.get(candidate)
+            if response.ok:
+                return response.text.split()[0].lower()
+        except (requests.exceptions.RequestException, IndexError) as e:
+            logging.warning(f"Could not read the hash from {candidate}: {e}")
+    return None
+
+def install_updater(new_path, filename):
     """
+    Moves a verified updater into place with an atomic rename. The current
+    updater is kept next to it with the '.previous' suffix, so a launch
+    never sees a partial file and the last working binary can be restored.
+
+    Args:
+        new_path (str): The verified new updater, on the same volume.
+        filename (str): The path of the updater.
+
+    Returns:
+        bool: True if the updater was replaced, False if the current one was kept.
+    """
+    previous_path = filename + PREVIOUS_SUFFIX
     try:
-        with winreg.CreateKey(winreg.HKEY_CURRENT_USER, key) as reg_key:
-            winreg.SetValueEx(reg_key, 'Value', 0, winreg.REG_SZ, value)
-    except Exception as e:
-        logging.error(f"Error setting registry value: {e}")
+        if os.path.exists(filename):
+            if os.path.exists(previous_path):
+                os.remove(previous_path)
+            try:
+                os.link(filename, previous_path)
+            except OSError:
+                shutil.copy2(filename, previous_path)
+        os.replace(new_path, filename)
+    except OSError as e:
+        # Windows refuses to replace a running executable, such as an updater still checking in the background
+        logging.warning(f"Could not replace {filename}: {e}. Keeping the current one.")
+        return False
+    return True
+
+def restore_previous_updater(filename):
+    """
+    Puts back the updater kept by the last self-update.
+
+    Args:
+        filename (str): The path of the updater.
 
-def get_registry_value(key):
+    Returns:
+        bool: True if the previous updater was restored.
     """
-    Retrieves a string value from the Windows registry.
+    previous_path = filename + PREVIOUS_SUFFIX
+    if not os.path.exists(previous_path):
+        return False
+    shutil.copy2(previous_path, filename + '.restore')
+    os.replace(filename + '.restore', filename)
+    logging.info(f"Restored the previous {filename}.")
+    return True
+
+def install_pending_updater(filename):
+    """
+    Installs the updater a background check downloaded and verified on an
+    earlier launch, which only takes a rename. When the current updater is
+    in use, the pending one is kept for the next launch to retry.
 
     Args:
-        key (str): The registry key path.
+        filename (str): The path of the updater.
 
     Returns:
-        str: The value stored in the registry key, or None if the key does not exist.
+        str: The version installed, or None if no verified updater was installed.
     """
+    pending_path = filename + PENDING_SUFFIX
     try:
-        with winreg.OpenKey(winreg.HKEY_CURRENT_USER, key, 0, winreg.KEY_READ) as reg_key:
-            value, _ = winreg.QueryValueEx(reg_key, 'Value')
-            return value
-    except FileNotFoundError:
+        with open(pending_path + '.json', 'r') as f:
+            pending = json.load(f)
+    except (OSError, ValueError):
         return None
-    except Exception as e:
-        logging.error(f"Error reading registry value: {e}")
+    if not asset_cache.hash_matches(pending_path, pending.get('sha256', '')):
+        logging.warning(f"The pending {filename} does not match its hash. Discarding it.")
+        for path in (pending_path, pending_path + '.json'):
+            if os.path.exists(path):
+                os.remove(path)
         return None
+    if not install_updater(pending_path, filename):
+        return None
+    try:
+        os.remove(pending_path + '.json')
+    except OSError:
+        pass
+    update_registry('Updater', pending['version'])
+    logging.info(f"Installed the {filename} {pending['version']} downloaded in the background.")
+    return pending['version']
 
-def update_registry(var_name, new_value):
+def background_self_update(updater_version, filename, min_interval, timeout=LAUNCH_FIRST_TIMEOUT, retries=0):
     """
-    Updates the registry value if the new value is greater than the current value.
+    Checks for a new updater and downloads it without installing it, so
+    the application does not wait; the next launch installs it. In
+    launch-first mode the background check of kalymos-updater.exe runs it.
 
     Args:
-        var_name (str): The name of the registry variable to update.
-        new_value (str): The new value to be set in the registry.
+        updater_version (str): The installed version of the updater.
+        filename (str): The path of the updater.
+        min_interval (int): Seconds during which a cached answer is used without contacting GitHub.
+        timeout (float or tuple): The connect and read timeouts of the check, in seconds.
+        retries (int): The number of retries after a failed check.
     """
-    registry_key = r"Software\KalymosApp"
-    current_value = get_registry_value(f"{registry_key}\\{var_name}")
-    
-    if current_value is None or version.parse(current_value) < version.parse(new_value):
-        set_registry_value(f"{registry_key}\\{var_name}", new_value)
-        logging.info(f"{var_name} updated to {new_value}")
-    else:
-        logging.info(f"{var_name} remains at {current_value}")
+    latest_version = check_for_updates(updater_version, min_interval, timeout, retries)
+    if latest_version:
+        download_updater(latest_version, filename, install=False)
 
-def download_updater(updater_version, filename):
+def download_updater(updater_version, filename, install=True):
     """
-    Downloads the updater executable from GitHub.
+    Downloads the updater executable from GitHub and verifies it against
+    the SHA-256 hash published with it as '<filename>.sha256'.
+
+    Nothing is downloaded when the local file already matches the hash, and
+    the machine-wide asset cache is used when another install fetched the
+    same binary. The download goes to a temporary file that only replaces
+    the updater once it is verified.
 
     Args:
         updater_version (str): The version of the updater to download.
         filename (str): The filename to save the downloaded updater as.
+        install (bool): Whether to install it at once, or leave it next to the
+            updater with the '.pending' suffix for install_pending_updater().
+            An updater that cannot be replaced because it is running is left
+            there as well.
 
     Returns:
-        str: The version of the downloaded updater if successful, otherwise None.
+        str: The version of the downloaded updater if it was installed or, without install, kept
+            for the next launch, otherwise None.
     """
-    updater_url = f'https://github.com/MrOz59/Kalymos-Updater/releases/download/{updater_version}/{filename}'
+    updater_url = f'{UPDATER_RELEASES_URL}/{updater_version}/{os.path.basename(filename)}'
     
-    try:
-        response = requests.get(updater_url, stream=True)
-        response.raise_for_status()
-        
-        with open(filename, 'wb') as file:
-            for chunk in response.iter_content(chunk_size=8192):
-                file.write(chunk)
-        logging.info(f"Downloaded {filename}.")
+    with telemetry.phase('download', file=filename) as measurement:
+        expected_hash = fetch_published_hash(updater_url + '.sha256')
+        if expected_hash is None:
+            logging.error(f"No SHA-256 hash is published for {filename} {updater_version}. Not installing it.")
+            measurement.outcome = 'failed'
+            return None
+        if asset_cache.hash_matches(filename, expected_hash):
+            logging.info(f"{filename} already matches {updater_version}. Skipping the download.")
+            measurement.fields['source'] = 'local'
+            return updater_version
+
+        temp_path = filename + '.download'
+        with asset_cache.locked(expected_hash):
+            source = 'cache' if asset_cache.copy_to(expected_hash, temp_path) else None
+            if source is None:
+                source = next((url for url in mirror.candidates(updater_url) if downloader.download(url, temp_path)), None)
+            if source is None:
+                logging.error(f"An error occurred while downloading {filename}.")
+                measurement.outcome = 'failed'
+                return None
+            if not asset_cache.hash_matches(temp_path, expected_hash):
+                logging.error(f"The downloaded {filename} does not match its published SHA-256 hash.")
+                os.remove(temp_path)
+                measurement.outcome = 'failed'
+                return None
+            asset_cache.store(temp_path, expected_hash)
+
+        measurement.bytes = os.path.getsize(temp_path)
+        measurement.fields['source'] = source
+        if install and install_updater(temp_path, filename):
+            logging.info(f"Installed {filename} {updater_version} from {source}.")
+            return updater_version
+        # Kept next to the updater until a launch can install it
+        os.replace(temp_path, filename + PENDING_SUFFIX)
+        with open(filename + PENDING_SUFFIX + '.json', 'w') as f:
+            json.dump({'version': updater_version, 'sha256': expected_hash}, f)
+        logging.info(f"Downloaded {filename} {updater_version}. It is installed on the next launch.")
+        if install:
+            measurement.outcome = 'deferred'
+            return None
         return updater_version
-        
-    except requests.HTTPError as e:
-        logging.error(f"An error occurred while downloading the file: {e}")
-        return None
 
-def check_for_updates(current_version):
+def check_for_updates(current_version, min_interval=0, timeout=release_cache.TIMEOUT, retries=http_client.RETRIES):
     """
     Checks for the latest version of the updater on GitHub.
 
+    The release metadata is cached on disk and revalidated with conditional
+    requests, so repeated checks do not use up the API rate limit.
+
     Args:
-        owner (str): The GitHub repository owner.
-        repo (str): The GitHub repository name.
         current_version (str): The current version of the updater.
+        min_interval (int): Seconds during which a cached answer is used without contacting GitHub.
+        timeout (float or tuple): The connect and read timeouts of the request, in seconds.
+        retries (int): The number of retries after a failed request.
 
     Returns:
         str: The latest version available if there is an update, otherwise None.
     """
     url = f"https://api.github.com/repos/MrOz59/kalymos-updater/releases/latest"
     
-    try:
-        response = requests.get(url)
-        response.raise_for_status()
-        
-        latest_version = response.json()['tag_name']
-        if version.parse(latest_version) > version.parse(current_version):
-            logging.info(f"New version available: v{latest_version}")
-            return latest_version
-        else:
-            logging.info("You are already using the latest version.")
+    with telemetry.phase('check', repo='MrOz59/kalymos-updater', current_version=current_version) as measurement:
+        try:
+            latest_version = release_cache.get_release(url, min_interval, timeout=timeout, retries=retries)['tag_name']
+            measurement.fields['latest_version'] = latest_version
+            if version.parse(latest_version) > version.parse(current_version):
+                logging.info(f"New version available: v{latest_version}")
+                return latest_version
+            else:
+                logging.info("You are already using the latest version.")
+                return None
+        except requests.exceptions.RequestException as e:
+            logging.error(f"An error occurred while checking for updates: {e}")
+            measurement.outcome = 'failed'
+            return None
+        except ValueError as e:
+            logging.error(f"Error decoding JSON response: {e}")
+            measurement.outcome = 'failed'
             return None
-    except requests.exceptions.RequestException as e:
-        logging.error(f"An error occurred while checking for updates: {e}")
-        return None
-    except ValueError as e:
-        logging.error(f"Error decoding JSON response: {e}")
-        return None
 
 def run_as_admin(executable_name, cmd_line=None):
     """
@@ -152,7 +294,11 @@ def run_as_admin(executable_name, cmd_line=None):
     """
     if cmd_line is None:
         cmd_line = ' '.join(sys.argv[1:])
+    # This process exits once the updater starts, so the updater must not wait for it to close
+    unregister_instance()
 
+    telemetry.emit('launch', outcome='started', executable=executable_name, seconds_since_start=round(telemetry.elapsed(), 4))
+    telemetry.emit('http', **http_client.get_stats())
     try:
         result = ctypes.windll.shell32.ShellExecuteW(None, "runas", executable_name, cmd_line, None, 1)
         if result <= 32:
@@ -163,13 +309,34 @@ def run_as_admin(executable_name, cmd_line=None):
         sys.exit(1)
     sys.exit(1)
 
+def register_instance():
+    """
+    Records the PID of the running application so the updater can find and
+    close it without scanning every process on the machine.
+    """
+    try:
+        os.makedirs(process_control.PID_DIR, exist_ok=True)
+        open(os.path.join(process_control.PID_DIR, str(os.getpid())), 'w').close()
+    except OSError as e:
+        logging.warning(f"Could not register the application instance: {e}")
+
+def unregister_instance():
+    """
+    Removes the PID file recorded by register_instance().
+    """
+    try:
+        os.remove(os.path.join(process_control.PID_DIR, str(os.getpid())))
+    except OSError:
+        pass
+
 def ensure_updater():
     """
     Ensures the updater executable is present, up-to-date, and runs it if necessary.
     Updates registry values as needed.
     """
-    updater_filename = 'kalymos-updater.exe'
+    updater_filename = UPDATER_FILENAME
     updater_exists = os.path.exists(updater_filename)
+    register_instance()
     configs = load_config()
     
     skip_update_check = configs.get('SkipUpdate', False)
@@ -179,26 +346,66 @@ def ensure_updater():
     owner = configs.get('Owner', '0')
     current_version = configs.get('Version', '0')
     executable = configs.get('MainExecutable', '0')
+    check_interval = configs.get('CheckInterval', '0')
+    prefetch = configs.get('Prefetch', False)
+    prefetch_rate = configs.get('PrefetchRate', '0')
+    mirror_url = configs.get('MirrorUrl', '')
+    launch_first = configs.get('LaunchFirst', False)
+    max_rate = configs.get('MaxRate', '0')
+    update_mode = configs.get('UpdateMode', 'interactive')
+    maintenance_window = configs.get('MaintenanceWindow', '')
+    rollout_jitter = configs.get('RolloutJitter', '')
+    mirror.set_mirror(mirror_url)
+    throttle.set_rate(int(max_rate))
+    # In launch-first mode only a missing updater is waited for, with short timeouts
+    timeout = LAUNCH_FIRST_TIMEOUT if launch_first else release_cache.TIMEOUT
+    retries = 0 if launch_first else http_client.RETRIES
     
-    # Set registry values
-    registry_key = r"Software\KalymosApp"
-    set_registry_value(f"{registry_key}\\Version", current_version)
-    set_registry_value(f"{registry_key}\\Owner", owner)
-    set_registry_value(f"{registry_key}\\Repo", repo)
-    set_registry_value(f"{registry_key}\\MainExecutable", executable)
+    # Set registry values, writing only those that changed since the last launch
+    store = config_store.default_store()
+    with telemetry.phase('registry_sync') as measurement:
+        try:
+            changed = store.update({
+                'Version': current_version,
+                'Owner': owner,
+                'Repo': repo,
+                'MainExecutable': executable,
+                'CheckInterval': check_interval,
+                'Prefetch': str(prefetch),
+                'PrefetchRate': prefetch_rate,
+                'MirrorUrl': mirror_url,
+                'LaunchFirst': str(launch_first),
+                'MaxRate': max_rate,
+                'UpdateMode': update_mode,
+                'MaintenanceWindow': maintenance_window,
+                'RolloutJitter': rollout_jitter,
+            })
+            measurement.fields['changed'] = sorted(changed)
+        except Exception as e:
+            logging.error(f"Error setting registry values: {e}")
+            measurement.outcome = 'failed'
 
     # Check and use registered version for updates
-    registry_version = get_registry_value(f"{registry_key}\\Updater")
+    registry_version = store.get('Updater')
     print(f'Registry: {registry_version}')
     if registry_version and version.parse(registry_version) > version.parse(updater_version):
         updater_version = registry_version
 
+    # Install an updater an earlier launch downloaded but could not put in place
+    if updater_exists:
+        updater_version = install_pending_updater(updater_filename) or updater_version
+
     if updater_exists:
         if skip_update_check:
             logging.info(f"{updater_filename} found. Skipping update check as per configuration.")
+        elif launch_first:
+            # Start the updater at once; its background check also looks for a new updater
+            update_registry('Updater', updater_version)
+            run_as_admin(updater_filename)
+            return False
         else:
             logging.info(f"{updater_filename} found. Checking for updates...")
-            latest_version = check_for_updates(updater_version)
+            latest_version = check_for_updates(updater_version, int(check_interval), timeout, retries)
             if latest_version:
                 logging.info("Update available. Downloading the latest version...")
                 new_version = download_updater(latest_version, updater_filename)
@@ -207,6 +414,11 @@ def ensure_updater():
                     logging.info("Running the updated updater...")
                     run_as_admin(updater_filename)
                     return True
+                elif os.path.exists(updater_filename + PENDING_SUFFIX + '.json'):
+                    # Verified but the current updater is in use; the next launch installs it
+                    logging.info("Running the current updater until the new one can be installed...")
+                    run_as_admin(updater_filename)
+                    return False
                 else:
                     logging.error("Failed to download the updater.")
                     return False
@@ -219,7 +431,7 @@ def ensure_updater():
         if not skip_update_check:
             version_to_download = updater_version
         else:
-            version_to_download = check_for_updates(owner, repo, updater_version)
+            version_to_download = check_for_updates(updater_version, int(check_interval), timeout, retries)
         
         if version_to_download:
             new_version = download_updater(version_to_download, updater_filename)
@@ -230,15 +442,18 @@ def ensure_updater():
                 return True
             else:
                 logging.error("Failed to download the updater.")
-                return False
         else:
             logging.error("No version available for download.")
-            return False
+        # Fall back to the updater kept by the last self-update
+        if restore_previous_updater(updater_filename):
+            run_as_admin(updater_filename)
+        return False
 
 def main():
     """
     Main function to ensure the updater is up-to-date and run it if needed.
     """
+    telemetry.configure('manager', os.environ.get('MetricsPath', telemetry.METRICS_PATH))
     ensure_updater()
 
 if __name__ == "__main__":
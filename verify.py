@@ -0,0 +1,116 @@
+import os
+import zlib
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+BUFFER_SIZE = 4 * 1024 * 1024
+
+def hash_file(file_path, sha256=True):
+    """
+    Reads a file once with large buffers, computing its CRC-32 and, when
+    asked, its SHA-256 hash. Both release the GIL on large buffers, so
+    files hashed on several threads use several cores.
+
+    Args:
+        file_path (str): The path to the file.
+        sha256 (bool): Whether to compute the SHA-256 hash as well.
+
+    Returns:
+        tuple: The CRC-32 of the file and its SHA-256 hash, or None when not asked for.
+    """
+    crc = 0
+    digest = hashlib.sha256() if sha256 else None
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(BUFFER_SIZE), b""):
+            crc = zlib.crc32(chunk, crc)
+            if digest is not None:
+                digest.update(chunk)
+    return crc, digest.hexdigest() if digest is not None else None
+
+def check_file(root_folder, rel_path, entry, index=None, fast=False):
+    """
+    Checks one installed file against its manifest entry.
+
+    In fast mode a file whose size and modification time still match the
+    index is trusted without being read, as long as the CRC-32 the index
+    holds agrees with the manifest. Otherwise the file is hashed.
+
+    Args:
+        root_folder (str): The root folder of the application.
+        rel_path (str): The path relative to the root folder, with forward slashes.
+        entry (dict): The manifest entry, with 'size' and either 'sha256' or 'crc32'.
+        index (installer.FileIndex, optional): The index of the installed tree.
+        fast (bool): Whether to trust files the index already knows.
+
+    Returns:
+        tuple: The problem found ('missing', 'size', 'hash', 'unreadable' or None),
+            the bytes read (None if the file was not read), and the index entry
+            of a file that was hashed and matched.
+    """
+    file_path = os.path.join(root_folder, rel_path)
+    try:
+        stat = os.stat(file_path)
+    except FileNotFoundError:
+        return 'missing', None, None
+    except OSError:
+        return 'unreadable', None, None
+    if stat.st_size != entry['size']:
+        return 'size', None, None
+
+    if fast and index is not None:
+        known = index.entries.get(rel_path)
+        if known and known[0] == stat.st_size and known[1] == stat.st_mtime_ns \
+                and entry.get('crc32', known[2]) == known[2]:
+            return None, None, None
+
+    try:
+        crc, sha256 = hash_file(file_path, 'sha256' in entry)
+    except OSError:
+        # Typically a file held open by an antivirus scan
+        return 'unreadable', None, None
+    if sha256 is not None and sha256 != entry['sha256'] or 'crc32' in entry and crc != entry['crc32']:
+        return 'hash', stat.st_size, None
+    return None, stat.st_size, [stat.st_size, stat.st_mtime_ns, crc]
+
+def verify_tree(root_folder, manifest, index=None, fast=False, hash_paths=(), workers=None):
+    """
+    Checks every file of a release manifest against the installed tree,
+    on a thread pool with one worker per core by default.
+
+    Files that are hashed and match are recorded in the index, so the next
+    fast check does not read them again; the caller saves the index.
+
+    Args:
+        root_folder (str): The root folder of the application.
+        manifest (dict): The manifest of the installed release.
+        index (installer.FileIndex, optional): The index of the installed tree.
+        fast (bool): Whether to trust files whose size and modification time match the index.
+        hash_paths (list): Paths hashed even in fast mode, such as the files just installed.
+        workers (int, optional): The number of threads. Defaults to the number of cores.
+
+    Returns:
+        dict: 'files' (the number checked), 'hashed' (the number read), 'bytes' (the bytes read),
+            and the sorted paths that are 'missing', 'mismatched' (wrong size or hash) or 'unreadable'.
+    """
+    hash_paths = {rel_path.replace(os.sep, '/') for rel_path in hash_paths}
+    files = sorted(manifest['files'].items())
+
+    def check(item):
+        rel_path, entry = item
+        return check_file(root_folder, rel_path, entry, index, fast and rel_path not in hash_paths)
+
+    report = {'files': len(files), 'hashed': 0, 'bytes': 0, 'missing': [], 'mismatched': [], 'unreadable': []}
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        for (rel_path, _), (problem, size, known) in zip(files, executor.map(check, files)):
+            if problem == 'missing':
+                report['missing'].append(rel_path)
+            elif problem == 'unreadable':
+                report['unreadable'].append(rel_path)
+            elif problem is not None:
+                report['mismatched'].append(rel_path)
+            if size is not None:
+                report['hashed'] += 1
+                report['bytes'] += size
+            if known is not None and index is not None:
+                index.entries[rel_path] = known
+    return report